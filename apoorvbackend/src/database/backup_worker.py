@@ -0,0 +1,49 @@
+"""
+Standalone Redis -> PostgreSQL backup scheduler, for BACKUP_MODE=standalone.
+
+    python -m apoorvbackend.src.database.backup_worker
+    python -m apoorvbackend.src.database.backup_worker --once --full
+
+Several copies can run for redundancy: they elect one leader through the same
+Redis lease as the embedded scheduler.
+"""
+import argparse
+import os
+import signal
+import threading
+from dotenv import load_dotenv
+
+from apoorvbackend.src.logger import logger
+from apoorvbackend.src.database.connection import PostgresPool
+from apoorvbackend.src.database.postgres_backup import PostgresBackupService
+
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interval-minutes", type=float, default=float(os.getenv("BACKUP_INTERVAL_MINUTES", 5)))
+    parser.add_argument("--once", action="store_true", help="run a single backup cycle and exit")
+    parser.add_argument("--full", action="store_true", help="with --once, scan every chat key instead of the dirty set")
+    args = parser.parse_args()
+
+    service = PostgresBackupService(interval_minutes=args.interval_minutes)
+    try:
+        if args.once:
+            service.backup_now(full=args.full)
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+        service.start()
+        logger.info("Backup worker running, waiting for SIGINT/SIGTERM")
+        stop.wait()
+        service.stop()
+    finally:
+        PostgresPool.shared().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import os
+import uuid
+
+from apoorvbackend.src.database.connection import PostgresPool
+from apoorvbackend.src.database.schema import ARCHIVE_BLOB, ARCHIVE_BOTH, ARCHIVE_MESSAGES, CHAT_HISTORY_VIEW
+from apoorvbackend.src.redis import codec
+
+# What each archive format is read from, with the chat_history columns plus last_seq
+# (the seq of the newest message, which numbers the conversation again in Redis).
+# While both formats are written, blobs stay the source and chat_conversations supplies
+# the exact seq of conversations that already reached the message archive.
+ARCHIVE_SOURCES = {
+    ARCHIVE_BLOB: "(SELECT *, jsonb_array_length(chat_data) AS last_seq FROM chat_history) AS archive",
+    ARCHIVE_BOTH: """(
+        SELECT h.*, COALESCE(c.archived_seq, jsonb_array_length(h.chat_data)) AS last_seq
+        FROM chat_history h
+        LEFT JOIN chat_conversations c ON c.user_id = h.user_id AND c.level = h.level AND c.actor = h.actor
+    ) AS archive""",
+    ARCHIVE_MESSAGES: CHAT_HISTORY_VIEW,
+}
+
+
+class ChatArchive:
+    """
+    Read side of the archive written by PostgresBackupService (chat_history blobs or the
+    per-message archive, per CHAT_ARCHIVE_FORMAT).
+    Used to restore conversations that were evicted from Redis after being backed up,
+    one at a time on a cache miss or in bulk after Redis lost its data.
+    """
+
+    def __init__(self, pool=None, archive_format: str = None):
+        self.pool = pool or PostgresPool.shared()
+        self.archive_format = archive_format or os.getenv("CHAT_ARCHIVE_FORMAT", ARCHIVE_BLOB)
+        if self.archive_format not in ARCHIVE_SOURCES:
+            raise ValueError(f"Unknown CHAT_ARCHIVE_FORMAT {self.archive_format!r}")
+        self.source = ARCHIVE_SOURCES[self.archive_format]
+
+    def load(self, user_id: str, level: str, actor: str):
+        """Return (archived messages as a list of dicts, seq of the newest one) for a conversation, or None."""
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT chat_data, last_seq FROM {self.source} WHERE user_id = %s AND level = %s AND actor = %s",
+                    (user_id, level, actor),
+                )
+                row = cursor.fetchone()
+        return (row[0], row[1]) if row else None
+
+    @staticmethod
+    def _filters(after_id: int = 0, since_hours: float = None, user_prefix: str = None) -> tuple:
+        clauses, params = ["id > %s"], [after_id]
+        if since_hours is not None:
+            clauses.append("updated_at >= CURRENT_TIMESTAMP - make_interval(secs => %s)")
+            params.append(since_hours * 3600)
+        if user_prefix:
+            clauses.append("user_id LIKE %s")
+            params.append(user_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        return " AND ".join(clauses), params
+
+    def count(self, after_id: int = 0, since_hours: float = None, user_prefix: str = None) -> int:
+        """Number of rows iter_batches would yield with the same filters."""
+        where, params = self._filters(after_id, since_hours, user_prefix)
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT count(*) FROM {self.source} WHERE {where}", params)
+                return cursor.fetchone()[0]
+
+    def iter_batches(self, batch_size: int = 1000, after_id: int = 0, since_hours: float = None, user_prefix: str = None):
+        """
+        Stream archived conversations in id order as lists of (id, user_id, level, actor, messages, last_seq).
+        Rows come from a server-side (named) cursor, batch_size at a time, so memory stays
+        flat however large the table is. after_id resumes after a checkpoint; since_hours
+        keeps only rows updated in that window; user_prefix keeps matching user_ids.
+        """
+        where, params = self._filters(after_id, since_hours, user_prefix)
+        with self.pool.connection() as conn:
+            # JSONB is read as text and decoded with the chat codec (orjson), which is much
+            # faster than psycopg2's json.loads on large restores
+            with conn.cursor(name=f"chat_restore_{uuid.uuid4().hex[:8]}") as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(
+                    f"SELECT id, user_id, level, actor, chat_data::text, last_seq FROM {self.source} "
+                    f"WHERE {where} ORDER BY id",
+                    params,
+                )
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield [(row_id, user_id, level, actor, codec.loads(chat_data), last_seq)
+                           for row_id, user_id, level, actor, chat_data, last_seq in rows]
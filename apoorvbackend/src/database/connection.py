@@ -0,0 +1,72 @@
+import os
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+from apoorvbackend.src.logger import logger
+
+load_dotenv()
+
+class PostgresPool:
+    """
+    Thread-safe PostgreSQL connection pool shared by the backup service and read paths.
+    Use PostgresPool.shared() to get the process-wide instance.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, dsn=None, minconn=None, maxconn=None):
+        self.dsn = dsn or os.getenv("DATABASE_URL")
+        self.minconn = int(minconn or os.getenv("POSTGRES_POOL_MIN", 1))
+        self.maxconn = int(maxconn or os.getenv("POSTGRES_POOL_MAX", 10))
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls) -> "PostgresPool":
+        """Return the process-wide pool, creating it on first use."""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def _get_pool(self):
+        # Connections are opened (and psycopg2 imported) on first use, not at import/startup
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    from psycopg2.pool import ThreadedConnectionPool
+                    self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, self.dsn)
+                    logger.info(f"PostgreSQL pool created (min={self.minconn}, max={self.maxconn})")
+        return self._pool
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for one transaction.
+        Commits when the block exits normally, rolls back on error, and always returns
+        the connection to the pool.
+        """
+        pool = self._get_pool()
+        conn = pool.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            pool.putconn(conn, close=broken or bool(conn.closed))
+
+    def close(self) -> None:
+        """Close every pooled connection."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
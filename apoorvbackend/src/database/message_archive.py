@@ -0,0 +1,227 @@
+"""
+Message-level chat archive: one row per message in the time-partitioned chat_messages
+table, written by PostgresBackupService when CHAT_ARCHIVE_FORMAT is messages or both.
+
+Run as a module to copy conversations that only exist as chat_history blobs into it
+(the last step before switching CHAT_ARCHIVE_FORMAT from both to messages):
+
+    python -m apoorvbackend.src.database.message_archive --import-blobs
+    python -m apoorvbackend.src.database.message_archive --import-blobs --database-url postgresql://...
+"""
+import argparse
+import csv
+import io
+import json
+from datetime import date
+from dotenv import load_dotenv
+
+from apoorvbackend.src.logger import logger
+from apoorvbackend.src.database.connection import PostgresPool
+from apoorvbackend.src.database.schema import ensure_message_partitions, ensure_message_schema
+
+load_dotenv()
+
+# Every text field is written quoted (QUOTE_NONNUMERIC), so a missing flag arrives as a
+# quoted "" that CSV COPY would read as an empty string; FORCE_NULL makes it NULL
+COPY_MESSAGES = ("COPY chat_messages (user_id, level, actor, seq, role, content, flag) "
+                 "FROM STDIN WITH (FORMAT csv, FORCE_NULL (flag))")
+
+# Copies the blobs of conversations the message archive has never seen, numbered by
+# position, in one statement per id range. Only conversations whose chat_conversations
+# row this statement created get messages, so concurrent runs cannot copy one twice.
+IMPORT_BLOBS = """
+WITH batch AS (
+    SELECT h.user_id, h.level, h.actor, h.chat_data, h.created_at, h.updated_at
+    FROM chat_history h
+    WHERE h.id > %s AND h.id <= %s
+      AND NOT EXISTS (
+          SELECT 1 FROM chat_conversations c
+          WHERE c.user_id = h.user_id AND c.level = h.level AND c.actor = h.actor
+      )
+), imported AS (
+    INSERT INTO chat_conversations (user_id, level, actor, archived_seq, created_at, updated_at)
+    SELECT user_id, level, actor, jsonb_array_length(chat_data), created_at, updated_at FROM batch
+    ON CONFLICT (user_id, level, actor) DO NOTHING
+    RETURNING user_id, level, actor
+)
+INSERT INTO chat_messages (user_id, level, actor, seq, role, content, flag, ts)
+SELECT b.user_id, b.level, b.actor, m.seq, m.message->>'role', COALESCE(m.message->>'content', ''),
+       (m.message->>'flag')::boolean, b.updated_at
+FROM batch b
+JOIN imported i ON i.user_id = b.user_id AND i.level = b.level AND i.actor = b.actor
+CROSS JOIN LATERAL jsonb_array_elements(b.chat_data) WITH ORDINALITY AS m(message, seq)
+"""
+
+
+class MessageArchiveWriter:
+    """
+    Appends the messages of backed-up conversations to chat_messages.
+
+    Every conversation has a chat_conversations row with the seq of its newest archived
+    message. A batch locks those rows, reads only the newer messages from Redis, streams
+    them in with one COPY and advances the rows, all in one transaction, so a message is
+    written once however often its conversation is backed up (deduplicated by key and
+    seq) and a backup writes only what changed.
+    """
+
+    def __init__(self, pool=None, redis_handler=None):
+        self.pool = pool or PostgresPool.shared()
+        self.redis_handler = redis_handler
+        # Month up to which partitions are known to exist (checked again when it changes)
+        self._partitions_month = None
+
+    def ensure_schema(self) -> None:
+        ensure_message_schema(self.pool)
+        self._partitions_month = date.today().replace(day=1)
+
+    def _ensure_partitions(self) -> None:
+        """Create next month's partition once a month; a failure only sends rows to the default partition."""
+        month = date.today().replace(day=1)
+        if month == self._partitions_month:
+            return
+        try:
+            with self.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    ensure_message_partitions(cursor)
+            self._partitions_month = month
+        except Exception as e:
+            logger.error(f"Could not create chat_messages partitions: {e}")
+
+    def archive_keys(self, keys: list) -> tuple:
+        """
+        Archive the new messages of one batch of chat keys. Returns ({(user_id, level, actor):
+        key} of the conversations now fully archived, number of messages written).
+        """
+        from psycopg2.extras import execute_values
+
+        # One conversation per key; a list key wins over a not-yet-migrated legacy key
+        conversations = {}
+        for key in keys:
+            parsed = self.redis_handler.parse_key(key)
+            if parsed is None:
+                logger.warning(f"Invalid key format: {key}")
+                continue
+            if parsed in conversations and not key.startswith("chatlog:"):
+                continue
+            conversations[parsed] = key
+        if not conversations:
+            return {}, 0
+
+        self._ensure_partitions()
+        archived_keys = {}
+        advanced = []
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                values = list(conversations)
+                execute_values(
+                    cursor,
+                    "INSERT INTO chat_conversations (user_id, level, actor) VALUES %s "
+                    "ON CONFLICT (user_id, level, actor) DO NOTHING",
+                    values,
+                )
+                # Locked in id order so concurrent writers cannot deadlock
+                rows = execute_values(
+                    cursor,
+                    """
+                    SELECT c.user_id, c.level, c.actor, c.archived_seq
+                    FROM chat_conversations c
+                    JOIN (VALUES %s) AS v(user_id, level, actor)
+                      ON c.user_id = v.user_id AND c.level = v.level AND c.actor = v.actor
+                    ORDER BY c.id
+                    FOR UPDATE OF c
+                    """,
+                    values,
+                    page_size=len(values),
+                    fetch=True,
+                )
+                archived_seq = {(user_id, level, actor): seq for user_id, level, actor, seq in rows}
+
+                new_messages = self.redis_handler.read_new_messages(
+                    {key: archived_seq[parsed] for parsed, key in conversations.items()}
+                )
+                written = 0
+                for parsed, key in conversations.items():
+                    if key not in new_messages:
+                        continue
+                    seq, start, messages = new_messages[key]
+                    if seq < archived_seq[parsed]:
+                        logger.warning(f"Skipping {key}: Redis numbering ({seq}) is behind the archive "
+                                       f"({archived_seq[parsed]})")
+                        continue
+                    if start > archived_seq[parsed]:
+                        logger.warning(f"{key}: messages {archived_seq[parsed] + 1}..{start} were trimmed "
+                                       f"from Redis before they were archived")
+                    for offset, message in enumerate(messages, start + 1):
+                        writer.writerow((*parsed, offset, message["role"], message["content"] or "",
+                                         message.get("flag")))
+                    written += len(messages)
+                    if seq > archived_seq[parsed]:
+                        advanced.append((*parsed, seq))
+                    archived_keys[parsed] = key
+
+                if written:
+                    buffer.seek(0)
+                    cursor.copy_expert(COPY_MESSAGES, buffer)
+                if advanced:
+                    execute_values(
+                        cursor,
+                        """
+                        UPDATE chat_conversations AS c
+                        SET archived_seq = v.archived_seq, updated_at = CURRENT_TIMESTAMP
+                        FROM (VALUES %s) AS v(user_id, level, actor, archived_seq)
+                        WHERE c.user_id = v.user_id AND c.level = v.level AND c.actor = v.actor
+                        """,
+                        advanced,
+                    )
+        return archived_keys, written
+
+    def import_blobs(self, batch_size: int = 1000) -> int:
+        """
+        Copy chat_history conversations missing from the message archive, batch_size ids
+        per transaction. Returns the number of messages copied.
+        """
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT COALESCE(max(id), 0), min(updated_at) FROM chat_history")
+                max_id, oldest = cursor.fetchone()
+                # Imported messages keep the time of their blob, so give those months partitions too
+                if oldest is not None:
+                    today = date.today()
+                    months = (today.year - oldest.year) * 12 + today.month - oldest.month
+                    ensure_message_partitions(cursor, months_ahead=months + 1, today=oldest.date())
+
+        copied = 0
+        for after_id in range(0, max_id, batch_size):
+            with self.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(IMPORT_BLOBS, (after_id, after_id + batch_size))
+                    copied += cursor.rowcount
+            logger.info(f"Imported chat_history ids up to {min(after_id + batch_size, max_id)} of {max_id} "
+                        f"({copied} messages)")
+        return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--import-blobs", action="store_true", help="copy conversations only stored in chat_history")
+    parser.add_argument("--batch-size", type=int, default=1000, help="chat_history ids per transaction")
+    parser.add_argument("--database-url", default=None, help="Postgres to migrate (default: DATABASE_URL)")
+    args = parser.parse_args()
+
+    pool = PostgresPool(dsn=args.database_url) if args.database_url else PostgresPool.shared()
+    try:
+        archive = MessageArchiveWriter(pool)
+        archive.ensure_schema()
+        stats = {"schema": "ready"}
+        if args.import_blobs:
+            stats["messages_imported"] = archive.import_blobs(args.batch_size)
+        print(json.dumps(stats))
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
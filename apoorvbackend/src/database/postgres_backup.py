@@ -1,127 +1,278 @@
 import os
 import json
 import time
-import psycopg2
-from psycopg2.extras import execute_values
 import threading
 from dotenv import load_dotenv
 
 from apoorvbackend.src.logger import logger
+from apoorvbackend.src.metrics.metrics import BACKUP_KEYS, BACKUP_LEADER, instrumented
+from apoorvbackend.src.database.connection import PostgresPool
+from apoorvbackend.src.database.message_archive import MessageArchiveWriter
+from apoorvbackend.src.database.schema import ARCHIVE_BLOB, ARCHIVE_BOTH, ARCHIVE_MESSAGES, ensure_schema
 from apoorvbackend.src.redis.redis_handlers import RedisChatHandler
+from apoorvbackend.src.redis.leader import LeaderLease
 
 load_dotenv()
 
+# Redis key holding the lease of the process allowed to run backups
+BACKUP_LEADER_KEY = "backup:leader"
+
+
+class BackupLeaseHeld(Exception):
+    """Raised when a backup would run in a process that does not hold the backup lease."""
+
+    def __init__(self, holder):
+        self.holder = holder
+        super().__init__(f"Backups are run by the holder of {BACKUP_LEADER_KEY}: {holder}")
+
+
 class PostgresBackupService:
-    def __init__(self, interval_minutes=5):
-        self.connection_string = os.getenv("DATABASE_URL")
+    """
+    Periodically copies chat histories from Redis to PostgreSQL.
+
+    With leader election on (BACKUP_LEADER_ELECTION=1, the default) every process may
+    run the scheduler, but only the holder of the backup:leader lease runs cycles, so
+    N workers still produce one backup per interval. If the leader dies, another
+    scheduler takes over once the lease expires. Upserts are idempotent, so a cycle
+    that overlaps a failover only rewrites the same rows.
+
+    CHAT_ARCHIVE_FORMAT picks what is written: "blob" (default) upserts the whole history
+    into chat_history, "messages" appends only new messages to chat_messages (see
+    MessageArchiveWriter), "both" does both while migrating.
+    """
+
+    def __init__(self, interval_minutes=5, batch_size=500, pool=None, redis_handler=None, leader_election=None,
+                 archive_format=None):
+        self.pool = pool or PostgresPool.shared()
+        # Number of conversations read from Redis and upserted per transaction
+        self.batch_size = batch_size
+        self.last_backup_stats = None
+        self.total_keys_scanned = 0
+        self.total_rows_written = 0
+        self.total_keys_expiring = 0
+        self.total_messages_archived = 0
         
         self.interval_seconds = interval_minutes * 60
-        self.redis_handler = RedisChatHandler()
+        self.redis_handler = redis_handler or RedisChatHandler()
+        self.archive_format = archive_format or os.getenv("CHAT_ARCHIVE_FORMAT", ARCHIVE_BLOB)
+        if self.archive_format not in (ARCHIVE_BLOB, ARCHIVE_MESSAGES, ARCHIVE_BOTH):
+            raise ValueError(f"Unknown CHAT_ARCHIVE_FORMAT {self.archive_format!r}")
+        self.message_archive = (MessageArchiveWriter(self.pool, self.redis_handler)
+                                if self.archive_format != ARCHIVE_BLOB else None)
         self.running = False
         self.thread = None
-        
-        self._init_db()
-    
-    def _get_connection(self):
-        """Create and return a connection to the PostgreSQL database using the connection string."""
-        return psycopg2.connect(self.connection_string)
+        if leader_election is None:
+            leader_election = os.getenv("BACKUP_LEADER_ELECTION", "1") == "1"
+        self.leader = LeaderLease(self.redis_handler.client, BACKUP_LEADER_KEY) if leader_election else None
+        # Keeps a manual backup and a scheduled cycle of this process from overlapping
+        self._cycle_lock = threading.Lock()
+        # The schema is checked by the first backup cycle, not here, so creating the
+        # service (e.g. at worker startup) never waits on Postgres
+        self._db_ready = False
     
     def _init_db(self):
-        """Initialize the database schema if it doesn't exist."""
+        """Initialize the database schema if it doesn't exist (once per process)."""
+        if self._db_ready:
+            return
         try:
-            with self._get_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS chat_history (
-                        id SERIAL PRIMARY KEY,
-                        user_id VARCHAR(255) NOT NULL,
-                        level VARCHAR(50) NOT NULL,
-                        actor VARCHAR(50) NOT NULL,
-                        chat_data JSONB NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    );
-                    
-                    CREATE INDEX IF NOT EXISTS idx_chat_history_user_id ON chat_history(user_id);
-                    CREATE INDEX IF NOT EXISTS idx_chat_history_level_actor ON chat_history(level, actor);
-                    """)
+            ensure_schema(self.pool)
+            if self.message_archive is not None:
+                self.message_archive.ensure_schema()
+            self._db_ready = True
             logger.info("PostgreSQL database initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing PostgreSQL database: {str(e)}")
     
-    def _backup_all_redis_data(self):
-        """Scan Redis for all chat keys and back them up to PostgreSQL."""
+    def _leading(self) -> bool:
+        return self.leader is None or self.leader.is_leader
+
+    def _scan_chat_keys(self):
+        """Yield every chat key of both storage modes (chat:* strings and chatlog:* lists)."""
+        for pattern in ("chat:*", "chatlog:*"):
+            for key in self.redis_handler.client.scan_iter(match=pattern, count=self.batch_size):
+                yield key.decode('utf-8')
+
+    def _backup_keys(self, keys):
+        """
+        Back up one batch of chat keys in the configured archive format(s).
+        Returns the number of conversations written. Raises BackupLeaseHeld, writing
+        nothing, once this process has lost the backup lease mid-cycle.
+        """
+        if not self._leading():
+            raise BackupLeaseHeld(self.leader.holder())
+        archived_keys = None
+        if self.message_archive is not None:
+            # Messages first: a failure after this leaves blobs behind, never ahead of the
+            # message archive, so seqs restored from blobs (see ChatArchive) stay exact
+            archived_keys, messages = self.message_archive.archive_keys(keys)
+            self.total_messages_archived += messages
+            BACKUP_KEYS.labels("messages").inc(messages)
+        if self.archive_format != ARCHIVE_MESSAGES:
+            blob_keys = self._upsert_blobs(keys)
+            archived_keys = blob_keys if archived_keys is None else {
+                conversation: key for conversation, key in blob_keys.items() if conversation in archived_keys
+            }
+        if not archived_keys:
+            return 0
+
+        # Now safely archived: idle conversations may leave Redis (tiering, REDIS_CHAT_IDLE_TTL)
         try:
-            # Get all keys matching the chat pattern
-            all_keys = []
-            cursor = "0"
-            while cursor != 0:
-                cursor, keys = self.redis_handler.client.scan(cursor=cursor, match="chat:*", count=100)
-                all_keys.extend([key.decode('utf-8') for key in keys])
-            
-            if not all_keys:
+            expired = self.redis_handler.expire_archived(list(archived_keys.values()))
+            self.total_keys_expiring += expired
+            BACKUP_KEYS.labels("expiring").inc(expired)
+        except Exception as e:
+            logger.warning(f"Could not set idle TTL on backed-up chat keys: {e}")
+        return len(archived_keys)
+
+    def _upsert_blobs(self, keys):
+        """
+        Write one batch of chat keys to chat_history: a single pipelined read from Redis
+        and a single multi-row upsert. Returns {(user_id, level, actor): key} of the rows written.
+        """
+        from psycopg2.extras import execute_values
+
+        histories = self.redis_handler.read_full_histories(keys)
+
+        # One row per conversation; a list key wins over a not-yet-migrated legacy key
+        rows = {}
+        archived_keys = {}
+        for key, chat_data in histories.items():
+            parsed = self.redis_handler.parse_key(key)
+            if parsed is None:
+                logger.warning(f"Invalid key format: {key}")
+                continue
+            if parsed in rows and not key.startswith("chatlog:"):
+                continue
+            rows[parsed] = json.dumps(chat_data)
+            archived_keys[parsed] = key
+
+        if not rows:
+            return {}
+
+        # Each batch is its own transaction so a failure only affects this chunk
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                execute_values(
+                    cursor,
+                    """
+                    INSERT INTO chat_history (user_id, level, actor, chat_data)
+                    VALUES %s
+                    ON CONFLICT (user_id, level, actor)
+                    DO UPDATE SET chat_data = EXCLUDED.chat_data, updated_at = CURRENT_TIMESTAMP
+                    """,
+                    [(user_id, level, actor, chat_data) for (user_id, level, actor), chat_data in rows.items()],
+                    page_size=self.batch_size,
+                )
+        return archived_keys
+
+    @instrumented("backup", "cycle")
+    def _backup_all_redis_data(self, full=False):
+        """
+        Back up chat histories from Redis to PostgreSQL.
+        By default only keys recorded in the dirty set since the last cycle are written;
+        full=True scans the whole keyspace (used once at startup to pick up keys written
+        before dirty tracking existed).
+        """
+        started = time.monotonic()
+        keys_scanned = 0
+        rows_written = 0
+        self._init_db()
+        try:
+            if full:
+                batch = []
+                for key in self._scan_chat_keys():
+                    batch.append(key)
+                    if len(batch) >= self.batch_size:
+                        keys_scanned += len(batch)
+                        rows_written += self._backup_keys(batch)
+                        batch = []
+                if batch:
+                    keys_scanned += len(batch)
+                    rows_written += self._backup_keys(batch)
+            else:
+                # Only the keys dirty when the cycle starts: under writes faster than the
+                # backup drains them the cycle still ends, and later keys wait for the next one
+                remaining = self.redis_handler.dirty_count()
+                while remaining > 0:
+                    batch = self.redis_handler.pop_dirty_keys(min(self.batch_size, remaining))
+                    if not batch:
+                        break
+                    remaining -= len(batch)
+                    keys_scanned += len(batch)
+                    try:
+                        rows_written += self._backup_keys(batch)
+                    except Exception:
+                        # Keep the keys for the next cycle instead of losing the changes
+                        self.redis_handler.mark_dirty(batch)
+                        raise
+
+            if not keys_scanned:
                 logger.info("No chat data found in Redis to backup")
-                return
-            
-            rows_to_insert = []
-            for key in all_keys:
-                try:
-                    # Parse the key to extract user_id, level, and actor
-                    parts = key.split(":")
-                    if len(parts) != 4:
-                        logger.warning(f"Invalid key format: {key}")
-                        continue
-                    
-                    _, user_id, level, actor = parts
-                    
-                    # Get the data
-                    data = self.redis_handler.client.get(key)
-                    if not data:
-                        continue
-                    
-                    chat_data = json.loads(data)
-                    
-                    # Add to batch for processing
-                    rows_to_insert.append((user_id, level, actor, json.dumps(chat_data)))
-                
-                except Exception as e:
-                    logger.error(f"Error processing key {key}: {str(e)}")
-            
-            # Perform all database operations in a single connection
-            if rows_to_insert:
-                with self._get_connection() as conn:
-                    with conn.cursor() as cursor:
-                        # For each row, try to update if exists, otherwise insert
-                        for user_id, level, actor, chat_data_json in rows_to_insert:
-                            cursor.execute(
-                                """
-                                INSERT INTO chat_history (user_id, level, actor, chat_data)
-                                VALUES (%s, %s, %s, %s)
-                                ON CONFLICT (user_id, level, actor) 
-                                DO UPDATE SET chat_data = EXCLUDED.chat_data, updated_at = CURRENT_TIMESTAMP
-                                """,
-                                (user_id, level, actor, chat_data_json)
-                            )
-            
-            logger.info(f"Successfully backed up {len(all_keys)} chat histories to PostgreSQL")
-        
+            else:
+                logger.info(f"Successfully backed up {rows_written} chat histories to PostgreSQL")
+
+        except BackupLeaseHeld as e:
+            logger.warning(f"Backup cycle stopped, lease lost: {e}")
         except Exception as e:
             logger.error(f"Error backing up Redis data to PostgreSQL: {str(e)}")
+
+        finally:
+            duration = time.monotonic() - started
+            self.last_backup_stats = {
+                "mode": "full" if full else "incremental",
+                "keys_scanned": keys_scanned,
+                "rows_written": rows_written,
+                "duration_seconds": round(duration, 3),
+                "finished_at": time.time(),
+            }
+            self.total_keys_scanned += keys_scanned
+            self.total_rows_written += rows_written
+            BACKUP_KEYS.labels("scanned").inc(keys_scanned)
+            BACKUP_KEYS.labels("written").inc(rows_written)
+            logger.info(
+                f"Backup cycle ({self.last_backup_stats['mode']}): scanned {keys_scanned} keys, "
+                f"wrote {rows_written} rows in {duration:.3f}s"
+            )
+
+    def stats(self) -> dict:
+        """Return metrics for the last and all backup cycles."""
+        return {
+            "last_backup": self.last_backup_stats,
+            "total_keys_scanned": self.total_keys_scanned,
+            "total_rows_written": self.total_rows_written,
+            "total_keys_expiring": self.total_keys_expiring,
+            "total_messages_archived": self.total_messages_archived,
+            "archive_format": self.archive_format,
+            "idle_ttl_seconds": self.redis_handler.idle_ttl,
+            "pending_dirty_keys": self.redis_handler.dirty_count(),
+            "scheduler_running": self.running,
+            "is_leader": self.leader.is_leader if self.leader else self.running,
+            "leader": self.leader.holder() if self.leader else None,
+        }
     
     def _scheduler_loop(self):
         """The main scheduler loop that runs in a separate thread."""
+        # The first cycle is a full scan to pick up keys written before dirty tracking
+        full = True
+        next_run = 0.0
         while self.running:
-            try:
-                logger.info("Starting scheduled backup of Redis data to PostgreSQL")
-                self._backup_all_redis_data()
-            except Exception as e:
-                logger.error(f"Error in scheduler loop: {str(e)}")
-            
-            # Sleep for the specified interval
-            time_to_sleep = self.interval_seconds
-            while time_to_sleep > 0 and self.running:
-                time.sleep(min(1, time_to_sleep))
-                time_to_sleep -= 1
+            leading = self._leading()
+            BACKUP_LEADER.set(1 if leading else 0)
+            if not leading:
+                # Run as soon as leadership is gained
+                next_run = 0.0
+            elif time.monotonic() >= next_run:
+                try:
+                    logger.info("Starting scheduled backup of Redis data to PostgreSQL")
+                    with self._cycle_lock:
+                        self._backup_all_redis_data(full=full)
+                    full = False
+                except Exception as e:
+                    logger.error(f"Error in scheduler loop: {str(e)}")
+                next_run = time.monotonic() + self.interval_seconds
+
+            time.sleep(1)
+        BACKUP_LEADER.set(0)
     
     def start(self):
         """Start the backup scheduler."""
@@ -130,6 +281,8 @@ class PostgresBackupService:
             return
         
         self.running = True
+        if self.leader:
+            self.leader.start()
         self.thread = threading.Thread(target=self._scheduler_loop, daemon=True)
         self.thread.start()
         logger.info(f"PostgreSQL backup scheduler started with {self.interval_seconds / 60} minute interval")
@@ -143,9 +296,28 @@ class PostgresBackupService:
         self.running = False
         if self.thread:
             self.thread.join(timeout=10)
+        if self.leader:
+            self.leader.stop()
         logger.info("PostgreSQL backup scheduler stopped")
     
-    def backup_now(self):
-        """Manually trigger a backup."""
+    def backup_now(self, full=False, lease_timeout: float = 2.0):
+        """
+        Manually trigger a backup. With leader election it only runs in the lease holder:
+        a running scheduler must hold it, otherwise the lease is taken for the backup.
+        Raises BackupLeaseHeld when another process holds it.
+        """
         logger.info("Manual backup of Redis data to PostgreSQL triggered")
-        self._backup_all_redis_data()
\ No newline at end of file
+        if self.leader is not None and not self.running:
+            self.leader.start()
+            try:
+                if not self.leader.wait(lease_timeout):
+                    raise BackupLeaseHeld(self.leader.holder())
+                with self._cycle_lock:
+                    self._backup_all_redis_data(full=full)
+            finally:
+                self.leader.stop()
+            return
+        if not self._leading():
+            raise BackupLeaseHeld(self.leader.holder())
+        with self._cycle_lock:
+            self._backup_all_redis_data(full=full)
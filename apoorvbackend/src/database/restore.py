@@ -0,0 +1,206 @@
+"""
+Bulk restore of chat histories from the Postgres archive (chat_history, or the
+message archive with CHAT_ARCHIVE_FORMAT=messages) into Redis,
+for warming a new or flushed Redis.
+
+    python -m apoorvbackend.src.database.restore
+    python -m apoorvbackend.src.database.restore --since-hours 48 --workers 8
+    python -m apoorvbackend.src.database.restore --resume
+    python -m apoorvbackend.src.database.restore --redis-url redis://localhost:6379/1 --database-url postgresql://...
+
+Conversations that already exist in Redis are skipped, so running it against a live
+Redis never overwrites newer data. Progress is checkpointed in Redis after every
+batch; --resume continues an interrupted run with its original filters.
+"""
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from apoorvbackend.src.logger import logger
+from apoorvbackend.src.metrics.metrics import BACKUP_KEYS, timed
+from apoorvbackend.src.database.chat_archive import ChatArchive
+from apoorvbackend.src.redis.leader import LeaderLease
+from apoorvbackend.src.redis.redis_handlers import RedisChatHandler
+
+load_dotenv()
+
+# Hash with the progress of an unfinished restore (last_id and the filters it runs with)
+RESTORE_CHECKPOINT_KEY = "restore:checkpoint"
+# Set once a restore finished; missing on a new or flushed Redis
+RESTORE_DONE_KEY = "restore:done"
+# Lease of the one process running the startup restore
+RESTORE_LEADER_KEY = "restore:leader"
+
+
+class RedisRestoreService:
+    """
+    Streams archived conversations through a server-side cursor and writes them into Redis.
+
+    The cursor is read in id order, batch_size rows at a time, while up to `workers`
+    threads each write a batch in one pipeline round trip (one Lua call per conversation
+    that restores it only if absent). Batches complete in order, so after each one the
+    checkpoint records the highest id fully written.
+    """
+
+    def __init__(self, redis_handler=None, archive=None, batch_size: int = None, workers: int = None,
+                 progress_interval: float = 10.0):
+        self.redis_handler = redis_handler or RedisChatHandler()
+        self.redis = self.redis_handler.client
+        self.archive = archive or ChatArchive()
+        self.batch_size = int(batch_size or os.getenv("RESTORE_BATCH_SIZE", 1000))
+        self.workers = int(workers or os.getenv("RESTORE_WORKERS", 4))
+        self.progress_interval = progress_interval
+        self.last_restore_stats = None
+
+    def _write_batch(self, rows: list) -> tuple:
+        """Restore one batch; returns (restored, skipped)."""
+        conversations = [(user_id, level, actor, messages, last_seq)
+                         for _, user_id, level, actor, messages, last_seq in rows if messages]
+        with timed("restore", "batch"):
+            restored = self.redis_handler.restore_conversations(conversations)
+        return restored, len(rows) - restored
+
+    def _load_checkpoint(self):
+        checkpoint = self.redis.hgetall(RESTORE_CHECKPOINT_KEY)
+        if not checkpoint:
+            return None
+        checkpoint = {key.decode("utf-8"): value.decode("utf-8") for key, value in checkpoint.items()}
+        return {
+            "last_id": int(checkpoint.get("last_id", 0)),
+            "since_hours": float(checkpoint["since_hours"]) if checkpoint.get("since_hours") else None,
+            "user_prefix": checkpoint.get("user_prefix") or None,
+        }
+
+    def run(self, since_hours: float = None, user_prefix: str = None, resume: bool = False) -> dict:
+        """
+        Restore every archived conversation (or those updated in the last since_hours,
+        or of user_ids starting with user_prefix). With resume, an unfinished run's
+        checkpoint and filters are used instead. Returns the run's stats.
+        """
+        after_id = 0
+        checkpoint = self._load_checkpoint() if resume else None
+        if checkpoint is not None:
+            after_id, since_hours, user_prefix = checkpoint["last_id"], checkpoint["since_hours"], checkpoint["user_prefix"]
+            logger.info(f"Resuming restore after id {after_id} (since_hours={since_hours}, user_prefix={user_prefix})")
+        else:
+            self.redis.delete(RESTORE_CHECKPOINT_KEY)
+            self.redis.hset(RESTORE_CHECKPOINT_KEY, mapping={
+                "last_id": 0, "since_hours": since_hours if since_hours is not None else "", "user_prefix": user_prefix or "",
+            })
+
+        total = self.archive.count(after_id, since_hours, user_prefix)
+        logger.info(f"Restoring {total} archived conversations into Redis "
+                    f"({self.workers} writers, {self.batch_size} per batch)")
+
+        started = time.monotonic()
+        stats = {"total": total, "rows": 0, "restored": 0, "skipped": 0, "last_id": after_id}
+        next_report = started + self.progress_interval
+
+        def complete(entry) -> None:
+            nonlocal next_report
+            future, rows, last_id = entry
+            restored, skipped = future.result()
+            stats["rows"] += rows
+            stats["restored"] += restored
+            stats["skipped"] += skipped
+            stats["last_id"] = last_id
+            BACKUP_KEYS.labels("restored").inc(restored)
+            self.redis.hset(RESTORE_CHECKPOINT_KEY, "last_id", last_id)
+            if time.monotonic() >= next_report:
+                self._report(stats, started)
+                next_report = time.monotonic() + self.progress_interval
+
+        # At most 2 batches per writer in flight keeps memory bounded while Postgres
+        # streaming and Redis writes overlap
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="restore") as executor:
+            for rows in self.archive.iter_batches(self.batch_size, after_id, since_hours, user_prefix):
+                pending.append((executor.submit(self._write_batch, rows), len(rows), rows[-1][0]))
+                while len(pending) >= self.workers * 2:
+                    complete(pending.popleft())
+            while pending:
+                complete(pending.popleft())
+
+        self.redis.delete(RESTORE_CHECKPOINT_KEY)
+        self._report(stats, started)
+        stats["duration_seconds"] = round(time.monotonic() - started, 3)
+        stats["finished_at"] = time.time()
+        self.redis.set(RESTORE_DONE_KEY, json.dumps(stats))
+        self.last_restore_stats = stats
+        return stats
+
+    @staticmethod
+    def _report(stats: dict, started: float) -> None:
+        elapsed = max(time.monotonic() - started, 1e-6)
+        rate = stats["rows"] / elapsed
+        remaining = max(stats["total"] - stats["rows"], 0)
+        eta = f", ETA {remaining / rate:.0f}s" if rate and remaining else ""
+        percent = 100 * stats["rows"] / stats["total"] if stats["total"] else 100.0
+        logger.info(
+            f"Restore: {stats['rows']}/{stats['total']} rows ({percent:.1f}%), {stats['restored']} restored, "
+            f"{stats['skipped']} already in Redis, {rate:.0f} rows/s{eta}"
+        )
+
+    def finished(self) -> bool:
+        """True once a restore has completed in this Redis and none is unfinished."""
+        return bool(self.redis.exists(RESTORE_DONE_KEY)) and not self.redis.exists(RESTORE_CHECKPOINT_KEY)
+
+    def run_if_needed(self):
+        """
+        Startup mode: restore when Redis has no record of a finished restore (new or
+        flushed Redis) or an earlier run was interrupted. Only one process restores at
+        a time; the others return at once. Returns the stats, or None if nothing ran.
+        """
+        if self.finished():
+            return None
+
+        lease = LeaderLease(self.redis, RESTORE_LEADER_KEY)
+        lease.start()
+        try:
+            if not lease.wait(2):
+                logger.info(f"Startup restore is run by {lease.holder()}")
+                return None
+            return self.run(resume=True)
+        except Exception as e:
+            logger.error(f"Startup restore failed, rerun with --resume: {e}")
+            return None
+        finally:
+            lease.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since-hours", type=float, default=None, help="only conversations updated in this window")
+    parser.add_argument("--user-prefix", default=None, help="only user_ids starting with this prefix")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted restore from its checkpoint")
+    parser.add_argument("--batch-size", type=int, default=None, help="rows per cursor fetch and Redis pipeline")
+    parser.add_argument("--workers", type=int, default=None, help="threads writing batches to Redis")
+    parser.add_argument("--redis-url", default=None, help="Redis to restore into (default: REDIS_HOST/PORT/DB)")
+    parser.add_argument("--database-url", default=None, help="Postgres to read from (default: DATABASE_URL)")
+    args = parser.parse_args()
+
+    from apoorvbackend.src.database.connection import PostgresPool
+
+    if args.redis_url:
+        import redis
+        import redis.asyncio as aioredis
+        redis_handler = RedisChatHandler(client=redis.Redis.from_url(args.redis_url),
+                                         async_client=aioredis.Redis.from_url(args.redis_url))
+    else:
+        redis_handler = RedisChatHandler()
+    pool = PostgresPool(dsn=args.database_url) if args.database_url else PostgresPool.shared()
+
+    service = RedisRestoreService(redis_handler, ChatArchive(pool), batch_size=args.batch_size, workers=args.workers)
+    try:
+        stats = service.run(since_hours=args.since_hours, user_prefix=args.user_prefix, resume=args.resume)
+        print(json.dumps(stats))
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+from datetime import date, timedelta
+
+from apoorvbackend.src.database.connection import PostgresPool
+from apoorvbackend.src.logger import logger
+
+CHAT_HISTORY_TABLE = """
+CREATE TABLE IF NOT EXISTS chat_history (
+    id SERIAL PRIMARY KEY,
+    user_id VARCHAR(255) NOT NULL,
+    level VARCHAR(50) NOT NULL,
+    actor VARCHAR(50) NOT NULL,
+    chat_data JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_history_user_id ON chat_history(user_id);
+CREATE INDEX IF NOT EXISTS idx_chat_history_level_actor ON chat_history(level, actor);
+"""
+
+# The backup upsert uses ON CONFLICT (user_id, level, actor), which needs this index
+CONVERSATION_UNIQUE_INDEX = "ux_chat_history_conversation"
+
+# Keeps the most recently updated row of every conversation so the unique index can be built
+DEDUPLICATE_CHAT_HISTORY = """
+DELETE FROM chat_history a
+USING chat_history b
+WHERE a.user_id = b.user_id
+  AND a.level = b.level
+  AND a.actor = b.actor
+  AND (a.updated_at, a.id) < (b.updated_at, b.id);
+"""
+
+CREATE_CONVERSATION_UNIQUE_INDEX = f"""
+CREATE UNIQUE INDEX IF NOT EXISTS {CONVERSATION_UNIQUE_INDEX}
+ON chat_history(user_id, level, actor);
+"""
+
+
+def ensure_schema(pool: PostgresPool) -> None:
+    """Create the chat_history table and the unique index required by the backup upsert."""
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(CHAT_HISTORY_TABLE)
+            cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s", (CONVERSATION_UNIQUE_INDEX,))
+            if cursor.fetchone() is None:
+                cursor.execute(DEDUPLICATE_CHAT_HISTORY)
+                if cursor.rowcount:
+                    logger.warning(f"Removed {cursor.rowcount} duplicate chat_history rows before adding unique index")
+                cursor.execute(CREATE_CONVERSATION_UNIQUE_INDEX)
+                logger.info(f"Created unique index {CONVERSATION_UNIQUE_INDEX} on chat_history")
+
+
+# Archive formats (CHAT_ARCHIVE_FORMAT): one JSONB blob per conversation in chat_history,
+# one row per message in chat_messages, or both while migrating from one to the other
+ARCHIVE_BLOB = "blob"
+ARCHIVE_MESSAGES = "messages"
+ARCHIVE_BOTH = "both"
+
+# chat_messages is append-only and partitioned by month of ts (when the message was
+# archived). Postgres cannot enforce uniqueness across partitions on (conversation, seq),
+# so chat_conversations keeps the highest seq archived per conversation and ingestion
+# only copies messages past it.
+CHAT_MESSAGES_TABLES = """
+CREATE TABLE IF NOT EXISTS chat_conversations (
+    id BIGSERIAL PRIMARY KEY,
+    user_id VARCHAR(255) NOT NULL,
+    level VARCHAR(50) NOT NULL,
+    actor VARCHAR(50) NOT NULL,
+    archived_seq BIGINT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, level, actor)
+);
+
+CREATE TABLE IF NOT EXISTS chat_messages (
+    user_id VARCHAR(255) NOT NULL,
+    level VARCHAR(50) NOT NULL,
+    actor VARCHAR(50) NOT NULL,
+    seq BIGINT NOT NULL,
+    role VARCHAR(10) NOT NULL,
+    content TEXT NOT NULL,
+    flag BOOLEAN,
+    ts TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) PARTITION BY RANGE (ts);
+
+CREATE TABLE IF NOT EXISTS chat_messages_default PARTITION OF chat_messages DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_chat_messages_conversation ON chat_messages(user_id, level, actor, seq);
+"""
+
+# Compatibility view with the columns of chat_history (plus last_seq), so readers of the
+# per-conversation shape work unchanged on the message archive
+CHAT_HISTORY_VIEW = "chat_history_compat"
+
+CREATE_CHAT_HISTORY_VIEW = f"""
+CREATE OR REPLACE VIEW {CHAT_HISTORY_VIEW} AS
+SELECT c.id, c.user_id, c.level, c.actor,
+       COALESCE(m.chat_data, '[]'::jsonb) AS chat_data,
+       c.created_at, c.updated_at, c.archived_seq AS last_seq
+FROM chat_conversations c
+LEFT JOIN LATERAL (
+    SELECT jsonb_agg(
+               CASE WHEN role = 'human' THEN jsonb_build_object('role', role, 'content', content)
+                    ELSE jsonb_build_object('role', role, 'content', content, 'flag', flag) END
+               ORDER BY seq
+           ) AS chat_data
+    FROM chat_messages
+    WHERE chat_messages.user_id = c.user_id AND chat_messages.level = c.level AND chat_messages.actor = c.actor
+) m ON true;
+"""
+
+
+def message_partition(month: date) -> tuple:
+    """(name, first day, first day of the next month) of the chat_messages partition holding month."""
+    start = month.replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return f"chat_messages_{start:%Y_%m}", start, end
+
+
+def ensure_message_partitions(cursor, months_ahead: int = 1, today: date = None) -> None:
+    """Create the monthly chat_messages partitions for this month and the next months_ahead."""
+    month = (today or date.today()).replace(day=1)
+    for _ in range(months_ahead + 1):
+        name, start, end = message_partition(month)
+        cursor.execute("SELECT to_regclass(%s)", (name,))
+        if cursor.fetchone()[0] is None:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF chat_messages "
+                f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+            )
+            logger.info(f"Created chat_messages partition {name}")
+        month = end
+
+
+def ensure_message_schema(pool: PostgresPool) -> None:
+    """Create the message archive tables, the current partitions and the compatibility view."""
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(CHAT_MESSAGES_TABLES)
+            ensure_message_partitions(cursor)
+            cursor.execute(CREATE_CHAT_HISTORY_VIEW)
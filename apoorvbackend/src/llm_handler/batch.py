@@ -0,0 +1,202 @@
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from contextlib import nullcontext
+from dotenv import load_dotenv
+
+from langchain_core.runnables import RunnableLambda
+from pydantic import ValidationError
+
+from apoorvbackend.src.logger import logger
+from apoorvbackend.src.metrics.metrics import timed
+from apoorvbackend.src.models.chat_models import ChatRecord, ChatRequest
+from apoorvbackend.src.redis.rate_limiter import RateLimitExceeded
+
+load_dotenv()
+
+# Marks the end of the results queue
+_DONE = object()
+
+
+def parse_requests(lines) -> list:
+    """
+    Parse JSONL lines into ChatRequests. A line that is not a valid request becomes
+    its ValueError instead, so it can be reported per item. Blank lines are skipped.
+    """
+    requests = []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.strip():
+            continue
+        try:
+            requests.append(ChatRequest(**json.loads(line)))
+        except (ValueError, TypeError, ValidationError) as e:
+            requests.append(ValueError(f"Invalid request: {e}"))
+    return requests
+
+
+class BatchChatRunner:
+    """
+    Runs many chat turns at once, for NPC/ambient dialogue and offline prompt QA.
+
+    All histories are loaded in one Redis pipeline. Turns of the same conversation
+    run in input order, each seeing the replies before it; different conversations
+    run concurrently through Runnable.abatch, at most max_concurrency at a time.
+    Finished turns are written back in pipelined groups (up to write_batch_size) and
+    each result is yielded only once its turn is saved. A failing item produces an
+    error result and never stops the rest of the batch.
+    """
+
+    def __init__(self, redis_handler, handler, summarizer=None, rate_limiter=None, response_cache=None,
+                 max_concurrency: int = None, write_batch_size: int = None, slot_wait: float = None,
+                 check_users: bool = True, save: bool = True):
+        self.redis_handler = redis_handler
+        self.handler = handler
+        self.summarizer = summarizer
+        self.rate_limiter = rate_limiter
+        self.response_cache = response_cache
+        self.max_concurrency = int(max_concurrency or os.getenv("BATCH_MAX_CONCURRENCY", 8))
+        self.write_batch_size = int(write_batch_size or os.getenv("BATCH_WRITE_SIZE", 50))
+        # Seconds an item keeps retrying for a free LLM slot before it is reported as rate limited
+        self.slot_wait = float(slot_wait if slot_wait is not None else os.getenv("BATCH_SLOT_WAIT", 30))
+        # Per-user token buckets apply to client batches; offline runs turn them off
+        self.check_users = check_users
+        # False leaves Redis untouched (history still threads through the batch in memory)
+        self.save = save
+
+    @staticmethod
+    def _error(index: int, request, error: Exception) -> dict:
+        result = {"index": index}
+        if isinstance(request, ChatRequest):
+            result.update(user_id=request.user_id, level=request.level, actor=request.actor)
+        result["error"] = str(error)
+        result["status"] = 429 if isinstance(error, RateLimitExceeded) else 400 if isinstance(error, ValueError) else 500
+        return result
+
+    async def _generate(self, request: ChatRequest, chat_history: list, summary: str = None) -> ChatRecord:
+        if self.response_cache is not None:
+            response = await self.response_cache.aget(request.level, request.actor, chat_history, request.user_input,
+                                                     summary)
+            if response is not None:
+                return response
+
+        waited = 0.0
+        while True:
+            try:
+                async with self.rate_limiter.llm_slot() if self.rate_limiter is not None else nullcontext():
+                    response = await self.handler.aget_response(
+                        request.level, request.actor, request.user_input, chat_history, summary
+                    )
+                break
+            except RateLimitExceeded as e:
+                # Only waiting for a concurrency slot is retried; token buckets are reported
+                if e.scope != "concurrency" or waited >= self.slot_wait:
+                    raise
+                await asyncio.sleep(e.retry_after)
+                waited += e.retry_after
+
+        if self.response_cache is not None:
+            await self.response_cache.aset(request.level, request.actor, chat_history, request.user_input, response,
+                                          summary)
+        return response
+
+    async def _run_conversation(self, job: dict) -> None:
+        """Run the turns of one conversation in order, putting each outcome on the results queue."""
+        chat_history, summary = job["history"], job["summary"]
+        for index, request in job["items"]:
+            try:
+                if self.check_users and self.rate_limiter is not None:
+                    await self.rate_limiter.check_user(request.user_id)
+                response = await self._generate(request, chat_history, summary)
+            except Exception as e:
+                logger.error(f"Batch item {index} failed: {e}")
+                await job["queue"].put((self._error(index, request, e), None))
+                continue
+
+            turn = [ChatRecord.human(request.user_input), response]
+            previous, chat_history = chat_history, chat_history + turn
+            result = {"index": index, "user_id": request.user_id, "level": request.level, "actor": request.actor,
+                      "message": response.content, "flag": response.flag}
+            await job["queue"].put((result, (request.user_id, request.level, request.actor, turn, previous, chat_history)))
+
+    async def _flush(self, ready: list) -> list:
+        """Save the turns of the ready results in one pipeline; returns the results to emit."""
+        writes = [write for _, write in ready if write is not None]
+        if writes and self.save:
+            try:
+                await self.redis_handler.aappend_turns([write[:5] for write in writes])
+            except Exception as e:
+                logger.error(f"Saving {len(writes)} batch turns failed: {e}")
+                return [self._error(result["index"], None, e) if write is not None else result for result, write in ready]
+            if self.summarizer is not None:
+                for user_id, level, actor, _, _, chat_history in writes:
+                    self.summarizer.after_turn(user_id, level, actor, chat_history)
+        return [result for result, _ in ready]
+
+    async def run(self, requests: list):
+        """
+        Async generator over the results of requests (ChatRequests, or exceptions from
+        parse_requests), in completion order. Each result carries the item's input
+        index and either message/flag or error/status.
+        """
+        queue = asyncio.Queue()
+        conversations = OrderedDict()
+        for index, request in enumerate(requests):
+            if isinstance(request, Exception):
+                await queue.put((self._error(index, None, request), None))
+                continue
+            conversations.setdefault((request.user_id, request.level, request.actor), []).append((index, request))
+
+        jobs = []
+        if conversations:
+            try:
+                with timed("batch", "load"):
+                    if self.summarizer is not None:
+                        loaded = await self.summarizer.aload_many(list(conversations))
+                    else:
+                        loaded = await self.redis_handler.aload_conversations(list(conversations))
+            except Exception as e:
+                logger.error(f"Loading {len(conversations)} batch histories failed: {e}")
+                loaded = None
+                for items in conversations.values():
+                    for index, request in items:
+                        await queue.put((self._error(index, request, e), None))
+            if loaded is not None:
+                jobs = [{"items": items, "history": history, "summary": summary, "queue": queue}
+                        for items, (history, summary) in zip(conversations.values(), loaded)]
+                if self.summarizer is not None:
+                    for history, summary in loaded:
+                        self.summarizer.account(history, summary)
+
+        logger.info(f"Running batch of {len(requests)} items over {len(jobs)} conversations")
+
+        async def produce():
+            try:
+                await RunnableLambda(self._run_conversation).abatch(
+                    jobs, config={"max_concurrency": self.max_concurrency}, return_exceptions=True
+                )
+            finally:
+                await queue.put(_DONE)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                ready = [await queue.get()]
+                # Group commit: whatever finished meanwhile is saved in the same round trip
+                while ready[-1] is not _DONE and not queue.empty() and len(ready) < self.write_batch_size:
+                    ready.append(queue.get_nowait())
+                done = ready[-1] is _DONE
+                if done:
+                    ready.pop()
+                if ready:
+                    for result in await self._flush(ready):
+                        yield result
+                if done:
+                    break
+        finally:
+            if not producer.done():
+                producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
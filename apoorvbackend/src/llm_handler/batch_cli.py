@@ -0,0 +1,84 @@
+"""
+Offline batch chat runner, e.g. for rerunning scripted conversations in prompt QA.
+
+Reads a JSONL file of ChatRequests ({"user_id", "level", "actor", "user_input"} per
+line) and writes one NDJSON result per line, in completion order, with the `index`
+of its input line and either `message`/`flag` or `error`/`status`.
+
+    python -m apoorvbackend.src.llm_handler.batch_cli conversations.jsonl -o results.jsonl
+    python -m apoorvbackend.src.llm_handler.batch_cli conversations.jsonl --no-save --concurrency 16
+
+Uses the same Redis, LLM providers and provider rate limits as the API; per-user
+limits are not applied.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from contextlib import nullcontext
+from dotenv import load_dotenv
+
+from apoorvbackend.src.logger import log_to_stderr, logger
+from apoorvbackend.src.llm_handler.batch import BatchChatRunner, parse_requests
+from apoorvbackend.src.llm_handler.handler import Handler
+from apoorvbackend.src.llm_handler.summarizer import ConversationSummarizer
+from apoorvbackend.src.prompt_loader.loader import PromptLoader
+from apoorvbackend.src.redis.rate_limiter import RateLimiter
+from apoorvbackend.src.redis.redis_handlers import RedisChatHandler
+
+load_dotenv()
+
+
+async def run(args) -> int:
+    """Run the batch; returns the number of failed items."""
+    # nullcontext so reading from stdin does not close it
+    with open(args.input) if args.input != "-" else nullcontext(sys.stdin) as f:
+        requests = parse_requests(f)
+
+    PromptLoader.preload()
+    redis_handler = RedisChatHandler()
+    rate_limiter = RateLimiter(redis_handler.async_client)
+    handler = Handler(rate_limiter=rate_limiter)
+    summarizer = ConversationSummarizer(redis_handler, rate_limiter=rate_limiter)
+    runner = BatchChatRunner(
+        redis_handler, handler, summarizer=summarizer, rate_limiter=rate_limiter,
+        max_concurrency=args.concurrency, write_batch_size=args.write_batch_size,
+        check_users=False, save=not args.no_save,
+    )
+
+    started = time.perf_counter()
+    failed = 0
+    out = open(args.output, "w") if args.output != "-" else sys.stdout
+    try:
+        async for result in runner.run(requests):
+            failed += "error" in result
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        await summarizer.aclose()
+        await redis_handler.aclose()
+
+    logger.info(f"Batch of {len(requests)} items done in {time.perf_counter() - started:.1f}s, {failed} failed")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of chat requests, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="NDJSON results file (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=None, help="conversations run at once (BATCH_MAX_CONCURRENCY)")
+    parser.add_argument("--write-batch-size", type=int, default=None, help="turns saved per Redis round trip (BATCH_WRITE_SIZE)")
+    parser.add_argument("--no-save", action="store_true", help="do not write the new turns to Redis")
+    args = parser.parse_args()
+    # Keep stdout pure NDJSON when results go there
+    log_to_stderr()
+
+    failed = asyncio.run(run(args))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
+from apoorvbackend.src.models.chat_models import LLMResponse
+from apoorvbackend.src.logger import logger
+from apoorvbackend.src.metrics.metrics import CACHE_EVENTS
+import threading
+
+
+class ChainRegistry:
+    """
+    Process-wide memo of composed `prompt | structured llm` runnables.
+
+    Structured-output wrappers are built once per provider, and composed chains
+    once per (level, actor, provider). A chain is rebuilt only when the prompt
+    loader hands back a different template (i.e. the prompt file changed).
+    """
+
+    def __init__(self, schema=LLMResponse):
+        self.schema = schema
+        # JSON-schema form of the output model; its parser yields partial dicts while streaming
+        self.stream_schema = schema.model_json_schema()
+        self._structured_llms = {}
+        # (level, actor, provider, streaming) -> (prompt template, chain)
+        self._chains = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_structured_llm(self, provider: str, llm, streaming: bool = False) -> Runnable:
+        structured_llm = self._structured_llms.get((provider, streaming))
+        if structured_llm is None:
+            schema = self.stream_schema if streaming else self.schema
+            structured_llm = llm.with_structured_output(schema=schema)
+            self._structured_llms[(provider, streaming)] = structured_llm
+        return structured_llm
+
+    def get_chain(self, level: str, actor: str, provider: str, prompt: ChatPromptTemplate, llm, streaming: bool = False) -> Runnable:
+        """
+        Return the memoized chain. With streaming=True the chain emits progressively
+        more complete dicts instead of one validated model instance.
+        """
+        key = (level, actor, provider, streaming)
+        entry = self._chains.get(key)
+        if entry is not None and entry[0] is prompt:
+            self.hits += 1
+            CACHE_EVENTS.labels("chain", "hit").inc()
+            return entry[1]
+
+        with self._lock:
+            entry = self._chains.get(key)
+            if entry is not None and entry[0] is prompt:
+                self.hits += 1
+                CACHE_EVENTS.labels("chain", "hit").inc()
+                return entry[1]
+
+            logger.info(f"Building chain for {level}/{actor} on {provider}")
+            chain = prompt | self._get_structured_llm(provider, llm, streaming)
+            self._chains[key] = (prompt, chain)
+            self.misses += 1
+            CACHE_EVENTS.labels("chain", "miss").inc()
+            return chain
+
+    def clear(self) -> None:
+        with self._lock:
+            self._structured_llms.clear()
+            self._chains.clear()
+
+    def stats(self) -> dict:
+        """Return cache hit/miss counters."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._chains)}
@@ -1,67 +1,296 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.messages import BaseMessage, HumanMessage
-from langchain.schema import HumanMessage, SystemMessage, BaseMessage, AIMessage
-from langchain.chat_models import ChatOpenAI 
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from apoorvbackend.src.llm_handler.llm import LLM
-from apoorvbackend.src.models.chat_models import LLMResponse
+from apoorvbackend.src.llm_handler.load_balancer import LoadBalancer, is_quota_error
+from apoorvbackend.src.llm_handler.chain_registry import ChainRegistry
+from apoorvbackend.src.llm_handler.router import ProviderRouter
+from apoorvbackend.src.prompt_loader.loader import PromptLoader
+from apoorvbackend.src.models.chat_models import ChatRecord, LLMResponse
+from apoorvbackend.src.redis.rate_limiter import RateLimitExceeded
 from apoorvbackend.src.logger import logger
-from typing import List, Union
-import openai
-import requests
+from apoorvbackend.src.metrics.metrics import LLM_CALLS, LLM_FALLBACKS, LLM_HEDGES, STAGE_SECONDS, timed
+from typing import List
+import asyncio
+import os
+import time
+from contextlib import AsyncExitStack
+
 
-    
 class Handler:
+    """
+    Stateless chat service shared by all requests.
 
-    def __init__(self):
-        self.llama_llm = LLM.get_llama_llm()
-        self.gemini_llm = LLM.get_gemini_llm()
-        self.prompt = None
-        self.chat_history = None
-        self.chain = None
+    Everything set in __init__ is read-only afterwards; per-request data (prompt,
+    messages, chain) only ever lives in local variables, so a single instance
+    can serve concurrent threads and coroutines. Provider clients are built on
+    first use, so constructing a Handler costs nothing at import time.
+    """
 
-    def _get_chain(self, prompt: ChatPromptTemplate, llm: Union[ChatGoogleGenerativeAI, ChatOpenAI]):
-        self.prompt = prompt
-        return self.prompt | llm.with_structured_output(schema=LLMResponse)
+    def __init__(self, llama_llm=None, gemini_llm=None, load_balancer=None, router=None, rate_limiter=None):
+        # A fixed Llama model (e.g. a fake in tests); otherwise the shared client, built lazily
+        self._llama_llm = llama_llm
+        # A fixed Gemini model (e.g. a fake in tests); otherwise one pooled client per API key
+        self.gemini_llm = gemini_llm
+        self.load_balancer = load_balancer or LoadBalancer.shared()
+        self.balancing_method = os.getenv("LOAD_BALANCER_METHOD", "failure_aware")
+        # Default preference order; the router reorders by observed health
+        self.providers = ("llama", "gemini")
+        self.router = router or ProviderRouter(self.providers)
+        # Distinct Gemini keys tried per request when a key reports quota exhaustion
+        self.gemini_attempts = min(2, self.load_balancer.no_of_keys)
+        self.chains = ChainRegistry(schema=LLMResponse)
+        # Optional RateLimiter; async calls skip a provider whose global bucket is empty
+        self.rate_limiter = rate_limiter
 
-    def get_response(self, user_input: str, prompt: ChatPromptTemplate, chat_history: List[BaseMessage]) -> List[BaseMessage]:
+    @property
+    def llama_llm(self):
+        if self._llama_llm is None:
+            self._llama_llm = LLM.get_shared_llama_llm()
+        return self._llama_llm
 
-        self.chat_history = chat_history + [HumanMessage(content=user_input)]
-        
-        logger.info(f"Input: {user_input}")
+    def _select_llm(self, provider: str):
+        """Return (chain cache name, llm, api key or None) for one attempt on provider."""
+        if provider == "llama":
+            return "llama", self.llama_llm, None
+        if self.gemini_llm is not None:
+            return "gemini", self.gemini_llm, None
+        key = self.load_balancer.get_key(self.balancing_method)
+        return f"gemini:{self.load_balancer.label(key)}", LLM.get_gemini_client(key), key
+
+    def _attempts(self, provider: str) -> int:
+        return self.gemini_attempts if provider == "gemini" and self.gemini_llm is None else 1
+
+    def _report_failure(self, name: str, key, error: Exception) -> bool:
+        """Log a failed attempt; put the key in cooldown on quota errors. Returns True if another key should be tried."""
+        logger.error(f"{name} error: {error}")
+        if key is not None and is_quota_error(error):
+            self.load_balancer.report_fail(key)
+            return True
+        return False
+
+    def _get_prompt(self, level: str, actor: str) -> ChatPromptTemplate:
+        prompt = PromptLoader.get_prompt_template(level, actor)
+        if prompt is None:
+            raise ValueError(f"No prompt found for actor {actor} at level {level}")
+        return prompt
+
+    def _get_chain(self, level: str, actor: str, provider: str, llm, streaming: bool = False):
+        prompt = self._get_prompt(level, actor)
+        return self.chains.get_chain(level, actor, provider, prompt, llm, streaming=streaming)
 
+    @staticmethod
+    def _build_messages(user_input: str, chat_history: list, summary: str = None) -> List[BaseMessage]:
+        """
+        Convert the history (ChatRecords or LangChain messages) plus user_input into the
+        LangChain messages fed to the chain, in one new list; the caller's history is never mutated.
+        A conversation summary, if any, goes first as an extra system message.
+        """
+        messages = [SystemMessage(content=f"Summary of the conversation so far:\n{summary}")] if summary else []
+        messages.extend(record.to_message() if isinstance(record, ChatRecord) else record for record in chat_history)
+        messages.append(HumanMessage(content=user_input))
+        return messages
+
+    @staticmethod
+    def _to_record(response: LLMResponse) -> ChatRecord:
+        return ChatRecord.ai(response.content, response.flag)
+
+    def _call_provider(self, level: str, actor: str, provider: str, messages: List[BaseMessage]) -> ChatRecord:
+        """Run one provider (rotating Gemini keys on quota errors) and record the outcome with the router."""
+        started = time.monotonic()
+        last_error = None
+        for _ in range(self._attempts(provider)):
+            key = None
+            try:
+                name, llm, key = self._select_llm(provider)
+                logger.info(f"Trying {name}")
+                chain = self._get_chain(level, actor, name, llm)
+                with timed("llm", provider):
+                    response = chain.invoke({"messages": messages})
+                self.router.record(provider, time.monotonic() - started, True)
+                LLM_CALLS.labels(provider, "success").inc()
+                return self._to_record(response)
+
+            except Exception as e:
+                last_error = e
+                if not self._report_failure(provider, key, e):
+                    break
+
+        self.router.record(provider, time.monotonic() - started, False)
+        LLM_CALLS.labels(provider, "failure").inc()
+        raise last_error
+
+    async def _acall_provider(self, level: str, actor: str, provider: str, messages: List[BaseMessage]) -> ChatRecord:
+        """
+        Async variant of _call_provider. A cancelled (hedged-out) call records nothing.
+        Raises RateLimitExceeded without touching the router if the provider's bucket is empty.
+        """
+        if self.rate_limiter is not None:
+            await self.rate_limiter.check_provider(provider)
+        started = time.monotonic()
+        last_error = None
+        for _ in range(self._attempts(provider)):
+            key = None
+            try:
+                name, llm, key = self._select_llm(provider)
+                logger.info(f"Trying {name}")
+                chain = self._get_chain(level, actor, name, llm)
+                with timed("llm", provider):
+                    response = await chain.ainvoke({"messages": messages})
+                self.router.record(provider, time.monotonic() - started, True)
+                LLM_CALLS.labels(provider, "success").inc()
+                return self._to_record(response)
+
+            except Exception as e:
+                last_error = e
+                if not self._report_failure(provider, key, e):
+                    break
+
+        self.router.record(provider, time.monotonic() - started, False)
+        LLM_CALLS.labels(provider, "failure").inc()
+        raise last_error
+
+    @staticmethod
+    async def _first_success(tasks: list) -> ChatRecord:
+        """Return the first successful result among tasks and cancel the rest."""
+        pending = set(tasks)
+        last_error = None
         try:
-            #raise ValueError("On Purpose")
-            # Try Llama
-            logger.info("Trying Llama")
-            self.chain = self._get_chain(prompt, self.llama_llm)
-            response = self.chain.invoke(
-                {
-                    "messages": self.chat_history
-                }
-            )
-
-            return AIMessage(response.content, additional_kwargs={"flag": response.flag})
-
-        except Exception as e:
-            # Fallback to Gemini
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _hedge_slot(self, stack: AsyncExitStack) -> bool:
+        """Take an LLM slot for a hedged call, held until stack closes. False if every slot is taken."""
+        if self.rate_limiter is None:
+            return True
+        try:
+            await stack.enter_async_context(self.rate_limiter.llm_slot())
+        except RateLimitExceeded:
+            logger.info("No free LLM slot, not hedging")
+            return False
+        return True
+
+    def get_response(self, level: str, actor: str, user_input: str, chat_history: list, summary: str = None) -> ChatRecord:
+        """
+        Generate the actor's reply to user_input as a ChatRecord.
+        chat_history (ChatRecords or LangChain messages) must not already contain user_input;
+        summary is the rolling summary of older messages, if any.
+        Providers are tried in the router's health order.
+        """
+        messages = self._build_messages(user_input, chat_history, summary)
+
+        logger.info(f"Input: {user_input}")
+
+        last_error = None
+        for provider in self.router.order():
+            try:
+                return self._call_provider(level, actor, provider, messages)
+            except Exception as e:
+                last_error = e
+                LLM_FALLBACKS.labels(provider).inc()
+
+        raise last_error
+
+    async def aget_response(self, level: str, actor: str, user_input: str, chat_history: list, summary: str = None) -> ChatRecord:
+        """
+        Async variant of get_response.
+        With hedging enabled, if the preferred provider has not answered within its p95
+        latency the next provider is started too; the first success wins and the other
+        call is cancelled. The hedged call takes its own LLM slot (the caller holds one
+        for the first), so hedging never exceeds LLM_MAX_CONCURRENCY; without a free
+        slot the request just keeps waiting for the first provider.
+        """
+        messages = self._build_messages(user_input, chat_history, summary)
+
+        logger.info(f"Input: {user_input}")
+
+        last_error = None
+        remaining = self.router.order()
+        while remaining:
+            provider = remaining.pop(0)
+            tasks = [asyncio.create_task(self._acall_provider(level, actor, provider, messages))]
+
             try:
-                logger.info("Falling back to Gemini")
-                self.chain = self._get_chain(prompt, self.gemini_llm) 
-                response = self.chain.invoke(
-                    {
-                        "messages": 
-                        self.chat_history
-                    }
-                )
-
-                return AIMessage(response.content, additional_kwargs={"flag": response.flag})
-                
+                async with AsyncExitStack() as hedge_slot:
+                    try:
+                        if self.router.hedging and remaining:
+                            done, _ = await asyncio.wait(tasks, timeout=self.router.hedge_delay(provider))
+                            if not done and await self._hedge_slot(hedge_slot):
+                                hedge = remaining.pop(0)
+                                logger.info(f"{provider} slower than its p95, hedging with {hedge}")
+                                LLM_HEDGES.labels(provider).inc()
+                                tasks.append(asyncio.create_task(self._acall_provider(level, actor, hedge, messages)))
+
+                        return await self._first_success(tasks)
+                    finally:
+                        # Also stops the calls if this request is cancelled while waiting to hedge
+                        for task in tasks:
+                            task.cancel()
+            except Exception as e:
+                last_error = e
+                LLM_FALLBACKS.labels(provider).inc()
+
+        raise last_error
+
+    async def astream_response(self, level: str, actor: str, user_input: str, chat_history: list, summary: str = None):
+        """
+        Stream the actor's reply. Yields ("token", text) for each new piece of `content`
+        as the structured output is parsed incrementally, then ("done", ChatRecord) with
+        the validated content and flag.
+        A provider that fails before producing any content falls back to the next one;
+        a failure mid-stream is raised to the caller.
+        """
+        messages = self._build_messages(user_input, chat_history, summary)
+
+        logger.info(f"Input (stream): {user_input}")
+
+        last_error = None
+        for provider in self.router.order():
+            if self.rate_limiter is not None:
+                try:
+                    await self.rate_limiter.check_provider(provider)
+                except RateLimitExceeded as e:
+                    last_error = e
+                    continue
+
+            started = time.monotonic()
+            key = None
+            sent = ""
+            try:
+                name, llm, key = self._select_llm(provider)
+                logger.info(f"Streaming from {name}")
+                chain = self._get_chain(level, actor, name, llm, streaming=True)
+
+                partial = {}
+                async for partial in chain.astream({"messages": messages}):
+                    content = (partial or {}).get("content") or ""
+                    if len(content) > len(sent) and content.startswith(sent):
+                        yield "token", content[len(sent):]
+                        sent = content
+
+                response = LLMResponse(**(partial or {}))
+                if len(response.content) > len(sent) and response.content.startswith(sent):
+                    yield "token", response.content[len(sent):]
+                self.router.record(provider, time.monotonic() - started, True)
+                LLM_CALLS.labels(provider, "success").inc()
+                STAGE_SECONDS.labels("llm_stream", provider).observe(time.monotonic() - started)
+                yield "done", self._to_record(response)
+                return
 
             except Exception as e:
-                logger.error(f"Gemini error: {e}")
-                raise  
+                last_error = e
+                self.router.record(provider, time.monotonic() - started, False)
+                LLM_CALLS.labels(provider, "failure").inc()
+                self._report_failure(provider, key, e)
+                if sent:
+                    raise
+                LLM_FALLBACKS.labels(provider).inc()
 
-        except Exception as e:
-            logger.error(f"An unexpected error occurred: {e}")
-            raise 
+        raise last_error
@@ -1,29 +1,65 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 import os
+import threading
 from apoorvbackend.src.llm_handler.load_balancer import LoadBalancer
 
 load_dotenv()
 
 
 class LLM:
+    """
+    Provider client factories. The provider SDKs are imported on first use, not when
+    this module is imported, so workers boot without loading them.
+    """
+
+    # API key -> ChatGoogleGenerativeAI, built once per key and reused by every request
+    _gemini_clients = {}
+    _gemini_lock = threading.Lock()
+    # Process-wide Llama client, built on first use
+    _llama_client = None
+    _llama_lock = threading.Lock()
+    # max_tokens -> Llama client for conversation summaries
+    _summary_clients = {}
 
     @staticmethod
-    def get_llama_llm(temperature=0.5, timeout=10):
+    def get_llama_llm(temperature=0.5, timeout=10, max_tokens=200):
+        from langchain_openai import ChatOpenAI
         return ChatOpenAI(
             model=os.getenv("LLAMA_MODEL_NAME"),
             api_key=os.getenv("LLAMA_API_KEY"),
             temperature=temperature,
             base_url=os.getenv("LLAMA_BASE_URL"),
             timeout=timeout,
-            max_tokens=200
+            max_tokens=max_tokens
         )
 
+    @classmethod
+    def get_shared_llama_llm(cls):
+        """Return the process-wide Llama client, building it on first use."""
+        if cls._llama_client is None:
+            with cls._llama_lock:
+                if cls._llama_client is None:
+                    cls._llama_client = cls.get_llama_llm()
+        return cls._llama_client
+
+    @classmethod
+    def get_summary_llm(cls, max_tokens):
+        """
+        Return the Llama client for conversation summaries: its own max_tokens (a summary
+        is longer than a chat reply), a lower temperature and more time, as it runs in the background.
+        """
+        client = cls._summary_clients.get(max_tokens)
+        if client is None:
+            with cls._llama_lock:
+                client = cls._summary_clients.get(max_tokens)
+                if client is None:
+                    client = cls.get_llama_llm(temperature=0.2, timeout=30, max_tokens=max_tokens)
+                    cls._summary_clients[max_tokens] = client
+        return client
+
     @staticmethod
-    def get_gemini_llm(temperature=0.5, timeout=10, max_retries=4):
-        lb = LoadBalancer(n=1, ct=1)
-        key = lb.StdDev()
+    def build_gemini_llm(key, temperature=0.5, timeout=10, max_retries=1):
+        from langchain_google_genai import ChatGoogleGenerativeAI
         return ChatGoogleGenerativeAI(
             model=os.getenv("MODEL_NAME"),
             api_key=key,
@@ -32,3 +68,20 @@ class LLM:
             max_retries=max_retries,
             max_tokens=200
         )
+
+    @classmethod
+    def get_gemini_client(cls, key):
+        """Return the pooled Gemini client for key. Quota errors are left to the caller so it can rotate keys."""
+        client = cls._gemini_clients.get(key)
+        if client is None:
+            with cls._gemini_lock:
+                client = cls._gemini_clients.get(key)
+                if client is None:
+                    client = cls.build_gemini_llm(key)
+                    cls._gemini_clients[key] = client
+        return client
+
+    @classmethod
+    def get_gemini_llm(cls, temperature=0.5, timeout=10, max_retries=4):
+        key = LoadBalancer.shared().get_key()
+        return cls.build_gemini_llm(key, temperature=temperature, timeout=timeout, max_retries=max_retries)
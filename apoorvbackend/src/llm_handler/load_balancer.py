@@ -1,112 +1,197 @@
 import os
+import random
+import re
+import threading
 import time
-import numpy as np
 from dotenv import load_dotenv
-from google.api_core import exceptions
+
+from apoorvbackend.src.logger import logger
+from apoorvbackend.src.metrics.metrics import KEY_COOLDOWNS, instrumented
+
+load_dotenv()
+
+# Redis key prefix for cooldowns shared between workers (value = cooldown expiry, epoch seconds)
+COOLDOWN_KEY_PREFIX = "llm:cooldown"
+
+
+# Fallback for wrapped errors that only keep the message, e.g. "429 Resource has been exhausted"
+QUOTA_MESSAGE = re.compile(r"\bRESOURCE_EXHAUSTED\b|Resource has been exhausted|\b429\b")
+
+
+def is_quota_error(error: Exception) -> bool:
+    """True if error is a rate-limit / quota response from the Gemini API."""
+    try:
+        from google.api_core import exceptions
+        if isinstance(error, exceptions.ResourceExhausted):
+            return True
+    except ImportError:
+        pass
+    # google.api_core errors carry .code, httpx/openai errors .status_code or .response.status_code
+    for status in (getattr(error, "code", None), getattr(error, "status_code", None),
+                   getattr(getattr(error, "response", None), "status_code", None)):
+        if isinstance(status, int):
+            return status == 429
+    return QUOTA_MESSAGE.search(str(error)) is not None
+
 
 class LoadBalancer:
-    def __init__(self, n, ct):
+    """
+    Pool of GOOGLE_API_KEY_<n> keys with cooldowns for keys that hit their quota.
+
+    All methods are thread-safe. Use LoadBalancer.shared() for the process-wide pool;
+    when LOAD_BALANCER_SHARED=1 cooldowns are also published to Redis so every worker
+    skips a key that any worker saw exhausted.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, n=None, ct=60, redis_client=None, sync_interval=1.0):
         self.index = -1
-        self.no_of_keys = n
         load_dotenv()
+        if n is None:
+            n = self.key_count_from_env()
         self.keys = [os.getenv(f'GOOGLE_API_KEY_{x}') for x in range(1, n+1)]
+        self.labels = {key: f'GOOGLE_API_KEY_{x}' for x, key in enumerate(self.keys, start=1)}
+        self.no_of_keys = len(self.keys)
         self.fail_keys = {}
         self.cooltime = ct
         self.usage_count = {key: 0 for key in self.keys}
+        self._lock = threading.Lock()
+        self.redis = redis_client
+        self.sync_interval = sync_interval
+        self._last_sync = 0.0
 
-    def Round_Robin(self):
-        self.index = (self.index + 1) % self.no_of_keys
-        key = self.keys[self.index]
-
-        if key in self.fail_keys:
-            if time.time() < self.fail_keys[key]:
-                return self.FailureAware()
-            else:
-                del self.fail_keys[key]
-                
+    @staticmethod
+    def key_count_from_env() -> int:
+        """Number of consecutive GOOGLE_API_KEY_<n> variables set, starting at 1."""
+        n = 0
+        while os.getenv(f'GOOGLE_API_KEY_{n + 1}'):
+            n += 1
+        return max(n, 1)
+
+    @classmethod
+    def shared(cls) -> "LoadBalancer":
+        """Return the process-wide key pool, creating it on first use."""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    redis_client = None
+                    if os.getenv("LOAD_BALANCER_SHARED", "0") == "1":
+                        import redis
+                        redis_client = redis.Redis(
+                            host=os.getenv("REDIS_HOST", "localhost"),
+                            port=int(os.getenv("REDIS_PORT", 6379)),
+                            db=int(os.getenv("REDIS_DB", 0)),
+                        )
+                    cls._instance = cls(ct=float(os.getenv("LOAD_BALANCER_COOLDOWN", 60)), redis_client=redis_client)
+        return cls._instance
+
+    def label(self, key) -> str:
+        """Name of the env variable holding key; safe to log or use in metric/cache keys."""
+        return self.labels.get(key, "GOOGLE_API_KEY")
+
+    def _sync_shared_cooldowns(self, now):
+        """Pull cooldowns reported by other workers, at most once per sync_interval."""
+        if self.redis is None or now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+        try:
+            values = self.redis.mget([f"{COOLDOWN_KEY_PREFIX}:{self.label(key)}" for key in self.keys])
+        except Exception as e:
+            logger.warning(f"Could not read shared key cooldowns: {e}")
+            return
+        for key, value in zip(self.keys, values):
+            if value is not None:
+                until = float(value)
+                if until > self.fail_keys.get(key, 0):
+                    self.fail_keys[key] = until
+
+    def _available(self, key, now) -> bool:
+        until = self.fail_keys.get(key)
+        if until is None:
+            return True
+        if now < until:
+            return False
+        del self.fail_keys[key]
+        return True
+
+    def _use(self, key):
         self.usage_count[key] = self.usage_count.get(key, 0) + 1
         return key
 
-    def FailureAware(self):
+    def _next_available(self, now):
         for _ in range(self.no_of_keys):
-            self.index = (self.index+1) % self.no_of_keys
+            self.index = (self.index + 1) % self.no_of_keys
             key = self.keys[self.index]
-
-            if key in self.fail_keys:
-                if time.time() < self.fail_keys[key]:
-                    continue
-                else:
-                    del self.fail_keys[key]
-            
-            self.usage_count[key] = self.usage_count.get(key, 0) + 1
-            return key
-        
+            if self._available(key, now):
+                return self._use(key)
         raise Exception("No keys available... All keys in cooldown...")
-    
+
+    def Round_Robin(self):
+        # Keys in cooldown are skipped, which makes this the same walk as FailureAware
+        return self.FailureAware()
+
+    def FailureAware(self):
+        with self._lock:
+            now = time.time()
+            self._sync_shared_cooldowns(now)
+            return self._next_available(now)
+
     def report_fail(self, key):
-        self.fail_keys[key] = time.time() + self.cooltime
-    
-    def StdDev(self):
-        try:
-            avail_keys = [key for key in self.keys if key not in self.fail_keys or time.time() >= self.fail_keys[key]]
+        until = time.time() + self.cooltime
+        with self._lock:
+            self.fail_keys[key] = until
+        logger.warning(f"{self.label(key)} put in cooldown for {self.cooltime}s")
+        KEY_COOLDOWNS.labels(self.label(key)).inc()
+        if self.redis is not None:
+            try:
+                self.redis.set(f"{COOLDOWN_KEY_PREFIX}:{self.label(key)}", until, px=int(self.cooltime * 1000))
+            except Exception as e:
+                logger.warning(f"Could not publish key cooldown: {e}")
 
+    def StdDev(self):
+        """
+        Pick an available key, favouring keys whose usage is closest to the mean of the
+        less-used keys. Pure Python: the pool is a handful of keys.
+        """
+        with self._lock:
+            now = time.time()
+            self._sync_shared_cooldowns(now)
+            avail_keys = [key for key in self.keys if self._available(key, now)]
             if not avail_keys:
-                return self.FailureAware()
-                
-            max_usage = max(self.usage_count.get(key, 0) for key in avail_keys)
-            
-            filtered_keys = [key for key in avail_keys if self.usage_count.get(key, 0) < max_usage]
-            
-            if not filtered_keys:
-                filtered_keys = avail_keys
-                
-            use_counts = np.array([self.usage_count.get(key, 0) for key in filtered_keys])
-            mean_use = np.mean(use_counts)
-            std_dev = np.std(use_counts) + 1e-6
-            
-            prob = 1 / (1 + np.abs(use_counts - mean_use) / std_dev)
-            prob /= prob.sum()
-            
-            sel_key = np.random.choice(filtered_keys, p=prob)
-            self.usage_count[sel_key] = self.usage_count.get(sel_key, 0) + 1
-            
-            return sel_key
-            
-        except Exception as e:
-            if isinstance(e, exceptions.ResourceExhausted) or "Resource has been exhausted" in str(e):
-                if 'sel_key' in locals():
-                    self.report_fail(sel_key)
-                return self.FailureAware()
-            else:
-                raise e
+                raise Exception("No keys available... All keys in cooldown...")
+
+            counts = [self.usage_count.get(key, 0) for key in avail_keys]
+            max_usage = max(counts)
+            filtered = [(key, count) for key, count in zip(avail_keys, counts) if count < max_usage]
+            if not filtered:
+                filtered = list(zip(avail_keys, counts))
+
+            mean_use = sum(count for _, count in filtered) / len(filtered)
+            std_dev = (sum((count - mean_use) ** 2 for _, count in filtered) / len(filtered)) ** 0.5 + 1e-6
+            weights = [1 / (1 + abs(count - mean_use) / std_dev) for _, count in filtered]
+
+            sel_key = random.choices([key for key, _ in filtered], weights=weights)[0]
+            return self._use(sel_key)
 
+    @instrumented("load_balancer", "get_key")
     def get_key(self, method="std_dev"):
         """
         Get an API key using the specified method
-        
+
         Args:
             method (str): The load balancing method to use:
                 "std_dev" - Use standard deviation method (default)
                 "round_robin" - Use round robin method
                 "failure_aware" - Use failure-aware method
-                
+
         Returns:
             str: API key
         """
-        try:
-            if method == "round_robin":
-                return self.Round_Robin()
-            elif method == "failure_aware":
-                return self.FailureAware()
-            else: 
-                return self.StdDev()
-        except exceptions.ResourceExhausted as e:
-            if 'key' in locals():
-                self.report_fail(key)
+        if method == "round_robin":
+            return self.Round_Robin()
+        elif method == "failure_aware":
             return self.FailureAware()
-        except Exception as e:
-            if "Resource has been exhausted" in str(e):
-                if 'key' in locals():
-                    self.report_fail(key)
-                return self.FailureAware()
-            raise e
\ No newline at end of file
+        else:
+            return self.StdDev()
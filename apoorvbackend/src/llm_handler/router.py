@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+
+from apoorvbackend.src.logger import logger
+
+load_dotenv()
+
+
+class CircuitBreaker:
+    """
+    Per-provider breaker. Opens after failure_threshold consecutive failures; once
+    reset_timeout has passed it is half-open and admits a single probe call, whose
+    outcome either closes the breaker or re-opens it. Other callers keep skipping the
+    provider meanwhile; if the probe is never reported, another is admitted after
+    reset_timeout.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at = None
+        # While half-open: until when the admitted probe owns the provider
+        self.probe_until = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def available(self) -> bool:
+        """True if a call may go to the provider; in half-open state this claims the probe."""
+        state = self.state
+        if state != self.HALF_OPEN:
+            return state == self.CLOSED
+        now = time.monotonic()
+        if self.probe_until is not None and self.probe_until > now:
+            return False
+        self.probe_until = now + self.reset_timeout
+        return True
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_until = None
+
+    def record_failure(self) -> bool:
+        """Record a failure. Returns True if this failure (re-)opened the breaker."""
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.probe_until = None
+            return True
+        return False
+
+
+class ProviderStats:
+    """Rolling latency and error rate for one provider (EWMA plus a window for p95)."""
+
+    def __init__(self, alpha=0.2, window=200, initial_latency=2.0):
+        self.alpha = alpha
+        self.latency_ewma = None
+        self.error_ewma = 0.0
+        self.initial_latency = initial_latency
+        self.samples = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+
+    def record(self, latency: float, ok: bool) -> None:
+        self.calls += 1
+        if ok:
+            self.samples.append(latency)
+            self.latency_ewma = latency if self.latency_ewma is None else \
+                self.alpha * latency + (1 - self.alpha) * self.latency_ewma
+        else:
+            self.errors += 1
+        self.error_ewma = self.alpha * (0.0 if ok else 1.0) + (1 - self.alpha) * self.error_ewma
+
+    def p95(self):
+        if len(self.samples) < 20:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def score(self) -> float:
+        """Expected seconds per successful response; lower is healthier."""
+        latency = self.latency_ewma if self.latency_ewma is not None else self.initial_latency
+        return latency / max(0.05, 1.0 - self.error_ewma)
+
+
+class ProviderRouter:
+    """
+    Orders providers by current health and decides when to hedge.
+
+    Healthier (lower score) providers are tried first; providers whose breaker is
+    open are skipped unless every breaker is open. Hedging is off unless LLM_HEDGING=1;
+    the hedge delay for a provider is its observed p95 latency (default_hedge_delay
+    until enough samples exist).
+    """
+
+    def __init__(self, providers, hedging=None, default_hedge_delay=None, min_hedge_delay=None,
+                 failure_threshold=None, reset_timeout=None, alpha=0.2):
+        self.providers = tuple(providers)
+        self.hedging = (hedging if hedging is not None else os.getenv("LLM_HEDGING", "0") == "1")
+        self.default_hedge_delay = float(default_hedge_delay or os.getenv("LLM_HEDGE_DEFAULT_DELAY", 3.0))
+        self.min_hedge_delay = float(min_hedge_delay or os.getenv("LLM_HEDGE_MIN_DELAY", 0.5))
+        failure_threshold = int(failure_threshold or os.getenv("LLM_BREAKER_FAILURES", 5))
+        reset_timeout = float(reset_timeout or os.getenv("LLM_BREAKER_RESET", 30))
+        self.stats_by_provider = {provider: ProviderStats(alpha=alpha) for provider in self.providers}
+        self.breakers = {provider: CircuitBreaker(failure_threshold, reset_timeout) for provider in self.providers}
+        self._lock = threading.Lock()
+
+    def order(self) -> list:
+        """Providers to try for the next request, healthiest first."""
+        with self._lock:
+            available = [p for p in self.providers if self.breakers[p].available()]
+            if not available:
+                available = list(self.providers)
+            # sorted() is stable, so ties keep the configured preference order
+            return sorted(available, key=lambda p: self.stats_by_provider[p].score())
+
+    def hedge_delay(self, provider: str) -> float:
+        with self._lock:
+            p95 = self.stats_by_provider[provider].p95()
+        return max(self.min_hedge_delay, p95 if p95 is not None else self.default_hedge_delay)
+
+    def record(self, provider: str, latency: float, ok: bool) -> None:
+        with self._lock:
+            self.stats_by_provider[provider].record(latency, ok)
+            breaker = self.breakers[provider]
+            if ok:
+                breaker.record_success()
+            elif breaker.record_failure():
+                logger.warning(f"Circuit breaker opened for {provider}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                provider: {
+                    "latency_ewma": self.stats_by_provider[provider].latency_ewma,
+                    "error_rate_ewma": round(self.stats_by_provider[provider].error_ewma, 4),
+                    "p95": self.stats_by_provider[provider].p95(),
+                    "calls": self.stats_by_provider[provider].calls,
+                    "errors": self.stats_by_provider[provider].errors,
+                    "breaker": self.breakers[provider].state,
+                }
+                for provider in self.providers
+            }
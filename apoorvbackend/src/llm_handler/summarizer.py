@@ -0,0 +1,187 @@
+import asyncio
+import os
+import uuid
+from dotenv import load_dotenv
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from apoorvbackend.src.logger import logger
+from apoorvbackend.src.llm_handler.llm import LLM
+from apoorvbackend.src.metrics.metrics import PROMPT_TOKENS, SUMMARIES
+from apoorvbackend.src.models.chat_models import ChatRecord
+from apoorvbackend.src.redis.locks import RELEASE_LOCK_SCRIPT
+from apoorvbackend.src.redis.rate_limiter import RateLimitExceeded
+from apoorvbackend.src.redis.redis_handlers import STORAGE_LIST
+
+load_dotenv()
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a player and a game character. "
+    "Merge the existing summary with the new messages into one updated summary written in the third person. "
+    "Keep every fact that matters for the story or puzzle: names, items, promises, clues, what the player has "
+    "already proved or achieved, and the character's attitude towards the player. "
+    "Drop greetings and small talk. Answer with the summary only, at most {max_words} words."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), good enough for budgeting."""
+    return (len(text or "") + 3) // 4
+
+
+def summary_max_tokens(max_words: int) -> int:
+    """Completion budget for a summary of max_words words: 2 tokens per word, at least 64."""
+    return max(64, max_words * 2)
+
+
+class ConversationSummarizer:
+    """
+    Rolling summary tier for long conversations.
+
+    Prompts carry the stored summary plus only the messages it does not cover yet.
+    When those exceed token_budget, a background task folds all but the newest
+    keep_recent of them into the summary with one LLM call. The task runs at most
+    once per conversation at a time across workers (Redis lock), and the summary is
+    replaced with a compare-and-set on how many messages it covers.
+    """
+
+    def __init__(self, redis_handler, llm=None, enabled: bool = None, token_budget: int = None, keep_recent: int = None,
+                 max_recent: int = None, max_summary_words: int = None, rate_limiter=None, lock_ttl: float = 60.0):
+        self.redis_handler = redis_handler
+        self.redis = redis_handler.async_client
+        # None means a dedicated Llama client sized for max_summary_words, built on the first summary
+        self._llm = llm
+        self.enabled = enabled if enabled is not None else os.getenv("SUMMARY_ENABLED", "0") == "1"
+        self.token_budget = int(token_budget or os.getenv("SUMMARY_TOKEN_BUDGET", 800))
+        self.keep_recent = int(keep_recent or os.getenv("SUMMARY_KEEP_RECENT", 4))
+        # Hard cap on unsummarized messages loaded into a prompt if summarizing falls behind
+        self.max_recent = int(max_recent or os.getenv("SUMMARY_MAX_RECENT", 30))
+        self.max_summary_words = int(max_summary_words or os.getenv("SUMMARY_MAX_WORDS", 200))
+        self.rate_limiter = rate_limiter
+        self.lock_ttl = lock_ttl
+        self._release_lock = self.redis.register_script(RELEASE_LOCK_SCRIPT)
+        self._inflight = {}
+        self.prompts = 0
+        self.history_tokens = 0
+        self.summary_tokens = 0
+        self.summaries_written = 0
+        self.summary_failures = 0
+        self.tokens_folded = 0
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = LLM.get_summary_llm(summary_max_tokens(self.max_summary_words))
+        return self._llm
+
+    async def aload(self, user_id: str, level: str, actor: str):
+        """Return (chat history, summary or None) to build the next prompt from."""
+        if not self.enabled or self.redis_handler.storage_mode != STORAGE_LIST:
+            chat_history = await self.redis_handler.aload_chat_history(user_id, level, actor)
+            return chat_history or [], None
+        chat_history, summary = await self.redis_handler.aload_conversation(user_id, level, actor, self.max_recent)
+        return chat_history or [], summary
+
+    async def aload_many(self, conversations: list) -> list:
+        """Batched aload for a list of (user_id, level, actor), in one Redis round trip."""
+        if not self.enabled or self.redis_handler.storage_mode != STORAGE_LIST:
+            return await self.redis_handler.aload_conversations(conversations)
+        return await self.redis_handler.aload_conversations(conversations, self.max_recent)
+
+    def account(self, chat_history: list, summary: str = None) -> int:
+        """Record the estimated history tokens of one prompt; returns the total."""
+        history_tokens = sum(estimate_tokens(record.content) for record in chat_history)
+        summary_tokens = estimate_tokens(summary) if summary else 0
+        self.prompts += 1
+        self.history_tokens += history_tokens
+        self.summary_tokens += summary_tokens
+        PROMPT_TOKENS.labels("history").inc(history_tokens)
+        PROMPT_TOKENS.labels("summary").inc(summary_tokens)
+        return history_tokens + summary_tokens
+
+    def after_turn(self, user_id: str, level: str, actor: str, chat_history: list) -> None:
+        """
+        Called once a turn is saved, with the unsummarized history including that turn.
+        Starts a background compaction when it is over the token budget.
+        """
+        if not self.enabled or self.redis_handler.storage_mode != STORAGE_LIST or len(chat_history) <= self.keep_recent:
+            return
+        if sum(estimate_tokens(record.content) for record in chat_history) <= self.token_budget:
+            return
+
+        conversation = (user_id, level, actor)
+        if conversation in self._inflight:
+            return
+        task = asyncio.create_task(self._compact(user_id, level, actor))
+        self._inflight[conversation] = task
+        task.add_done_callback(lambda t: self._on_compact_done(conversation, t))
+
+    def _on_compact_done(self, conversation: tuple, task: asyncio.Task) -> None:
+        self._inflight.pop(conversation, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.summary_failures += 1
+            SUMMARIES.labels("failed").inc()
+            logger.error(f"Summarizing {conversation} failed: {task.exception()}")
+
+    @staticmethod
+    def _transcript(records: list) -> str:
+        lines = []
+        for record in records:
+            speaker = "Player" if record.role == ChatRecord.HUMAN else "Character"
+            lines.append(f"{speaker}: {record.content}")
+        return "\n".join(lines)
+
+    async def _compact(self, user_id: str, level: str, actor: str) -> None:
+        lock_key = f"{self.redis_handler._get_summary_key(user_id, level, actor)}:lock"
+        token = uuid.uuid4().hex
+        if not await self.redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000)):
+            return
+
+        try:
+            summary, covered, new_covered, records = await self.redis_handler.acompaction_source(
+                user_id, level, actor, self.keep_recent
+            )
+            if not records:
+                return
+            if self.rate_limiter is not None:
+                # Background work yields to player traffic; the next turn over budget retries
+                try:
+                    await self.rate_limiter.check_provider("llama")
+                except RateLimitExceeded:
+                    logger.info(f"Skipping summary of {user_id}/{level}/{actor}: llama is rate limited")
+                    return
+
+            instructions = SUMMARY_INSTRUCTIONS.format(max_words=self.max_summary_words)
+            content = f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{self._transcript(records)}"
+            response = await self.llm.ainvoke([SystemMessage(content=instructions), HumanMessage(content=content)])
+            text = response.content.strip()
+
+            tokens = estimate_tokens(text)
+            if await self.redis_handler.astore_summary(user_id, level, actor, text, covered, new_covered, tokens):
+                folded = sum(estimate_tokens(record.content) for record in records)
+                self.summaries_written += 1
+                self.tokens_folded += folded
+                SUMMARIES.labels("written").inc()
+                logger.info(
+                    f"Summarized {len(records)} messages (~{folded} tokens) of {user_id}/{level}/{actor} "
+                    f"into ~{tokens} tokens"
+                )
+        finally:
+            await self._release_lock(keys=[lock_key], args=[token])
+
+    async def aclose(self) -> None:
+        """Wait for in-flight compactions so shutdown does not cut an LLM call mid-way."""
+        if self._inflight:
+            await asyncio.gather(*self._inflight.values(), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "token_budget": self.token_budget,
+            "prompts": self.prompts,
+            "avg_history_tokens": round(self.history_tokens / self.prompts, 1) if self.prompts else 0.0,
+            "avg_summary_tokens": round(self.summary_tokens / self.prompts, 1) if self.prompts else 0.0,
+            "summaries_written": self.summaries_written,
+            "summary_failures": self.summary_failures,
+            "tokens_folded": self.tokens_folded,
+        }
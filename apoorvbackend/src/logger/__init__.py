@@ -1,5 +1,16 @@
 from loguru import logger
 import sys
 
-logger.add("logs/application.log", rotation="500 MB", backtrace=True, diagnose=False)
-logger.add(sys.stdout, colorize=True, format="<green>{time}</green> <level>{message}</level>")
\ No newline at end of file
+CONSOLE_FORMAT = "<green>{time}</green> <level>{message}</level>"
+
+# enqueue=True hands records to a background thread, so sink I/O never blocks the event loop
+logger.remove()
+logger.add("logs/application.log", rotation="500 MB", backtrace=True, diagnose=False, enqueue=True)
+_console_sink = logger.add(sys.stdout, colorize=True, format=CONSOLE_FORMAT, enqueue=True)
+
+
+def log_to_stderr() -> None:
+    """Move console logging to stderr, for CLIs whose stdout carries their results."""
+    global _console_sink
+    logger.remove(_console_sink)
+    _console_sink = logger.add(sys.stderr, colorize=True, format=CONSOLE_FORMAT, enqueue=True)
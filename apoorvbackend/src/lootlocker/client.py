@@ -0,0 +1,183 @@
+import asyncio
+import os
+import time
+import httpx
+from dotenv import load_dotenv
+
+from apoorvbackend.src.logger import logger
+from apoorvbackend.src.metrics.metrics import UPSTREAM_CALLS, timed
+
+load_dotenv()
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class LootLockerError(Exception):
+    """Raised when LootLocker returns an error or cannot be reached."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class LootLockerClient:
+    """
+    Shared client for the LootLocker game API.
+
+    Holds one pooled httpx.AsyncClient (HTTP/2 when `h2` is installed) for the
+    whole process, and a TTL cache of the session tokens of the server's own
+    identities (e.g. the score submitter). Players' guest logins are proxied and
+    never cached. Authenticated calls made with a cached token transparently log
+    in again once if LootLocker answers 401.
+    """
+
+    BASE_URL = "https://api.lootlocker.io"
+
+    def __init__(self, game_key: str = None, game_version: str = None, leaderboard_key: str = None,
+                 session_ttl: float = None, timeout: float = 10.0, transport: httpx.AsyncBaseTransport = None):
+        self.game_key = game_key or os.getenv("GAME_KEY", "your_game_key_here")
+        self.game_version = game_version or os.getenv("LOOTLOCKER_GAME_VERSION", "0.10.0.0")
+        self.leaderboard_key = leaderboard_key or os.getenv("LOOTLOCKER_LEADERBOARD_KEY", "twistedtalesleaderboardidtest")
+        self.session_ttl = float(session_ttl or os.getenv("LOOTLOCKER_SESSION_TTL", 1800))
+        self.timeout = timeout
+        self.transport = transport
+        self.client = None
+        # identifier -> (session_token, expires_at), only for identities used via get_session_token
+        self._sessions = {}
+        self._session_locks = {}
+
+    async def start(self) -> None:
+        """Open the pooled HTTP client. Called once from the app lifespan."""
+        if self.client is not None:
+            return
+        if not HTTP2_AVAILABLE and self.transport is None:
+            logger.warning("h2 is not installed, LootLocker client falls back to HTTP/1.1")
+        self.client = httpx.AsyncClient(
+            base_url=self.BASE_URL,
+            http2=HTTP2_AVAILABLE and self.transport is None,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30),
+            timeout=self.timeout,
+            transport=self.transport,
+        )
+
+    async def aclose(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _request(self, method: str, path: str, error_prefix: str = "", endpoint: str = "other", **kwargs) -> httpx.Response:
+        if self.client is None:
+            await self.start()
+        try:
+            with timed("lootlocker", endpoint):
+                response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError as exc:
+            UPSTREAM_CALLS.labels(endpoint, "error").inc()
+            raise LootLockerError(502, f"{error_prefix}{str(exc)}")
+        UPSTREAM_CALLS.labels(endpoint, str(response.status_code)).inc()
+        return response
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response, error_prefix: str = "") -> None:
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as exc:
+            raise LootLockerError(response.status_code, f"{error_prefix}{str(exc)}")
+
+    async def guest_login(self, player_identifier: str) -> dict:
+        """Start a guest session for player_identifier and return LootLocker's answer."""
+        payload = {
+            "game_key": self.game_key,
+            "player_identifier": player_identifier,
+            "game_version": self.game_version,
+        }
+        response = await self._request("POST", "/game/v2/session/guest", error_prefix="Login error: ",
+                                       endpoint="guest_login", json=payload)
+        self._raise_for_status(response, error_prefix="Login error: ")
+        return response.json()
+
+    async def get_session_token(self, player_identifier: str) -> str:
+        """Return a cached session token for player_identifier, logging in if it is missing or expired."""
+        cached = self._sessions.get(player_identifier)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+
+        # Only one login per identifier at a time; concurrent callers reuse its result
+        lock = self._session_locks.setdefault(player_identifier, asyncio.Lock())
+        async with lock:
+            cached = self._sessions.get(player_identifier)
+            if cached is not None and cached[1] > time.monotonic():
+                return cached[0]
+
+            data = await self.guest_login(player_identifier)
+            session_token = data.get("session_token", "")
+            if not session_token:
+                raise LootLockerError(500, "Failed to obtain session token")
+            self._sessions[player_identifier] = (session_token, time.monotonic() + self.session_ttl)
+            return session_token
+
+    def invalidate_session(self, player_identifier: str) -> None:
+        self._sessions.pop(player_identifier, None)
+
+    async def _session_request(self, method: str, path: str, session_identifier: str, error_prefix: str = "",
+                               endpoint: str = "other", **kwargs) -> httpx.Response:
+        """Make a request authenticated as session_identifier, refreshing the session once on 401."""
+        session_token = await self.get_session_token(session_identifier)
+        response = await self._request(method, path, error_prefix=error_prefix, endpoint=endpoint,
+                                       headers={"x-session-token": session_token}, **kwargs)
+        if response.status_code == 401:
+            logger.info(f"LootLocker session for {session_identifier} expired, logging in again")
+            self.invalidate_session(session_identifier)
+            session_token = await self.get_session_token(session_identifier)
+            response = await self._request(method, path, error_prefix=error_prefix, endpoint=endpoint,
+                                           headers={"x-session-token": session_token}, **kwargs)
+        return response
+
+    async def get_leaderboard(self, session_identifier: str) -> dict:
+        """Fetch the leaderboard list with the server's own session (session_identifier)."""
+        response = await self._session_request(
+            "GET", f"/game/leaderboards/{self.leaderboard_key}/list", session_identifier, endpoint="leaderboard",
+        )
+        self._raise_for_status(response)
+        return response.json()
+
+    async def verify_session(self, session_token: str) -> None:
+        """Raise LootLockerError unless session_token is a valid session supplied by a game client."""
+        response = await self._request(
+            "GET", "/game/v1/player/info", error_prefix="Session error: ", endpoint="player_info",
+            headers={"x-session-token": session_token},
+        )
+        self._raise_for_status(response, error_prefix="Session error: ")
+
+    async def get_member_score(self, member_id: str, session_identifier: str) -> int:
+        """
+        Return member_id's current leaderboard score, or 0 if they are not on the board (404).
+        Any other failure (5xx, timeouts, login errors) raises LootLockerError: treating it
+        as 0 would overwrite the player's real score on the next submission.
+        """
+        error_prefix = "Member score error: "
+        response = await self._session_request(
+            "GET", f"/game/leaderboards/{self.leaderboard_key}/member/{member_id}", session_identifier,
+            error_prefix=error_prefix, endpoint="member_score",
+        )
+        if response.status_code == 404:
+            logger.info(f"Player {member_id} not found on leaderboard, using score 0")
+            return 0
+        self._raise_for_status(response, error_prefix=error_prefix)
+        return response.json().get("score", 0)
+
+    async def submit_score(self, member_id: str, score: int, session_identifier: str, metadata: str = "") -> dict:
+        """Set member_id's leaderboard score."""
+        payload = {"member_id": member_id, "score": score, "metadata": metadata}
+        error_prefix = "Score submission error: "
+        response = await self._session_request(
+            "POST", f"/game/leaderboards/{self.leaderboard_key}/submit", session_identifier,
+            error_prefix=error_prefix, endpoint="submit_score", json=payload,
+        )
+        self._raise_for_status(response, error_prefix=error_prefix)
+        return response.json()
@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Awaitable, Callable
+from dotenv import load_dotenv
+
+from apoorvbackend.src.logger import logger
+from apoorvbackend.src.metrics.metrics import CACHE_EVENTS
+from apoorvbackend.src.redis.locks import RELEASE_LOCK_SCRIPT
+
+load_dotenv()
+
+
+class LeaderboardCache:
+    """
+    Redis-backed read-through cache for leaderboard payloads.
+
+    - Entries younger than fresh_ttl are served directly.
+    - Entries up to fresh_ttl + stale_ttl old are served immediately while a
+      single background refresh runs (stale-while-revalidate).
+    - Upstream fetches are coalesced: concurrent callers in this process share one
+      in-flight fetch, and a short Redis lock lets only one worker per key hit
+      LootLocker while the others wait for its result. fetch() must not depend on
+      the caller (e.g. use the server's own session), since its result is shared.
+    - Callers' session tokens are checked one by one with check_session(); a token
+      that passed is trusted for session_ttl seconds.
+    """
+
+    def __init__(self, redis_client, fresh_ttl: float = None, stale_ttl: float = None, lock_ttl: float = 5.0,
+                 session_ttl: float = None):
+        self.redis = redis_client
+        self.fresh_ttl = float(fresh_ttl or os.getenv("LEADERBOARD_CACHE_TTL", 5))
+        self.stale_ttl = float(stale_ttl or os.getenv("LEADERBOARD_CACHE_STALE_TTL", 60))
+        self.lock_ttl = lock_ttl
+        self.session_ttl = float(session_ttl or os.getenv("LEADERBOARD_SESSION_TTL", 300))
+        self._inflight = {}
+        self._release_lock = self.redis.register_script(RELEASE_LOCK_SCRIPT)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+        self.sessions_verified = 0
+
+    @staticmethod
+    def _cache_key(key: str) -> str:
+        return f"leaderboard:{key}"
+
+    @staticmethod
+    def _lock_key(key: str) -> str:
+        return f"leaderboard:{key}:lock"
+
+    @staticmethod
+    def _session_key(session_token: str) -> str:
+        return f"leaderboard:session:{hashlib.sha256(session_token.encode('utf-8')).hexdigest()}"
+
+    async def check_session(self, session_token: str, verify: Callable[[], Awaitable[None]]) -> None:
+        """
+        Let a caller read the cached leaderboard only with a valid session: verify() is
+        called unless this token passed recently, and its error is raised to this caller only.
+        """
+        session_key = self._session_key(session_token)
+        if await self.redis.exists(session_key):
+            return
+        await verify()
+        self.sessions_verified += 1
+        await self.redis.set(session_key, 1, px=int(self.session_ttl * 1000))
+
+    async def _read(self, key: str):
+        data = await self.redis.get(self._cache_key(key))
+        return json.loads(data) if data else None
+
+    async def _write(self, key: str, payload) -> None:
+        entry = json.dumps({"fetched_at": time.time(), "payload": payload})
+        await self.redis.set(self._cache_key(key), entry, px=int((self.fresh_ttl + self.stale_ttl) * 1000))
+
+    async def get(self, key: str, fetch: Callable[[], Awaitable[dict]]):
+        """Return the cached payload for key, calling fetch() upstream only when needed."""
+        entry = await self._read(key)
+        if entry is not None:
+            age = time.time() - entry["fetched_at"]
+            if age < self.fresh_ttl:
+                self.hits += 1
+                CACHE_EVENTS.labels("leaderboard", "hit").inc()
+                return entry["payload"]
+
+            # Stale: answer now and refresh in the background
+            self.stale_hits += 1
+            CACHE_EVENTS.labels("leaderboard", "stale_hit").inc()
+            self._refresh(key, fetch)
+            return entry["payload"]
+
+        self.misses += 1
+        CACHE_EVENTS.labels("leaderboard", "miss").inc()
+        return await asyncio.shield(self._refresh(key, fetch))
+
+    def _refresh(self, key: str, fetch: Callable[[], Awaitable[dict]]) -> asyncio.Task:
+        """Start (or join) the single in-process refresh for key."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_and_store(key, fetch))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_refresh_done(key, t))
+        return task
+
+    def _on_refresh_done(self, key: str, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Leaderboard refresh for {key} failed: {task.exception()}")
+
+    async def _fetch_and_store(self, key: str, fetch: Callable[[], Awaitable[dict]]):
+        token = uuid.uuid4().hex
+        lock_key = self._lock_key(key)
+        acquired = await self.redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+
+        if not acquired:
+            # Another worker is fetching; wait for it to publish a fresh entry
+            deadline = time.monotonic() + self.lock_ttl
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                entry = await self._read(key)
+                if entry is not None and time.time() - entry["fetched_at"] < self.fresh_ttl:
+                    return entry["payload"]
+
+        try:
+            self.upstream_calls += 1
+            try:
+                payload = await fetch()
+            except Exception:
+                self.upstream_errors += 1
+                raise
+            await self._write(key, payload)
+            return payload
+        finally:
+            if acquired:
+                await self._release_lock(keys=[lock_key], args=[token])
+
+    async def invalidate(self, key: str) -> None:
+        """Drop the cached payload so the next read goes upstream."""
+        await self.redis.delete(self._cache_key(key))
+
+    def stats(self) -> dict:
+        served = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.stale_hits) / served, 4) if served else 0.0,
+            "upstream_calls": self.upstream_calls,
+            "upstream_errors": self.upstream_errors,
+            "sessions_verified": self.sessions_verified,
+        }
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import time
+import uuid
+from dotenv import load_dotenv
+
+from apoorvbackend.src.logger import logger
+from apoorvbackend.src.lootlocker.client import LootLockerClient
+from apoorvbackend.src.redis.locks import RELEASE_LOCK_SCRIPT
+
+load_dotenv()
+
+# Hash of player -> locally accumulated score total
+TOTALS_KEY = "score:totals"
+# Set of players whose total has changed since it was last pushed to LootLocker
+PENDING_KEY = "score:pending"
+# Set of players whose pre-existing LootLocker score has been folded into TOTALS_KEY
+SEEDED_KEY = "score:seeded"
+# Held by the worker currently flushing, so the upstream rate limit is cluster-wide
+FLUSH_LOCK_KEY = "score:flush:lock"
+
+# Adds the upstream score to the total and marks the player seeded, unless already seeded
+# KEYS[1] = SEEDED_KEY, KEYS[2] = TOTALS_KEY, ARGV[1] = player, ARGV[2] = upstream score
+SEED_SCRIPT = """
+if redis.call('SADD', KEYS[1], ARGV[1]) == 1 then
+    return redis.call('HINCRBY', KEYS[2], ARGV[1], ARGV[2])
+end
+return false
+"""
+
+
+class ScoreSubmissionQueue:
+    """
+    Accumulates score deltas in Redis and pushes totals to LootLocker in the background.
+
+    submit() is a single atomic HINCRBY + SADD round trip that never calls LootLocker,
+    so concurrent submissions for one player never lose updates. A flusher task
+    periodically takes up to batch_size pending players and submits each player's
+    current total, at most max_per_second upstream calls per second across all
+    workers. Before a player's first push it reads their existing LootLocker score
+    into the total; until then submit() flags the totals it returns as provisional.
+    """
+
+    def __init__(self, redis_client, lootlocker_client: LootLockerClient, submitter_identifier: str,
+                 leaderboard_cache=None, flush_interval: float = None, max_per_second: float = None,
+                 batch_size: int = None, metadata: str = "test_run"):
+        self.redis = redis_client
+        self.lootlocker = lootlocker_client
+        self.submitter_identifier = submitter_identifier
+        self.leaderboard_cache = leaderboard_cache
+        self.flush_interval = float(flush_interval or os.getenv("SCORE_FLUSH_INTERVAL", 2))
+        self.max_per_second = float(max_per_second or os.getenv("SCORE_FLUSH_MAX_PER_SECOND", 5))
+        self.batch_size = int(batch_size or os.getenv("SCORE_FLUSH_BATCH_SIZE", 50))
+        self.metadata = metadata
+        self._task = None
+        # Earliest time the flusher may make its next upstream call
+        self._next_call = 0.0
+        self._release_lock = self.redis.register_script(RELEASE_LOCK_SCRIPT)
+        self._seed_total = self.redis.register_script(SEED_SCRIPT)
+        self.submitted = 0
+        self.flushed = 0
+        self.failed = 0
+
+    async def submit(self, player_identifier: str, delta_score: int) -> tuple:
+        """
+        Add delta_score to the player's total and queue it for upload.
+        Returns (new total, provisional): the total is provisional until the flusher has
+        read the player's existing LootLocker score into it.
+        """
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hincrby(TOTALS_KEY, player_identifier, delta_score)
+        pipe.sadd(PENDING_KEY, player_identifier)
+        pipe.sismember(SEEDED_KEY, player_identifier)
+        new_total, _, seeded = await pipe.execute()
+        self.submitted += 1
+        return new_total, not seeded
+
+    async def _pace(self) -> None:
+        """Space the flusher's upstream calls at least 1 / max_per_second apart."""
+        now = time.monotonic()
+        if self._next_call > now:
+            await asyncio.sleep(self._next_call - now)
+        self._next_call = max(now, self._next_call) + 1 / self.max_per_second
+
+    async def _seed(self, player_identifier: str) -> None:
+        """Fold the player's existing LootLocker score into the local total, once per player."""
+        if await self.redis.sismember(SEEDED_KEY, player_identifier):
+            return
+        await self._pace()
+        upstream_score = await self.lootlocker.get_member_score(player_identifier, self.submitter_identifier)
+        await self._seed_total(keys=[SEEDED_KEY, TOTALS_KEY], args=[player_identifier, upstream_score])
+
+    async def _push(self, player_identifier: str) -> None:
+        await self._seed(player_identifier)
+        await self._pace()
+        total = int(await self.redis.hget(TOTALS_KEY, player_identifier) or 0)
+        await self.lootlocker.submit_score(player_identifier, total, self.submitter_identifier, metadata=self.metadata)
+
+    async def flush_once(self) -> int:
+        """Push one batch of pending totals upstream. Returns the number of players flushed."""
+        token = uuid.uuid4().hex
+        lock_ttl_ms = int(max(self.flush_interval, self.batch_size / self.max_per_second) * 2000)
+        if not await self.redis.set(FLUSH_LOCK_KEY, token, nx=True, px=lock_ttl_ms):
+            return 0
+
+        flushed = 0
+        try:
+            players = await self.redis.spop(PENDING_KEY, self.batch_size)
+            players = [p.decode("utf-8") if isinstance(p, bytes) else p for p in (players or [])]
+            for player_identifier in players:
+                try:
+                    await self._push(player_identifier)
+                    flushed += 1
+                except Exception as e:
+                    # Re-queue so the latest total is pushed on a later flush
+                    self.failed += 1
+                    await self.redis.sadd(PENDING_KEY, player_identifier)
+                    logger.error(f"Score flush failed for {player_identifier}: {e}")
+
+            if flushed:
+                self.flushed += flushed
+                logger.info(f"Flushed {flushed} score totals to LootLocker")
+                if self.leaderboard_cache is not None:
+                    await self.leaderboard_cache.invalidate(self.lootlocker.leaderboard_key)
+        finally:
+            await self._release_lock(keys=[FLUSH_LOCK_KEY], args=[token])
+        return flushed
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await self.flush_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in score flush loop: {e}")
+            await asyncio.sleep(self.flush_interval)
+
+    async def start(self) -> None:
+        """Start the background flusher."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+            logger.info(f"Score flusher started ({self.max_per_second}/s, every {self.flush_interval}s)")
+
+    async def stop(self) -> None:
+        """Stop the flusher and push whatever is pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush_once()
+        except Exception as e:
+            logger.error(f"Final score flush failed: {e}")
+
+    async def stats(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "pending": await self.redis.scard(PENDING_KEY),
+        }
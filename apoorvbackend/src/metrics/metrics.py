@@ -0,0 +1,92 @@
+import contextvars
+import functools
+import inspect
+import os
+import time
+from contextlib import contextmanager
+
+# prometheus_client picks multiprocess mode at import time if the variable merely exists,
+# so an empty value (e.g. from a .env file) has to count as unset
+for _name in ("PROMETHEUS_MULTIPROC_DIR", "prometheus_multiproc_dir"):
+    if _name in os.environ and not os.environ[_name].strip():
+        del os.environ[_name]
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+
+try:
+    from opentelemetry import trace
+    _tracer = trace.get_tracer("apoorvbackend")
+except ImportError:
+    _tracer = None
+
+# Request id of the current request; set by RequestIdMiddleware, attached to spans
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+STAGE_SECONDS = Histogram(
+    "apoorv_stage_seconds",
+    "Time spent in each stage of request handling and background work",
+    ["component", "stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+LLM_CALLS = Counter("apoorv_llm_calls_total", "LLM provider calls by outcome", ["provider", "outcome"])
+LLM_FALLBACKS = Counter("apoorv_llm_fallbacks_total", "Requests that moved on to another provider", ["from_provider"])
+LLM_HEDGES = Counter("apoorv_llm_hedges_total", "Hedged requests, by the provider that was too slow", ["provider"])
+KEY_COOLDOWNS = Counter("apoorv_llm_key_cooldowns_total", "Gemini keys put in cooldown", ["key"])
+CACHE_EVENTS = Counter("apoorv_cache_events_total", "Cache lookups by cache and result", ["cache", "result"])
+UPSTREAM_CALLS = Counter("apoorv_lootlocker_calls_total", "LootLocker API calls", ["endpoint", "status"])
+RATE_LIMITED = Counter("apoorv_rate_limited_total", "Requests refused by admission control", ["scope"])
+PROMPT_TOKENS = Counter("apoorv_prompt_history_tokens_total", "Estimated history tokens sent to the LLM", ["kind"])
+SUMMARIES = Counter("apoorv_conversation_summaries_total", "Background conversation summaries by outcome", ["outcome"])
+BACKUP_KEYS = Counter("apoorv_backup_keys_total", "Chat keys processed by the Postgres backup", ["kind"])
+IN_FLIGHT = Gauge("apoorv_in_flight_requests", "Requests currently being handled", ["path"], multiprocess_mode="livesum")
+BACKUP_LEADER = Gauge("apoorv_backup_leader", "1 while this process runs scheduled backups", multiprocess_mode="livesum")
+QUEUE_DEPTH = Gauge("apoorv_queue_depth", "Items waiting in background queues and pools", ["queue"], multiprocess_mode="max")
+
+
+@contextmanager
+def timed(component: str, stage: str):
+    """Observe the duration of the block in STAGE_SECONDS, inside a tracing span when OpenTelemetry is installed."""
+    started = time.perf_counter()
+    if _tracer is None:
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.labels(component, stage).observe(time.perf_counter() - started)
+        return
+
+    with _tracer.start_as_current_span(f"{component}.{stage}") as span:
+        request_id = request_id_var.get()
+        if request_id:
+            span.set_attribute("request_id", request_id)
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.labels(component, stage).observe(time.perf_counter() - started)
+
+
+def instrumented(component: str, stage: str):
+    """Decorator form of timed() for sync and async functions."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed(component, stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(component, stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_latest():
+    """Return (body, content type) for the /metrics endpoint; aggregates workers in multiprocess mode."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,45 @@
+import uuid
+
+from apoorvbackend.src.metrics.metrics import IN_FLIGHT, request_id_var
+
+# Paths reported individually in the in-flight gauge; everything else is "other"
+TRACKED_PATHS = ("/chat/", "/chat/stream", "/ask/", "/guest-login", "/leaderboard", "/submit-score")
+
+
+class RequestIdMiddleware:
+    """
+    Pure ASGI middleware that assigns each request an id (from the X-Request-ID header,
+    or a new one), exposes it through request_id_var for spans and logs, echoes it in
+    the response headers, and tracks in-flight requests per path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        path = scope["path"] if scope["path"] in TRACKED_PATHS else "other"
+        gauge = IN_FLIGHT.labels(path)
+        gauge.inc()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            gauge.dec()
+            request_id_var.reset(token)
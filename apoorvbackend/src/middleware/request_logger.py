@@ -0,0 +1,59 @@
+import os
+import random
+from dotenv import load_dotenv
+
+from apoorvbackend.src.logger import logger
+
+load_dotenv()
+
+
+class RequestBodyLogger:
+    """
+    Pure ASGI middleware that logs (a prefix of) request bodies.
+
+    The body is never buffered or re-assembled for the application: chunks are
+    observed as the app reads them through `receive`, and only the first max_bytes
+    are kept for the log line. Requests are logged only for paths starting with one
+    of include_paths, and only for a sample_rate fraction of them.
+    """
+
+    def __init__(self, app, sample_rate: float = None, max_bytes: int = None, include_paths: list = None):
+        self.app = app
+        self.sample_rate = float(sample_rate if sample_rate is not None else os.getenv("REQUEST_LOG_SAMPLE_RATE", 1.0))
+        self.max_bytes = int(max_bytes if max_bytes is not None else os.getenv("REQUEST_LOG_MAX_BYTES", 2048))
+        if include_paths is None:
+            include_paths = [p.strip() for p in os.getenv("REQUEST_LOG_PATHS", "/chat/,/ask/").split(",") if p.strip()]
+        self.include_paths = tuple(include_paths)
+
+    def _should_log(self, scope) -> bool:
+        if scope["type"] != "http" or scope.get("method") != "POST":
+            return False
+        if not scope["path"].startswith(self.include_paths):
+            return False
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if not self._should_log(scope):
+            await self.app(scope, receive, send)
+            return
+
+        captured = []
+        state = {"captured": 0, "total": 0}
+
+        async def logging_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                state["total"] += len(body)
+                room = self.max_bytes - state["captured"]
+                if room > 0 and body:
+                    chunk = body[:room]
+                    captured.append(chunk)
+                    state["captured"] += len(chunk)
+                if not message.get("more_body", False):
+                    truncated = state["total"] - state["captured"]
+                    suffix = f" ... (+{truncated} bytes)" if truncated > 0 else ""
+                    logger.info(f"Request body {scope['path']}: {b''.join(captured)!r}{suffix}")
+            return message
+
+        await self.app(scope, logging_receive, send)
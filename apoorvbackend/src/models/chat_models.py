@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field
+from langchain_core.messages import AIMessage, HumanMessage
 
 
 class ChatRequest(BaseModel):
@@ -17,3 +18,65 @@ class LLMResponse(BaseModel):
     flag: bool = Field(
         description="Flag to check if any condition that needs to be met by the user to procceed. Set only true if the user manages to meet the condition that is required by the actor to perform the next action.",
     )
+
+
+class ChatRecord:
+    """
+    Lightweight chat message used on the request path (Redis <-> handler <-> response).
+    Converted to a LangChain message only when the prompt is built.
+    """
+
+    __slots__ = ("role", "content", "flag")
+
+    HUMAN = "h"
+    AI = "a"
+
+    def __init__(self, role: str, content: str, flag: bool = None):
+        self.role = role
+        self.content = content
+        self.flag = flag
+
+    @classmethod
+    def human(cls, content: str) -> "ChatRecord":
+        return cls(cls.HUMAN, content)
+
+    @classmethod
+    def ai(cls, content: str, flag: bool = None) -> "ChatRecord":
+        return cls(cls.AI, content, flag)
+
+    @classmethod
+    def from_message(cls, message) -> "ChatRecord":
+        """Accept a ChatRecord or a HumanMessage/AIMessage."""
+        if isinstance(message, ChatRecord):
+            return message
+        if isinstance(message, HumanMessage):
+            return cls.human(message.content)
+        if isinstance(message, AIMessage):
+            return cls.ai(message.content, message.additional_kwargs.get("flag", None))
+        raise ValueError("Invalid message type")
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ChatRecord":
+        """Parse the {"role": "human"|"ai", "content", "flag"} form used by legacy blobs and backups."""
+        role = data.get("role")
+        if role == "human":
+            return cls.human(data.get("content"))
+        if role == "ai":
+            return cls.ai(data.get("content"), data.get("flag", None))
+        raise ValueError("Invalid message role")
+
+    def to_dict(self) -> dict:
+        if self.role == self.HUMAN:
+            return {"role": "human", "content": self.content}
+        return {"role": "ai", "content": self.content, "flag": self.flag}
+
+    def to_message(self):
+        if self.role == self.HUMAN:
+            return HumanMessage(content=self.content)
+        return AIMessage(content=self.content, additional_kwargs={"flag": self.flag})
+
+    def __eq__(self, other):
+        return isinstance(other, ChatRecord) and (self.role, self.content, self.flag) == (other.role, other.content, other.flag)
+
+    def __repr__(self):
+        return f"ChatRecord(role={self.role!r}, content={self.content!r}, flag={self.flag!r})"
@@ -1,26 +1,93 @@
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, PromptTemplate
 from langchain_core.messages import SystemMessage
 from apoorvbackend.src.logger import logger
-from apoorvbackend.utilites import load_prompt
+from apoorvbackend.utilites import load_prompt, get_prompt_path, PROMPTS_DIR
+from apoorvbackend.src.metrics.metrics import CACHE_EVENTS, instrumented
+import os
+import threading
+import time
 
 class PromptLoader:
 
+    # (level, agent_name) -> (mtime, last_checked, template)
+    _cache = {}
+    _lock = threading.Lock()
+    # Minimum number of seconds between mtime checks of a cached prompt file
+    reload_interval = float(os.getenv("PROMPT_RELOAD_INTERVAL", 5))
+    hits = 0
+    misses = 0
+
     @staticmethod
-    def get_prompt_template(level: str, agent_name: str) -> ChatPromptTemplate:
-        logger.info(f"Loading prompt for agent {agent_name}")
+    def _build_template(prompt: str) -> ChatPromptTemplate:
+        return ChatPromptTemplate.from_messages(
+            [
+                SystemMessage(
+                    content=prompt
+                ),
+                MessagesPlaceholder(variable_name="messages"),
+            ]
+        )
+
+    @classmethod
+    def _load(cls, level: str, agent_name: str, mtime: float) -> ChatPromptTemplate:
+        """Read the prompt file, compile it and store it in the cache."""
+        prompt = load_prompt(level, agent_name)
+        prompt_template = cls._build_template(prompt)
+        with cls._lock:
+            cls._cache[(level, agent_name)] = (mtime, time.monotonic(), prompt_template)
+            cls.misses += 1
+        CACHE_EVENTS.labels("prompt", "miss").inc()
+        return prompt_template
+
+    @classmethod
+    @instrumented("prompt", "load")
+    def get_prompt_template(cls, level: str, agent_name: str) -> ChatPromptTemplate:
         try:
-            prompt = load_prompt(level, agent_name)
-            prompt_template = ChatPromptTemplate.from_messages(
-                [
-                    SystemMessage(
-                        content=prompt
-                    ),
-                    MessagesPlaceholder(variable_name="messages"),
-                ]
-            )
-
-            return prompt_template
-        
+            entry = cls._cache.get((level, agent_name))
+            if entry is not None:
+                mtime, last_checked, prompt_template = entry
+                now = time.monotonic()
+                if now - last_checked < cls.reload_interval:
+                    cls.hits += 1
+                    CACHE_EVENTS.labels("prompt", "hit").inc()
+                    return prompt_template
+
+                # Re-validate against the file on disk, reloading only if it changed
+                current_mtime = os.path.getmtime(get_prompt_path(level, agent_name))
+                if current_mtime == mtime:
+                    with cls._lock:
+                        cls._cache[(level, agent_name)] = (mtime, now, prompt_template)
+                        cls.hits += 1
+                    CACHE_EVENTS.labels("prompt", "hit").inc()
+                    return prompt_template
+                logger.info(f"Prompt for agent {agent_name} changed on disk, reloading")
+                return cls._load(level, agent_name, current_mtime)
+
+            logger.info(f"Loading prompt for agent {agent_name}")
+            return cls._load(level, agent_name, os.path.getmtime(get_prompt_path(level, agent_name)))
+
         except Exception as e:
             logger.error(f"Error loading prompt for agent {agent_name}: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    @classmethod
+    def preload(cls) -> int:
+        """Compile every prompt under the prompts directory. Returns the number of prompts loaded."""
+        loaded = 0
+        for level in sorted(os.listdir(PROMPTS_DIR)):
+            level_dir = os.path.join(PROMPTS_DIR, level)
+            if not os.path.isdir(level_dir):
+                continue
+            for file_name in sorted(os.listdir(level_dir)):
+                agent_name, ext = os.path.splitext(file_name)
+                if ext != ".txt":
+                    continue
+                if cls.get_prompt_template(level, agent_name) is not None:
+                    loaded += 1
+        logger.info(f"Preloaded {loaded} prompt templates")
+        return loaded
+
+    @classmethod
+    def stats(cls) -> dict:
+        """Return cache hit/miss counters."""
+        return {"hits": cls.hits, "misses": cls.misses, "size": len(cls._cache)}
@@ -0,0 +1,72 @@
+import json
+
+from apoorvbackend.src.models.chat_models import ChatRecord
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Stored chat messages come in two formats, told apart by their first character:
+#   v1 (legacy): {"role": "human"|"ai", "content": ..., "flag": ...}
+#   v2:          [2, "h", content] or [2, "a", content, flag]
+CODEC_VERSION = 2
+
+
+def dumps(value) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _pack(record: ChatRecord) -> list:
+    if record.role == ChatRecord.HUMAN:
+        return [CODEC_VERSION, ChatRecord.HUMAN, record.content]
+    return [CODEC_VERSION, ChatRecord.AI, record.content, record.flag]
+
+
+def _unpack(value) -> ChatRecord:
+    if isinstance(value, dict):
+        return ChatRecord.from_dict(value)
+    if value[0] != CODEC_VERSION:
+        raise ValueError(f"Unsupported chat record version {value[0]}")
+    if value[1] == ChatRecord.HUMAN:
+        return ChatRecord.human(value[2])
+    if value[1] == ChatRecord.AI:
+        return ChatRecord.ai(value[2], value[3] if len(value) > 3 else None)
+    raise ValueError("Invalid message role")
+
+
+def encode_record(message) -> bytes:
+    """Encode one message (ChatRecord or LangChain message) as a list element."""
+    return dumps(_pack(ChatRecord.from_message(message)))
+
+
+def encode_records(messages: list) -> list:
+    return [encode_record(message) for message in messages]
+
+
+def decode_record(item) -> ChatRecord:
+    """Decode one list element of either version."""
+    return _unpack(loads(item))
+
+
+def decode_records(items: list) -> list:
+    return [_unpack(loads(item)) for item in items]
+
+
+def encode_blob(messages: list) -> bytes:
+    """Encode a whole history as the single value used by string storage."""
+    return dumps([_pack(ChatRecord.from_message(message)) for message in messages])
+
+
+def decode_blob(data) -> list:
+    """Decode a string-storage value; its elements may be of either version."""
+    return [_unpack(value) for value in loads(data)]
@@ -0,0 +1,100 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from dotenv import load_dotenv
+
+from apoorvbackend.src.logger import logger
+from apoorvbackend.src.redis.locks import RELEASE_LOCK_SCRIPT, RENEW_LOCK_SCRIPT
+
+load_dotenv()
+
+
+class LeaderLease:
+    """
+    Leader election over a single Redis key (SET NX PX with an owner token).
+
+    A daemon thread tries to take the lease while it is free and renews it every
+    ttl/3 while held. A failed renewal (lease lost, Redis unreachable) drops
+    leadership at once, and is_leader also turns false on its own if renewals stop
+    arriving, so two holders never act at the same time. When a leader dies its
+    lease expires after ttl and another process takes over.
+    """
+
+    def __init__(self, redis_client, key: str, ttl: float = None):
+        self.redis = redis_client
+        self.key = key
+        self.ttl = float(ttl or os.getenv("LEADER_LEASE_TTL", 30))
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._renew = self.redis.register_script(RENEW_LOCK_SCRIPT)
+        self._release = self.redis.register_script(RELEASE_LOCK_SCRIPT)
+        self._held = False
+        # Local deadline after which we stop trusting the lease without a fresh renewal
+        self._valid_until = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._held and time.monotonic() < self._valid_until
+
+    def _tick(self) -> None:
+        started = time.monotonic()
+        ttl_ms = int(self.ttl * 1000)
+        try:
+            if self._held:
+                ok = self._renew(keys=[self.key], args=[self.token, ttl_ms]) == 1
+            else:
+                ok = bool(self.redis.set(self.key, self.token, nx=True, px=ttl_ms))
+        except Exception as e:
+            logger.warning(f"Leader lease {self.key} unavailable: {e}")
+            ok = False
+
+        if ok:
+            if not self._held:
+                logger.info(f"Acquired leader lease {self.key} as {self.token}")
+            self._held = True
+            # Leave a third of the ttl as margin for clock drift and slow round trips
+            self._valid_until = started + self.ttl * 2 / 3
+        elif self._held:
+            logger.warning(f"Lost leader lease {self.key}")
+            self._held = False
+
+    def _run(self) -> None:
+        self._tick()
+        while not self._stop.wait(self.ttl / 3):
+            self._tick()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: float) -> bool:
+        """Wait up to timeout seconds (after start()) for the lease; returns is_leader."""
+        deadline = time.monotonic() + timeout
+        while not self.is_leader and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return self.is_leader
+
+    def stop(self) -> None:
+        """Stop renewing and hand the lease over immediately instead of waiting for it to expire."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._held:
+            try:
+                self._release(keys=[self.key], args=[self.token])
+                logger.info(f"Released leader lease {self.key}")
+            except Exception as e:
+                logger.warning(f"Could not release leader lease {self.key}: {e}")
+        self._held = False
+
+    def holder(self):
+        """Token of the current lease holder, or None."""
+        value = self.redis.get(self.key)
+        return value.decode("utf-8") if value else None
@@ -0,0 +1,19 @@
+# Lua scripts shared by the token-guarded Redis locks (SET key token NX PX ttl)
+
+# Deletes the lock only if the caller still owns it
+# KEYS[1] = lock key, ARGV[1] = owner token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Extends the lock's expiry only if the caller still owns it
+# KEYS[1] = lock key, ARGV[1] = owner token, ARGV[2] = ttl in milliseconds
+RENEW_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
@@ -0,0 +1,159 @@
+import os
+import uuid
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+from apoorvbackend.src.logger import logger
+from apoorvbackend.src.metrics.metrics import RATE_LIMITED
+
+load_dotenv()
+
+RATE_LIMIT_KEY_PREFIX = "ratelimit"
+LLM_SLOTS_KEY = "llm:slots"
+
+# Token bucket refilled continuously at ARGV[1] tokens/s up to ARGV[2] tokens.
+# Uses the Redis clock so every worker sees the same time.
+# KEYS[1] = bucket hash (tokens, ts), ARGV[3] = cost
+# Returns {1, 0} when allowed, {0, retry_after_ms} when not
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = math.ceil((cost - tokens) * 1000 / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+return {allowed, retry_after}
+"""
+
+# Counting semaphore over a zset of holders scored by lease expiry, so slots held by
+# a crashed worker free themselves after the lease.
+# KEYS[1] = slots zset, ARGV[1] = holder id, ARGV[2] = limit, ARGV[3] = lease ms
+# Returns {1, 0} when a slot was taken, {0, ms until the earliest lease expires} when full
+ACQUIRE_SLOT_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+    redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[3]))
+    return {1, 0}
+end
+local earliest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return {0, math.max(1, tonumber(earliest[2]) - now)}
+"""
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request is refused by admission control; carries the suggested wait."""
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded ({scope}), retry after {retry_after:.1f}s")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Redis-backed admission control shared by all workers.
+
+    - check_user: token bucket per user_id on the LLM-backed endpoints.
+    - check_provider: global token bucket per LLM provider.
+    - llm_slot: bounded number of concurrent LLM calls across all workers; when
+      every slot is taken the request is refused instead of queued.
+
+    Each check is one script call. If Redis is unreachable the limiter fails open.
+    Off unless RATE_LIMIT_ENABLED=1: the provider rates have to match the quota of the
+    deployment's own keys, so there is no safe default.
+    """
+
+    def __init__(self, redis_client, enabled: bool = None, user_rate: float = None, user_burst: int = None,
+                 provider_rate: float = None, provider_burst: int = None, max_concurrency: int = None,
+                 slot_ttl: float = None):
+        self.redis = redis_client
+        self.enabled = enabled if enabled is not None else os.getenv("RATE_LIMIT_ENABLED", "0") == "1"
+        self.user_rate = float(user_rate or os.getenv("RATE_LIMIT_USER_RATE", 1))
+        self.user_burst = int(user_burst or os.getenv("RATE_LIMIT_USER_BURST", 10))
+        self.provider_rate = float(provider_rate or os.getenv("RATE_LIMIT_PROVIDER_RATE", 10))
+        self.provider_burst = int(provider_burst or os.getenv("RATE_LIMIT_PROVIDER_BURST", 20))
+        self.max_concurrency = int(max_concurrency or os.getenv("LLM_MAX_CONCURRENCY", 32))
+        self.slot_ttl = float(slot_ttl or os.getenv("LLM_SLOT_TTL", 120))
+        self._bucket = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+        self._acquire_slot = self.redis.register_script(ACQUIRE_SLOT_SCRIPT)
+
+    def _provider_limits(self, provider: str):
+        """Per-provider overrides: RATE_LIMIT_<PROVIDER>_RATE / RATE_LIMIT_<PROVIDER>_BURST."""
+        name = provider.upper()
+        rate = float(os.getenv(f"RATE_LIMIT_{name}_RATE", self.provider_rate))
+        burst = int(os.getenv(f"RATE_LIMIT_{name}_BURST", self.provider_burst))
+        return rate, burst
+
+    async def _take(self, scope: str, key: str, rate: float, burst: int) -> None:
+        if not self.enabled:
+            return
+        try:
+            allowed, retry_after_ms = await self._bucket(keys=[key], args=[rate, burst, 1])
+        except Exception as e:
+            logger.warning(f"Rate limiter unavailable, allowing request: {e}")
+            return
+        if not allowed:
+            RATE_LIMITED.labels(scope).inc()
+            raise RateLimitExceeded(scope, int(retry_after_ms) / 1000)
+
+    async def check_user(self, user_id: str) -> None:
+        """Take one token from user_id's bucket, or raise RateLimitExceeded."""
+        await self._take("user", f"{RATE_LIMIT_KEY_PREFIX}:user:{user_id}", self.user_rate, self.user_burst)
+
+    async def check_provider(self, provider: str) -> None:
+        """Take one token from the global bucket of provider, or raise RateLimitExceeded."""
+        rate, burst = self._provider_limits(provider)
+        await self._take(f"provider:{provider}", f"{RATE_LIMIT_KEY_PREFIX}:provider:{provider}", rate, burst)
+
+    @asynccontextmanager
+    async def llm_slot(self):
+        """Hold one of max_concurrency LLM slots for the duration of the block, or raise RateLimitExceeded."""
+        if not self.enabled:
+            yield
+            return
+
+        holder = uuid.uuid4().hex
+        acquired = False
+        try:
+            acquired, retry_after_ms = await self._acquire_slot(
+                keys=[LLM_SLOTS_KEY], args=[holder, self.max_concurrency, int(self.slot_ttl * 1000)]
+            )
+        except Exception as e:
+            logger.warning(f"LLM concurrency limiter unavailable, allowing request: {e}")
+        else:
+            if not acquired:
+                RATE_LIMITED.labels("concurrency").inc()
+                # A slot frees up when a call finishes; the lease expiry is only an upper bound
+                raise RateLimitExceeded("concurrency", min(1.0, int(retry_after_ms) / 1000))
+
+        try:
+            yield
+        finally:
+            if acquired:
+                try:
+                    await self.redis.zrem(LLM_SLOTS_KEY, holder)
+                except Exception as e:
+                    logger.warning(f"Failed to release LLM slot: {e}")
+
+    async def slots_in_use(self) -> int:
+        """Number of LLM slots currently leased across all workers."""
+        return await self.redis.zcard(LLM_SLOTS_KEY)
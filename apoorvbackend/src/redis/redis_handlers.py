@@ -1,77 +1,676 @@
 import redis
-import json
+import redis.asyncio as aioredis
+import asyncio
 import os
 import time
+import uuid
 from dotenv import load_dotenv
 
-from langchain_core.messages import AIMessage, HumanMessage
-
 from apoorvbackend.src.logger import logger
+from apoorvbackend.src.database.chat_archive import ChatArchive
+from apoorvbackend.src.models.chat_models import ChatRecord
+from apoorvbackend.src.redis import codec
+from apoorvbackend.src.redis.locks import RELEASE_LOCK_SCRIPT
+from apoorvbackend.src.metrics.metrics import CACHE_EVENTS, instrumented, timed
 
 load_dotenv()
 
+STORAGE_LIST = "list"
+STORAGE_STRING = "string"
+
+LEGACY_KEY_PREFIX = "chat"
+LIST_KEY_PREFIX = "chatlog"
+# Total number of messages ever appended to a conversation (absolute position of the next message)
+SEQ_KEY_PREFIX = "chatseq"
+# Rolling summary of a conversation's older messages (hash: text, covered, tokens)
+SUMMARY_KEY_PREFIX = "chatsummary"
+# Set of chat keys written since the last backup; drained by PostgresBackupService
+DIRTY_SET_KEY = "backup:dirty"
+# Lock held by the one process restoring an evicted conversation from Postgres
+RESTORE_LOCK_PREFIX = "chatrestore"
+
+# Moves a legacy JSON blob (chat:*) into the head of its list key (chatlog:*) atomically,
+# so concurrent requests for the same conversation cannot migrate it twice. The list key
+# is marked dirty so the next backup archives it in the new format.
+# KEYS[1] = legacy string key, KEYS[2] = list key, KEYS[3] = seq key, KEYS[4] = dirty set,
+# ARGV[1] = history cap
+MIGRATE_SCRIPT = """
+local data = redis.call('GET', KEYS[1])
+if not data then
+    return 0
+end
+local messages = cjson.decode(data)
+for i = #messages, 1, -1 do
+    redis.call('LPUSH', KEYS[2], cjson.encode(messages[i]))
+end
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[1]), -1)
+redis.call('INCRBY', KEYS[3], #messages)
+redis.call('DEL', KEYS[1])
+redis.call('SREM', KEYS[4], KEYS[1])
+redis.call('SADD', KEYS[4], KEYS[2])
+return #messages
+"""
+
+# Loads the messages not yet folded into the conversation's summary (at most ARGV[1]
+# of the newest), together with the summary text, in one round trip.
+# List index i holds absolute message number (seq - llen + i).
+# KEYS[1] = list key, KEYS[2] = seq key, KEYS[3] = summary key
+# Returns {summary text or '', items}
+LOAD_CONTEXT_SCRIPT = """
+local llen = redis.call('LLEN', KEYS[1])
+local seq = math.max(tonumber(redis.call('GET', KEYS[2]) or '0'), llen)
+local summary = redis.call('HMGET', KEYS[3], 'text', 'covered')
+local covered = tonumber(summary[2] or '0')
+local start = math.max(covered - (seq - llen), llen - tonumber(ARGV[1]), 0)
+return {summary[1] or '', redis.call('LRANGE', KEYS[1], start, -1)}
+"""
+
+# Returns the messages to fold into the summary: everything after what it already
+# covers except the newest ARGV[1] messages.
+# KEYS[1] = list key, KEYS[2] = seq key, KEYS[3] = summary key
+# Returns {summary text or '', covered, new covered, items}
+COMPACTION_SOURCE_SCRIPT = """
+local llen = redis.call('LLEN', KEYS[1])
+local seq = math.max(tonumber(redis.call('GET', KEYS[2]) or '0'), llen)
+local summary = redis.call('HMGET', KEYS[3], 'text', 'covered')
+local covered = tonumber(summary[2] or '0')
+local first = math.max(covered - (seq - llen), 0)
+local last = llen - tonumber(ARGV[1]) - 1
+if last < first then
+    return {summary[1] or '', covered, covered, {}}
+end
+return {summary[1] or '', covered, seq - llen + last + 1, redis.call('LRANGE', KEYS[1], first, last)}
+"""
+
+# Replaces the summary only if nobody else advanced it since it was read.
+# KEYS[1] = summary key, ARGV[1] = expected covered, ARGV[2] = new covered,
+# ARGV[3] = text, ARGV[4] = estimated tokens
+STORE_SUMMARY_SCRIPT = """
+if tonumber(redis.call('HGET', KEYS[1], 'covered') or '0') ~= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'text', ARGV[3], 'covered', ARGV[2], 'tokens', ARGV[4])
+return 1
+"""
+
+# Gives a backed-up conversation its idle TTL, unless it was written again since the
+# backup read it (a write puts the key back in the dirty set).
+# KEYS[1] = dirty set, KEYS[2] = chat key, KEYS[3..] = its seq/summary keys, ARGV[1] = ttl in ms
+EXPIRE_ARCHIVED_SCRIPT = """
+if redis.call('SISMEMBER', KEYS[1], KEYS[2]) == 1 then
+    return 0
+end
+for i = 2, #KEYS do
+    redis.call('PEXPIRE', KEYS[i], ARGV[1])
+end
+return 1
+"""
+
+# Puts an archived conversation back into an absent list key, numbered so its newest
+# message keeps its archived seq. A key written in the meantime is left alone. With a
+# TTL (tiering) the restored keys expire like any other backed-up conversation.
+# KEYS[1] = list key, KEYS[2] = seq key, ARGV[1] = ttl in ms (0 = none),
+# ARGV[2] = seq of the newest archived message, ARGV[3..] = encoded messages (the newest history_cap of them)
+RESTORE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+for i = 3, #ARGV, 1000 do
+    redis.call('RPUSH', KEYS[1], unpack(ARGV, i, math.min(i + 999, #ARGV)))
+end
+redis.call('SET', KEYS[2], ARGV[2])
+if tonumber(ARGV[1]) > 0 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[1])
+    redis.call('PEXPIRE', KEYS[2], ARGV[1])
+end
+return 1
+"""
+
+# Returns the messages appended after absolute message number ARGV[1], for the
+# message-level archive. Trimmed messages are gone, so the result may start later.
+# KEYS[1] = list key, KEYS[2] = seq key
+# Returns {seq, seq of the first returned message - 1, items}
+READ_NEW_SCRIPT = """
+local llen = redis.call('LLEN', KEYS[1])
+local seq = math.max(tonumber(redis.call('GET', KEYS[2]) or '0'), llen)
+local start = math.max(tonumber(ARGV[1]) - (seq - llen), 0)
+return {seq, seq - llen + start, redis.call('LRANGE', KEYS[1], start, -1)}
+"""
+
 class RedisChatHandler:
-    def __init__(self, max_messages=10):
+    def __init__(self, max_messages=10, storage_mode=None, history_cap=None, client=None, async_client=None,
+                 idle_ttl=None, archive=None):
         self.host = os.getenv("REDIS_HOST", "localhost")
         self.port = int(os.getenv("REDIS_PORT", 6379))
         self.db = int(os.getenv("REDIS_DB", 0))
         self.max_messages = max_messages
-        
+        # "list": append-only Redis list per conversation, "string": legacy full JSON blob
+        self.storage_mode = storage_mode or os.getenv("REDIS_CHAT_STORAGE", STORAGE_LIST)
+        # Upper bound on messages kept per conversation in list mode (read in full by the backup)
+        self.history_cap = int(history_cap or os.getenv("REDIS_CHAT_HISTORY_CAP", 1000))
+
+        # Sync client is kept for the backup service and other threaded callers
+        # (client/async_client may be supplied instead, e.g. fakeredis in benchmarks)
         self.pool = redis.ConnectionPool(host=self.host, port=self.port, db=self.db)
-        self.client = redis.Redis(connection_pool=self.pool)
+        self.client = client if client is not None else redis.Redis(connection_pool=self.pool)
+
+        # Async client is used by the request path so chat turns never block the event loop
+        self.async_pool = aioredis.ConnectionPool(host=self.host, port=self.port, db=self.db)
+        self.async_client = async_client if async_client is not None else aioredis.Redis(connection_pool=self.async_pool)
+
+        self._migrate = self.client.register_script(MIGRATE_SCRIPT)
+        self._amigrate = self.async_client.register_script(MIGRATE_SCRIPT)
+        self._aload_context = self.async_client.register_script(LOAD_CONTEXT_SCRIPT)
+        self._acompaction_source = self.async_client.register_script(COMPACTION_SOURCE_SCRIPT)
+        self._astore_summary = self.async_client.register_script(STORE_SUMMARY_SCRIPT)
+
+        # Tiering: conversations idle for idle_ttl seconds after their last backup are evicted
+        # from Redis and restored from Postgres on the next load (0 keeps everything in Redis)
+        self.idle_ttl = float(idle_ttl if idle_ttl is not None else os.getenv("REDIS_CHAT_IDLE_TTL", 0))
+        self.archive = archive if archive is not None else (ChatArchive() if self.idle_ttl > 0 else None)
+        # Cleared (e.g. once the startup restore is done) to stop looking misses up in the
+        # archive; archive itself stays set for loads already past the check
+        self.archive_fallback = True
+        self.restore_lock_ttl = 5.0
+        self._expire_archived = self.client.register_script(EXPIRE_ARCHIVED_SCRIPT)
+        self._restore = self.client.register_script(RESTORE_SCRIPT)
+        self._read_new = self.client.register_script(READ_NEW_SCRIPT)
+        self._release_lock = self.client.register_script(RELEASE_LOCK_SCRIPT)
+        # (user_id, level, actor) -> in-flight restore shared by concurrent requests
+        self._restoring = {}
+
+    @property
+    def uses_archive(self) -> bool:
+        """Whether Redis misses are looked up in the Postgres archive."""
+        return self.archive is not None and self.archive_fallback
 
     def _get_key(self, user_id: str, level: str, actor: str) -> str:
         """Build a Redis key based on user id, level and actor."""
-        return f"chat:{user_id}:{level}:{actor}"
-
-    def serialize_message(self, message) -> dict:
-        """Convert a message object to a dict for JSON storage."""
-        if isinstance(message, HumanMessage):
-            role = "human"
-            return {"role": role, "content": message.content}
-        
-        elif isinstance(message, AIMessage):
-            role = "ai"
-            return {"role": role, "content": message.content, "flag": message.additional_kwargs.get("flag", None)}
-        else:   
-            raise ValueError("Invalid message type")
-
-    def deserialize_message(self, data: dict):
-        """Convert dict data back to a message object."""
-        role = data.get("role")
-        content = data.get("content")
-        if role == "human":
-            return HumanMessage(content=content)
-        elif role == "ai":
-            return AIMessage(content=content, additional_kwargs={"flag": data.get("flag", None)})
-        else:
-            raise ValueError("Invalid message role")
+        return f"{LEGACY_KEY_PREFIX}:{user_id}:{level}:{actor}"
+
+    def _get_list_key(self, user_id: str, level: str, actor: str) -> str:
+        """Build the Redis list key used by the append-only storage mode."""
+        return f"{LIST_KEY_PREFIX}:{user_id}:{level}:{actor}"
+
+    def _get_seq_key(self, user_id: str, level: str, actor: str) -> str:
+        return f"{SEQ_KEY_PREFIX}:{user_id}:{level}:{actor}"
+
+    def _get_summary_key(self, user_id: str, level: str, actor: str) -> str:
+        return f"{SUMMARY_KEY_PREFIX}:{user_id}:{level}:{actor}"
+
+    @staticmethod
+    def parse_key(key: str):
+        """Split a chat key of either storage mode into (user_id, level, actor), or None if malformed."""
+        parts = key.split(":")
+        if len(parts) != 4 or parts[0] not in (LEGACY_KEY_PREFIX, LIST_KEY_PREFIX):
+            return None
+        return parts[1], parts[2], parts[3]
 
+    def _encode_history(self, chat_history: list) -> bytes:
+        """Serialize a list of messages to the blob stored in Redis (string mode)."""
+        return codec.encode_blob(chat_history)
+
+    def _encode_messages(self, messages: list) -> list:
+        """Serialize each message to its own list element."""
+        return codec.encode_records(messages)
+
+    def _decode_history(self, data, user_id: str, level: str, actor: str):
+        """Parse a stored blob and return the last 'max_messages' records."""
+        if data is None:
+            return None
+        try:
+            return codec.decode_blob(data)[-self.max_messages:]
+        except Exception as e:
+            logger.info(f"No previous history found for user {user_id} at level {level} with actor {actor}")
+            return None
+
+    def _decode_list(self, items: list, user_id: str, level: str, actor: str):
+        """Parse list elements (already limited by LRANGE) into ChatRecords."""
+        if not items:
+            return None
+        try:
+            return codec.decode_records(items)
+        except Exception as e:
+            logger.error(f"Corrupt chat history for user {user_id} at level {level} with actor {actor}: {e}")
+            return None
+
+    @staticmethod
+    def _companion_key(list_key: str, prefix: str) -> str:
+        """The seq/summary key belonging to a chatlog:* key."""
+        return prefix + list_key[len(LIST_KEY_PREFIX):]
+
+    def _queue_append(self, pipe, list_key: str, messages: list) -> None:
+        seq_key = self._companion_key(list_key, SEQ_KEY_PREFIX)
+        pipe.rpush(list_key, *self._encode_messages(messages))
+        pipe.ltrim(list_key, -self.history_cap, -1)
+        pipe.incrby(seq_key, len(messages))
+        pipe.sadd(DIRTY_SET_KEY, list_key)
+        if self.idle_ttl > 0:
+            # Written again, so not archived any more: keep it until the next backup
+            pipe.persist(list_key)
+            pipe.persist(seq_key)
+            pipe.persist(self._companion_key(list_key, SUMMARY_KEY_PREFIX))
+
+    def _queue_replace(self, pipe, list_key: str, chat_history: list) -> None:
+        # A replaced history starts its summary over but keeps counting, so message
+        # numbers are never reused (the message archive deduplicates by them)
+        pipe.delete(list_key, self._companion_key(list_key, SUMMARY_KEY_PREFIX))
+        if chat_history:
+            self._queue_append(pipe, list_key, chat_history)
+
+    def _rehydrate(self, user_id: str, level: str, actor: str) -> bool:
+        """
+        Restore a conversation evicted by the idle TTL from the Postgres archive.
+        Only one process restores a conversation at a time (Redis lock); the others wait
+        for it. Returns True if the conversation is worth reading from Redis again.
+        Archive errors are raised: answering with an empty history would let the next
+        backup overwrite the archived one.
+        """
+        token = uuid.uuid4().hex
+        lock_key = f"{RESTORE_LOCK_PREFIX}:{user_id}:{level}:{actor}"
+        if not self.client.set(lock_key, token, nx=True, px=int(self.restore_lock_ttl * 1000)):
+            deadline = time.monotonic() + self.restore_lock_ttl
+            while time.monotonic() < deadline and self.client.exists(lock_key):
+                time.sleep(0.05)
+            return True
+
+        try:
+            with timed("redis", "restore"):
+                archived = self.archive.load(user_id, level, actor)
+            if not archived or not archived[0]:
+                CACHE_EVENTS.labels("chat_archive", "miss").inc()
+                return False
+
+            CACHE_EVENTS.labels("chat_archive", "hit").inc()
+            chat_data, last_seq = archived
+            if self.restore_conversations([(user_id, level, actor, chat_data, last_seq)]):
+                logger.info(f"Restored {len(chat_data)} archived messages for {user_id}/{level}/{actor}")
+            return True
+        finally:
+            self._release_lock(keys=[lock_key], args=[token])
+
+    def restore_conversations(self, conversations: list) -> int:
+        """
+        Write archived conversations, a list of (user_id, level, actor, messages as dicts,
+        seq of the newest message), back into Redis in one pipeline round trip. Conversations that already exist in
+        Redis are skipped, so live data is never overwritten. Returns the number restored.
+        """
+        if not conversations:
+            return 0
+        ttl_ms = int(self.idle_ttl * 1000)
+        pipe = self.client.pipeline(transaction=False)
+        for user_id, level, actor, messages, last_seq in conversations:
+            records = [ChatRecord.from_dict(message) for message in messages]
+            if self.storage_mode == STORAGE_STRING:
+                pipe.set(self._get_key(user_id, level, actor), self._encode_history(records), nx=True, px=ttl_ms or None)
+            else:
+                self._restore(
+                    keys=[self._get_list_key(user_id, level, actor), self._get_seq_key(user_id, level, actor)],
+                    args=[ttl_ms, last_seq, *self._encode_messages(records[-self.history_cap:])],
+                    client=pipe,
+                )
+        return sum(1 for restored in pipe.execute() if restored)
+
+    async def _arehydrate(self, user_id: str, level: str, actor: str) -> bool:
+        """Async _rehydrate; concurrent requests in this process share one restore."""
+        conversation = (user_id, level, actor)
+        task = self._restoring.get(conversation)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(self._rehydrate, user_id, level, actor))
+            self._restoring[conversation] = task
+            task.add_done_callback(lambda _: self._restoring.pop(conversation, None))
+        return await asyncio.shield(task)
+
+    def expire_archived(self, keys: list) -> int:
+        """
+        Start the idle TTL of chat keys that were just backed up, together with their
+        seq/summary keys, skipping keys written again since. Returns the number expired.
+        """
+        if self.idle_ttl <= 0 or not keys:
+            return 0
+        ttl_ms = int(self.idle_ttl * 1000)
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            companions = []
+            if key.startswith(f"{LIST_KEY_PREFIX}:"):
+                companions = [self._companion_key(key, SEQ_KEY_PREFIX), self._companion_key(key, SUMMARY_KEY_PREFIX)]
+            self._expire_archived(keys=[DIRTY_SET_KEY, key, *companions], args=[ttl_ms], client=pipe)
+        return sum(pipe.execute())
+
+    @instrumented("redis", "save")
     def save_chat_history(self, user_id: str, level: str, actor: str, chat_history: list) -> None:
         """
-        Save the chat history list in Redis.
-        Each message is serialized to a dictionary.
+        Save the chat history list in Redis, replacing whatever is stored.
+        Messages may be ChatRecords or LangChain messages.
         """
-        key = self._get_key(user_id, level, actor)
-        serialized_history = [self.serialize_message(msg) for msg in chat_history]
-        self.client.set(key, json.dumps(serialized_history))
-        # @TODO: Add a scheduled task to save the data in postgres after every 10 mins
+        if self.storage_mode == STORAGE_STRING:
+            key = self._get_key(user_id, level, actor)
+            pipe = self.client.pipeline(transaction=False)
+            pipe.set(key, self._encode_history(chat_history))
+            pipe.sadd(DIRTY_SET_KEY, key)
+            pipe.execute()
+            return
 
+        list_key = self._get_list_key(user_id, level, actor)
+        pipe = self.client.pipeline(transaction=True)
+        self._queue_replace(pipe, list_key, chat_history)
+        pipe.delete(self._get_key(user_id, level, actor))
+        pipe.sadd(DIRTY_SET_KEY, list_key)
+        pipe.execute()
+
+    @instrumented("redis", "save")
+    def append_chat_messages(self, user_id: str, level: str, actor: str, new_messages: list, chat_history: list = None) -> None:
+        """
+        Persist the messages produced by one turn.
+        In list mode only new_messages are pushed and the list is trimmed to history_cap,
+        in one round trip. In string mode the blob is rewritten as chat_history + new_messages.
+        """
+        if self.storage_mode == STORAGE_STRING:
+            self.save_chat_history(user_id, level, actor, list(chat_history or []) + list(new_messages))
+            return
+
+        pipe = self.client.pipeline(transaction=False)
+        self._queue_append(pipe, self._get_list_key(user_id, level, actor), new_messages)
+        pipe.execute()
+
+    @instrumented("redis", "load")
     def load_chat_history(self, user_id: str, level: str, actor: str):
         """
-        Load the chat history list from Redis.
+        Load the chat history list from Redis as ChatRecords.
         If no history is found, return None.
         Only returns the last 'max_messages' messages.
         """
+        if self.storage_mode == STORAGE_STRING:
+            key = self._get_key(user_id, level, actor)
+            data = self.client.get(key)
+            if data is None and self.uses_archive and self._rehydrate(user_id, level, actor):
+                data = self.client.get(key)
+            return self._decode_history(data, user_id, level, actor)
+
+        key = self._get_key(user_id, level, actor)
+        list_key = self._get_list_key(user_id, level, actor)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.lrange(list_key, -self.max_messages, -1)
+        pipe.exists(key)
+        items, has_legacy = pipe.execute()
+
+        if has_legacy:
+            migrated = self._migrate(keys=[key, list_key, self._get_seq_key(user_id, level, actor), DIRTY_SET_KEY], args=[self.history_cap])
+            logger.info(f"Migrated {migrated} messages from {key} to {list_key}")
+            items = self.client.lrange(list_key, -self.max_messages, -1)
+        elif not items and self.uses_archive and self._rehydrate(user_id, level, actor):
+            items = self.client.lrange(list_key, -self.max_messages, -1)
+        return self._decode_list(items, user_id, level, actor)
+
+    @instrumented("redis", "save")
+    async def asave_chat_history(self, user_id: str, level: str, actor: str, chat_history: list) -> None:
+        """Async variant of save_chat_history used by the request path."""
+        if self.storage_mode == STORAGE_STRING:
+            key = self._get_key(user_id, level, actor)
+            pipe = self.async_client.pipeline(transaction=False)
+            pipe.set(key, self._encode_history(chat_history))
+            pipe.sadd(DIRTY_SET_KEY, key)
+            await pipe.execute()
+            return
+
+        list_key = self._get_list_key(user_id, level, actor)
+        pipe = self.async_client.pipeline(transaction=True)
+        self._queue_replace(pipe, list_key, chat_history)
+        pipe.delete(self._get_key(user_id, level, actor))
+        pipe.sadd(DIRTY_SET_KEY, list_key)
+        await pipe.execute()
+
+    @instrumented("redis", "save")
+    async def aappend_chat_messages(self, user_id: str, level: str, actor: str, new_messages: list, chat_history: list = None) -> None:
+        """Async variant of append_chat_messages used by the request path."""
+        if self.storage_mode == STORAGE_STRING:
+            await self.asave_chat_history(user_id, level, actor, list(chat_history or []) + list(new_messages))
+            return
+
+        pipe = self.async_client.pipeline(transaction=False)
+        self._queue_append(pipe, self._get_list_key(user_id, level, actor), new_messages)
+        await pipe.execute()
+
+    @instrumented("redis", "load")
+    async def aload_chat_history(self, user_id: str, level: str, actor: str):
+        """Async variant of load_chat_history used by the request path."""
+        if self.storage_mode == STORAGE_STRING:
+            key = self._get_key(user_id, level, actor)
+            data = await self.async_client.get(key)
+            if data is None and self.uses_archive and await self._arehydrate(user_id, level, actor):
+                data = await self.async_client.get(key)
+            return self._decode_history(data, user_id, level, actor)
+
         key = self._get_key(user_id, level, actor)
+        list_key = self._get_list_key(user_id, level, actor)
+        pipe = self.async_client.pipeline(transaction=False)
+        pipe.lrange(list_key, -self.max_messages, -1)
+        pipe.exists(key)
+        items, has_legacy = await pipe.execute()
+
+        if has_legacy:
+            migrated = await self._amigrate(keys=[key, list_key, self._get_seq_key(user_id, level, actor), DIRTY_SET_KEY], args=[self.history_cap])
+            logger.info(f"Migrated {migrated} messages from {key} to {list_key}")
+            items = await self.async_client.lrange(list_key, -self.max_messages, -1)
+        elif not items and self.uses_archive and await self._arehydrate(user_id, level, actor):
+            items = await self.async_client.lrange(list_key, -self.max_messages, -1)
+        return self._decode_list(items, user_id, level, actor)
+
+    @instrumented("redis", "load")
+    async def aload_conversation(self, user_id: str, level: str, actor: str, max_recent: int):
+        """
+        Load (records, summary text or None) for a summarized conversation: the messages
+        not yet folded into the summary, at most the newest max_recent of them.
+        List storage only; legacy blobs are migrated first.
+        """
+        key = self._get_key(user_id, level, actor)
+        list_key = self._get_list_key(user_id, level, actor)
+        context_keys = [list_key, self._get_seq_key(user_id, level, actor), self._get_summary_key(user_id, level, actor)]
+        pipe = self.async_client.pipeline(transaction=False)
+        await self._aload_context(keys=context_keys, args=[max_recent], client=pipe)
+        pipe.exists(key)
+        (summary, items), has_legacy = await pipe.execute()
+
+        if has_legacy:
+            migrated = await self._amigrate(keys=[key, list_key, context_keys[1], DIRTY_SET_KEY], args=[self.history_cap])
+            logger.info(f"Migrated {migrated} messages from {key} to {list_key}")
+            summary, items = await self._aload_context(keys=context_keys, args=[max_recent])
+        elif not items and self.uses_archive and await self._arehydrate(user_id, level, actor):
+            summary, items = await self._aload_context(keys=context_keys, args=[max_recent])
+        summary = summary.decode("utf-8") if summary else None
+        return self._decode_list(items, user_id, level, actor), summary
+
+    @instrumented("redis", "load_many")
+    async def aload_conversations(self, conversations: list, max_recent: int = None) -> list:
+        """
+        Batched load for a list of (user_id, level, actor): one pipeline round trip for all of them.
+        Returns a (records, summary text or None) pair per conversation, in input order.
+        With max_recent (list storage only) each entry is loaded like aload_conversation,
+        otherwise like aload_chat_history (last max_messages, no summary).
+        Legacy blobs and conversations missing from Redis (evicted by the idle TTL) are
+        then loaded through the single-conversation paths, which migrate or restore them.
+        """
+        pipe = self.async_client.pipeline(transaction=False)
+        for user_id, level, actor in conversations:
+            if self.storage_mode == STORAGE_STRING:
+                pipe.get(self._get_key(user_id, level, actor))
+                continue
+            list_key = self._get_list_key(user_id, level, actor)
+            if max_recent is None:
+                pipe.lrange(list_key, -self.max_messages, -1)
+            else:
+                await self._aload_context(keys=[list_key, self._get_seq_key(user_id, level, actor),
+                                                self._get_summary_key(user_id, level, actor)],
+                                          args=[max_recent], client=pipe)
+            pipe.exists(self._get_key(user_id, level, actor))
+        results = await pipe.execute()
+
+        if self.storage_mode == STORAGE_STRING:
+            loaded = [(self._decode_history(data, *conversation) or [], None)
+                      for conversation, data in zip(conversations, results)]
+            misses = [i for i, data in enumerate(results) if data is None] if self.uses_archive else []
+        else:
+            loaded, misses = [], []
+            for i, conversation in enumerate(conversations):
+                result, has_legacy = results[2 * i], results[2 * i + 1]
+                if max_recent is None:
+                    summary, items = None, result
+                else:
+                    summary, items = result
+                    summary = summary.decode("utf-8") if summary else None
+                if has_legacy or (not items and self.uses_archive):
+                    misses.append(i)
+                loaded.append((self._decode_list(items, *conversation) or [], summary))
+
+        # Legacy blobs to migrate and conversations to restore from the archive go
+        # through the single-conversation paths, concurrently
+        async def reload(conversation):
+            if max_recent is None or self.storage_mode == STORAGE_STRING:
+                return await self.aload_chat_history(*conversation) or [], None
+            records, summary = await self.aload_conversation(*conversation, max_recent)
+            return records or [], summary
+
+        reloaded = await asyncio.gather(*(reload(conversations[i]) for i in misses))
+        for i, entry in zip(misses, reloaded):
+            loaded[i] = entry
+        return loaded
+
+    @instrumented("redis", "save_many")
+    async def aappend_turns(self, turns: list) -> None:
+        """
+        Batched aappend_chat_messages for a list of (user_id, level, actor, new_messages, chat_history),
+        in one pipeline round trip. Turns of the same conversation are applied in list order.
+        """
+        if not turns:
+            return
+        pipe = self.async_client.pipeline(transaction=False)
+        for user_id, level, actor, new_messages, chat_history in turns:
+            if self.storage_mode == STORAGE_STRING:
+                key = self._get_key(user_id, level, actor)
+                pipe.set(key, self._encode_history(list(chat_history or []) + list(new_messages)))
+                pipe.sadd(DIRTY_SET_KEY, key)
+            else:
+                self._queue_append(pipe, self._get_list_key(user_id, level, actor), new_messages)
+        await pipe.execute()
+
+    async def acompaction_source(self, user_id: str, level: str, actor: str, keep_recent: int):
+        """
+        Return (summary text or None, covered, new covered, records) where records are the
+        messages to fold into the summary, leaving the newest keep_recent untouched.
+        """
+        summary, covered, new_covered, items = await self._acompaction_source(
+            keys=[self._get_list_key(user_id, level, actor), self._get_seq_key(user_id, level, actor),
+                  self._get_summary_key(user_id, level, actor)],
+            args=[keep_recent],
+        )
+        summary = summary.decode("utf-8") if summary else None
+        return summary, int(covered), int(new_covered), codec.decode_records(items) if items else []
+
+    async def astore_summary(self, user_id: str, level: str, actor: str, text: str, covered: int,
+                             new_covered: int, tokens: int) -> bool:
+        """Store a new summary unless another worker advanced it since `covered` was read."""
+        stored = await self._astore_summary(
+            keys=[self._get_summary_key(user_id, level, actor)], args=[covered, new_covered, text, tokens]
+        )
+        return stored == 1
+
+    def read_full_history(self, key: str):
+        """
+        Return every stored message for a raw chat key as a list of dicts.
+        Works for both legacy string keys and list keys; used by the backup service.
+        """
+        if key.startswith(f"{LIST_KEY_PREFIX}:"):
+            items = self.client.lrange(key, 0, -1)
+            return [record.to_dict() for record in codec.decode_records(items)] if items else None
         data = self.client.get(key)
-        if data is None:
-            return None
-        try:
-            serialized_history = json.loads(data)
-            # Get only the last max_messages
-            serialized_history = serialized_history[-self.max_messages:] if len(serialized_history) > self.max_messages else serialized_history
-            return [self.deserialize_message(item) for item in serialized_history]
-        except Exception as e:
-            logger.info(f"No previous history found for user {user_id} at level {level} with actor {actor}")
-            return None
\ No newline at end of file
+        return [record.to_dict() for record in codec.decode_blob(data)] if data else None
+
+    @instrumented("redis", "read_full")
+    def read_full_histories(self, keys: list) -> dict:
+        """
+        Batched read_full_history: one pipeline round trip with a single MGET for all
+        legacy string keys and an LRANGE per list key. Returns {key: list of dicts}
+        (the role/content/flag form stored in Postgres) for the keys that still hold data.
+        """
+        string_keys = [key for key in keys if not key.startswith(f"{LIST_KEY_PREFIX}:")]
+        list_keys = [key for key in keys if key.startswith(f"{LIST_KEY_PREFIX}:")]
+
+        pipe = self.client.pipeline(transaction=False)
+        if string_keys:
+            pipe.mget(string_keys)
+        for key in list_keys:
+            pipe.lrange(key, 0, -1)
+        results = pipe.execute()
+
+        histories = {}
+        if string_keys:
+            for key, data in zip(string_keys, results[0]):
+                if data:
+                    histories[key] = [record.to_dict() for record in codec.decode_blob(data)]
+            results = results[1:]
+        for key, items in zip(list_keys, results):
+            if items:
+                histories[key] = [record.to_dict() for record in codec.decode_records(items)]
+        return histories
+
+    @instrumented("redis", "read_new")
+    def read_new_messages(self, after: dict) -> dict:
+        """
+        Read what the message archive has not stored yet: after maps chat keys to the seq
+        of their newest archived message. One pipeline round trip (a Lua call per list key,
+        one MGET for legacy string keys, whose messages are numbered by position).
+        Returns {key: (seq, first seq - 1, list of dicts)} for the keys that still hold data.
+        """
+        string_keys = [key for key in after if not key.startswith(f"{LIST_KEY_PREFIX}:")]
+        list_keys = [key for key in after if key.startswith(f"{LIST_KEY_PREFIX}:")]
+
+        pipe = self.client.pipeline(transaction=False)
+        if string_keys:
+            pipe.mget(string_keys)
+        for key in list_keys:
+            self._read_new(keys=[key, self._companion_key(key, SEQ_KEY_PREFIX)], args=[after[key]], client=pipe)
+        results = pipe.execute()
+
+        messages = {}
+        if string_keys:
+            for key, data in zip(string_keys, results[0]):
+                if data:
+                    records = codec.decode_blob(data)
+                    start = min(after[key], len(records))
+                    messages[key] = (len(records), start, [record.to_dict() for record in records[start:]])
+            results = results[1:]
+        for key, (seq, start, items) in zip(list_keys, results):
+            if seq:
+                messages[key] = (seq, start, [record.to_dict() for record in codec.decode_records(items)] if items else [])
+        return messages
+
+    def pop_dirty_keys(self, count: int) -> list:
+        """Atomically remove and return up to count keys from the dirty set."""
+        keys = self.client.spop(DIRTY_SET_KEY, count)
+        return [key.decode("utf-8") for key in keys] if keys else []
+
+    def mark_dirty(self, keys: list) -> None:
+        """Put keys back in the dirty set, e.g. after a failed backup."""
+        if keys:
+            self.client.sadd(DIRTY_SET_KEY, *keys)
+
+    def dirty_count(self) -> int:
+        return self.client.scard(DIRTY_SET_KEY)
+
+    def migrate_legacy_keys(self, batch_size: int = 500) -> int:
+        """Convert every legacy chat:* string key to list storage. Returns the number of keys migrated."""
+        migrated = 0
+        for key in self.client.scan_iter(match=f"{LEGACY_KEY_PREFIX}:*", count=batch_size, _type="string"):
+            key = key.decode("utf-8")
+            parsed = self.parse_key(key)
+            if parsed is None:
+                continue
+            self._migrate(keys=[key, self._get_list_key(*parsed), self._get_seq_key(*parsed), DIRTY_SET_KEY], args=[self.history_cap])
+            migrated += 1
+        logger.info(f"Migrated {migrated} legacy chat keys to list storage")
+        return migrated
+
+    async def aclose(self) -> None:
+        """Close the async connection pool."""
+        await self.async_client.aclose()
+        await self.async_pool.disconnect()
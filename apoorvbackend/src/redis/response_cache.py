@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from dotenv import load_dotenv
+
+from apoorvbackend.src.logger import logger
+from apoorvbackend.src.models.chat_models import ChatRecord
+from apoorvbackend.src.metrics.metrics import CACHE_EVENTS
+
+load_dotenv()
+
+CACHE_KEY_PREFIX = "respcache"
+
+# Stores an entry and evicts the least recently used ones beyond the per-actor cap.
+# KEYS[1] = entry key, KEYS[2] = LRU index (zset of entry keys scored by last use)
+# ARGV[1] = value, ARGV[2] = ttl seconds, ARGV[3] = now, ARGV[4] = max entries
+STORE_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[3], KEYS[1])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+local excess = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[4])
+if excess > 0 then
+    local evicted = redis.call('ZRANGE', KEYS[2], 0, excess - 1)
+    redis.call('DEL', unpack(evicted))
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, excess - 1)
+end
+return excess
+"""
+
+
+class ResponseCache:
+    """
+    Optional cache of actor replies shared by all players.
+
+    Entries are keyed by (level, actor, every normalized history message sent to the
+    model, rolling summary if any, normalized user input). Because the previous AI
+    flags and the summary of older messages are part of that context, a cached reply
+    (and its flag) is only reused for the same conversation state.
+
+    - Exact tier: Redis with a TTL, capped per actor with least-recently-used eviction.
+    - Semantic tier (optional): in-process embeddings of past inputs for the same
+      context; a reply is reused when cosine similarity reaches the threshold.
+    """
+
+    def __init__(self, redis_client, enabled: bool = None, ttl: int = None, max_entries: int = None,
+                 embeddings=None, similarity_threshold: float = None,
+                 max_semantic_entries: int = 256, max_semantic_contexts: int = 1024):
+        self.redis = redis_client
+        self.enabled = enabled if enabled is not None else os.getenv("RESPONSE_CACHE_ENABLED", "0") == "1"
+        self.ttl = int(ttl or os.getenv("RESPONSE_CACHE_TTL", 3600))
+        self.max_entries = int(max_entries or os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 5000))
+        self.embeddings = embeddings
+        self.similarity_threshold = float(similarity_threshold or os.getenv("RESPONSE_CACHE_SIMILARITY", 0.95))
+        self.max_semantic_entries = max_semantic_entries
+        self.max_semantic_contexts = max_semantic_contexts
+        # (level, actor, context hash) -> deque of (vector, stored reply), least recently used first
+        self._semantic = OrderedDict()
+        self._store = self.redis.register_script(STORE_SCRIPT)
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, redis_client) -> "ResponseCache":
+        """Build the cache, enabling the semantic tier when RESPONSE_CACHE_EMBEDDINGS_MODEL is set."""
+        embeddings = None
+        model = os.getenv("RESPONSE_CACHE_EMBEDDINGS_MODEL")
+        if model:
+            from langchain_google_genai import GoogleGenerativeAIEmbeddings
+            embeddings = GoogleGenerativeAIEmbeddings(model=model, google_api_key=os.getenv("GOOGLE_API_KEY_1"))
+        return cls(redis_client, embeddings=embeddings)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercase, collapse whitespace and drop trailing punctuation."""
+        return re.sub(r"\s+", " ", (text or "").lower()).strip().rstrip(".!?")
+
+    def _context_hash(self, chat_history: list, summary: str = None) -> str:
+        context = []
+        for message in chat_history:
+            record = ChatRecord.from_message(message)
+            if record.role == ChatRecord.HUMAN:
+                context.append(["h", self.normalize(record.content)])
+            else:
+                context.append(["a", self.normalize(record.content), record.flag])
+        if summary:
+            # Conversations without a summary keep the keys they had before summaries existed
+            context.append(["s", hashlib.sha1(summary.encode("utf-8")).hexdigest()])
+        return hashlib.sha1(json.dumps(context).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _entry_key(level: str, actor: str, context_hash: str, user_input: str) -> str:
+        digest = hashlib.sha1(f"{context_hash}:{user_input}".encode("utf-8")).hexdigest()
+        return f"{CACHE_KEY_PREFIX}:{level}:{actor}:{digest}"
+
+    @staticmethod
+    def _index_key(level: str, actor: str) -> str:
+        return f"{CACHE_KEY_PREFIX}:{level}:{actor}:lru"
+
+    @staticmethod
+    def _cosine(a: list, b: list) -> float:
+        dot = sum(x * y for x, y in zip(a, b))
+        norm = (sum(x * x for x in a) ** 0.5) * (sum(y * y for y in b) ** 0.5)
+        return dot / norm if norm else 0.0
+
+    @staticmethod
+    def _to_record(data: dict) -> ChatRecord:
+        return ChatRecord.ai(data["content"], data["flag"])
+
+    async def aget(self, level: str, actor: str, chat_history: list, user_input: str, summary: str = None):
+        """Return the cached reply (a ChatRecord) for this turn, or None. summary is the rolling summary, if any."""
+        if not self.enabled:
+            return None
+
+        context_hash = self._context_hash(chat_history, summary)
+        normalized = self.normalize(user_input)
+        key = self._entry_key(level, actor, context_hash, normalized)
+
+        # GET the entry and refresh its LRU position in one round trip (XX: only if present)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.zadd(self._index_key(level, actor), {key: time.time()}, xx=True)
+        data, _ = await pipe.execute()
+        if data is not None:
+            self.exact_hits += 1
+            CACHE_EVENTS.labels("response", "hit").inc()
+            return self._to_record(json.loads(data))
+
+        if self.embeddings is not None:
+            entries = self._semantic.get((level, actor, context_hash))
+            if entries:
+                try:
+                    vector = await self.embeddings.aembed_query(normalized)
+                    best = max(entries, key=lambda entry: self._cosine(vector, entry[0]))
+                    if self._cosine(vector, best[0]) >= self.similarity_threshold:
+                        self.semantic_hits += 1
+                        CACHE_EVENTS.labels("response", "semantic_hit").inc()
+                        return self._to_record(best[1])
+                except Exception as e:
+                    logger.warning(f"Semantic cache lookup failed: {e}")
+
+        self.misses += 1
+        CACHE_EVENTS.labels("response", "miss").inc()
+        return None
+
+    async def aset(self, level: str, actor: str, chat_history: list, user_input: str, response,
+                   summary: str = None) -> None:
+        """Store the reply (ChatRecord or AIMessage) generated for this turn."""
+        response = ChatRecord.from_message(response)
+        if not self.enabled:
+            return
+
+        context_hash = self._context_hash(chat_history, summary)
+        normalized = self.normalize(user_input)
+        stored = {"content": response.content, "flag": response.flag}
+
+        await self._store(
+            keys=[self._entry_key(level, actor, context_hash, normalized), self._index_key(level, actor)],
+            args=[json.dumps(stored), self.ttl, time.time(), self.max_entries],
+        )
+
+        if self.embeddings is not None:
+            try:
+                vector = await self.embeddings.aembed_query(normalized)
+                context = (level, actor, context_hash)
+                entries = self._semantic.get(context)
+                if entries is None:
+                    entries = self._semantic[context] = deque(maxlen=self.max_semantic_entries)
+                    if len(self._semantic) > self.max_semantic_contexts:
+                        self._semantic.popitem(last=False)
+                self._semantic.move_to_end(context)
+                entries.append((vector, stored))
+            except Exception as e:
+                logger.warning(f"Semantic cache store failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            "llm_calls_saved": self.exact_hits + self.semantic_hits,
+        }
@@ -2,18 +2,28 @@ from apoorvbackend.src.logger import logger
 import os
 
 
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'storage', 'prompts')
+
+
+def get_prompt_path(level: str, agent_name: str) -> str:
+    '''
+    Return the absolute path of the prompt file for the given level and agent.
+    '''
+    return os.path.join(PROMPTS_DIR, level, agent_name + '.txt')
+
+
 def load_prompt(level: str, agent_name: str) -> str:
     '''
     Load the prompt from the given path.
     '''
     try:
-        with open(os.path.join('apoorvbackend/storage/prompts', level, agent_name +'.txt'), 'r') as file:
+        with open(get_prompt_path(level, agent_name), 'r') as file:
             return file.read()
-        
+
     except FileNotFoundError:
         logger.error(f"Prompt not found for agent {agent_name}")
         return None
-    
+
     except Exception as e:
         logger.error(f"Error loading prompt for agent {agent_name}: {e}")
         return None
\ No newline at end of file
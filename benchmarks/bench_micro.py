@@ -0,0 +1,236 @@
+"""
+Micro-benchmarks for hot helpers, so regressions show up as numbers:
+
+- RedisChatHandler message encoding/decoding (list elements and the legacy JSON blob)
+- LoadBalancer key selection per strategy, with and without keys in cooldown
+- PostgresBackupService batch upsert (writes rows for bench-* users to
+  chat_history, or chat_messages with --archive-format, checks them and deletes
+  them afterwards)
+- RedisRestoreService bulk restore of those rows into an empty Redis, checked
+  against the source conversations
+
+The Postgres benchmarks use DATABASE_URL if it is set, otherwise a throwaway
+server started with pgserver (pip install pgserver); without either they are skipped.
+
+    python -m benchmarks.bench_micro
+    python -m benchmarks.bench_micro --only serialization --messages 1000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import timeit
+from contextlib import contextmanager
+
+from apoorvbackend.src.logger import logger
+from apoorvbackend.src.models.chat_models import ChatRecord
+
+
+def report(name: str, seconds: float, ops: int) -> None:
+    print(f"{name:<46}{seconds / ops * 1e6:>12.2f} us/op{ops / seconds:>14.0f} ops/s")
+
+
+def measure(name: str, func, number: int, repeat: int = 5) -> None:
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    report(name, best, number)
+
+
+def sample_history(count: int) -> list:
+    history = []
+    for i in range(count):
+        if i % 2 == 0:
+            history.append(ChatRecord.human(f"Player message number {i}: can you tell me about the castle?"))
+        else:
+            history.append(ChatRecord.ai(f"Actor reply number {i}. The castle was built long ago. " * 2, i % 10 == 1))
+    return history
+
+
+def bench_serialization(messages: int) -> None:
+    import fakeredis
+    from apoorvbackend.src.redis.redis_handlers import RedisChatHandler
+
+    server = fakeredis.FakeServer()
+    handler = RedisChatHandler(client=fakeredis.FakeRedis(server=server),
+                               async_client=fakeredis.FakeAsyncRedis(server=server))
+    history = sample_history(messages)
+    turn = history[-2:]
+    window = handler._encode_messages(history[-handler.max_messages:])
+    legacy_window = [json.dumps(record.to_dict()).encode("utf-8") for record in history[-handler.max_messages:]]
+    blob = handler._encode_history(history)
+
+    measure("encode one turn (2 list elements)", lambda: handler._encode_messages(turn), 20000)
+    measure(f"encode {messages} messages (list elements)", lambda: handler._encode_messages(history), 200)
+    measure(f"encode {messages} messages (JSON blob)", lambda: handler._encode_history(history), 200)
+    measure(f"decode window of {len(window)} (list elements)",
+            lambda: handler._decode_list(window, "u", "L1", "pebbles"), 20000)
+    measure(f"decode window of {len(window)} (legacy v1 elements)",
+            lambda: handler._decode_list(legacy_window, "u", "L1", "pebbles"), 20000)
+    measure(f"window of {len(window)} to LangChain messages (chain boundary)",
+            lambda: [record.to_message() for record in history[-handler.max_messages:]], 20000)
+    measure(f"decode {messages} messages (JSON blob, keep window)",
+            lambda: handler._decode_history(blob, "u", "L1", "pebbles"), 200)
+
+
+def bench_load_balancer(keys: int) -> None:
+    from apoorvbackend.src.llm_handler.load_balancer import LoadBalancer
+
+    for i in range(1, keys + 1):
+        os.environ.setdefault(f"GOOGLE_API_KEY_{i}", f"bench-key-{i}")
+
+    for method in ("round_robin", "failure_aware", "std_dev"):
+        balancer = LoadBalancer(n=keys, ct=3600)
+        measure(f"get_key({method}) {keys} keys", lambda: balancer.get_key(method), 20000)
+
+        # Half the pool in cooldown, as after a burst of quota errors
+        for key in balancer.keys[: keys // 2]:
+            balancer.report_fail(key)
+        measure(f"get_key({method}) {keys} keys, half cooling", lambda: balancer.get_key(method), 20000)
+
+
+@contextmanager
+def scratch_database():
+    """Yield a Postgres DSN: DATABASE_URL, else a disposable pgserver instance, else None."""
+    if os.getenv("DATABASE_URL"):
+        yield os.getenv("DATABASE_URL")
+        return
+    try:
+        import pgserver
+    except ImportError:
+        yield None
+        return
+    with tempfile.TemporaryDirectory(prefix="bench-pg-") as data_dir:
+        server = pgserver.get_server(data_dir, cleanup_mode="stop")
+        try:
+            yield server.get_uri()
+        finally:
+            server.cleanup()
+
+
+def count_bench_rows(pool, table: str) -> int:
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {table} WHERE user_id LIKE 'bench-%'")
+            return cursor.fetchone()[0]
+
+
+def delete_bench_rows(pool) -> None:
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            for table in ("chat_history", "chat_messages", "chat_conversations"):
+                cursor.execute("SELECT to_regclass(%s)", (table,))
+                if cursor.fetchone()[0] is not None:
+                    cursor.execute(f"DELETE FROM {table} WHERE user_id LIKE 'bench-%'")
+
+
+def bench_backup(dsn: str, conversations: int, messages: int, batch_size: int, archive_format: str) -> None:
+    if not dsn:
+        print("backup upsert: skipped (set DATABASE_URL to a scratch database or install pgserver)")
+        return
+
+    import fakeredis
+    from apoorvbackend.src.database.connection import PostgresPool
+    from apoorvbackend.src.database.postgres_backup import PostgresBackupService
+    from apoorvbackend.src.redis.redis_handlers import RedisChatHandler
+
+    server = fakeredis.FakeServer()
+    handler = RedisChatHandler(client=fakeredis.FakeRedis(server=server),
+                               async_client=fakeredis.FakeAsyncRedis(server=server))
+    history = sample_history(messages)
+    for i in range(conversations):
+        handler.append_chat_messages(f"bench-{i}", "L1", "pebbles", history)
+
+    pool = PostgresPool(dsn=dsn, minconn=1, maxconn=2)
+    service = PostgresBackupService(batch_size=batch_size, pool=pool, redis_handler=handler,
+                                    leader_election=False, archive_format=archive_format)
+    service._init_db()
+    keys = list(service._scan_chat_keys())
+    try:
+        for label in ("insert", "update"):
+            started = time.perf_counter()
+            for start in range(0, len(keys), batch_size):
+                service._backup_keys(keys[start:start + batch_size])
+            report(f"backup {archive_format} ({label}, {messages} msgs/conversation)",
+                   time.perf_counter() - started, len(keys))
+            # The update pass must not add rows
+            if archive_format in ("blob", "both"):
+                assert count_bench_rows(pool, "chat_history") == conversations
+            if archive_format in ("messages", "both"):
+                assert count_bench_rows(pool, "chat_messages") == conversations * len(history)
+    finally:
+        delete_bench_rows(pool)
+        pool.close()
+
+
+def bench_restore(dsn: str, conversations: int, messages: int, batch_size: int, workers: int) -> None:
+    if not dsn:
+        print("bulk restore: skipped (set DATABASE_URL to a scratch database or install pgserver)")
+        return
+
+    import fakeredis
+    from apoorvbackend.src.database.chat_archive import ChatArchive
+    from apoorvbackend.src.database.connection import PostgresPool
+    from apoorvbackend.src.database.postgres_backup import PostgresBackupService
+    from apoorvbackend.src.database.restore import RedisRestoreService
+    from apoorvbackend.src.redis.redis_handlers import RedisChatHandler
+
+    def fresh_handler():
+        server = fakeredis.FakeServer()
+        return RedisChatHandler(client=fakeredis.FakeRedis(server=server),
+                                async_client=fakeredis.FakeAsyncRedis(server=server))
+
+    # Archive the conversations through the backup, then restore them into an empty Redis
+    source = fresh_handler()
+    history = sample_history(messages)
+    for i in range(conversations):
+        source.append_chat_messages(f"bench-{i}", "L1", "pebbles", history)
+
+    pool = PostgresPool(dsn=dsn, minconn=1, maxconn=2)
+    backup = PostgresBackupService(batch_size=batch_size, pool=pool, redis_handler=source, leader_election=False)
+    backup._init_db()
+    keys = list(backup._scan_chat_keys())
+    try:
+        for start in range(0, len(keys), batch_size):
+            backup._backup_keys(keys[start:start + batch_size])
+
+        target = fresh_handler()
+        service = RedisRestoreService(target, ChatArchive(pool), batch_size=batch_size, workers=workers)
+        started = time.perf_counter()
+        stats = service.run(user_prefix="bench-")
+        report(f"bulk restore ({messages} msgs/conversation)", time.perf_counter() - started, max(stats["rows"], 1))
+        assert stats["restored"] == conversations
+        for i in (0, conversations // 2, conversations - 1):
+            assert target.load_chat_history(f"bench-{i}", "L1", "pebbles") == history[-target.max_messages:]
+    finally:
+        delete_bench_rows(pool)
+        pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", choices=("serialization", "load_balancer", "backup", "restore"), default=None)
+    parser.add_argument("--messages", type=int, default=200, help="messages per conversation")
+    parser.add_argument("--keys", type=int, default=8, help="API keys in the load balancer pool")
+    parser.add_argument("--conversations", type=int, default=2000, help="conversations upserted by the backup")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4, help="restore writer threads")
+    parser.add_argument("--archive-format", choices=("blob", "messages", "both"), default="blob",
+                        help="CHAT_ARCHIVE_FORMAT used by the backup benchmark")
+    args = parser.parse_args()
+
+    logger.remove()
+
+    if args.only in (None, "serialization"):
+        bench_serialization(args.messages)
+    if args.only in (None, "load_balancer"):
+        bench_load_balancer(args.keys)
+    if args.only in (None, "backup", "restore"):
+        with scratch_database() as dsn:
+            if args.only in (None, "backup"):
+                bench_backup(dsn, args.conversations, args.messages, args.batch_size, args.archive_format)
+            if args.only in (None, "restore"):
+                bench_restore(dsn, args.conversations, args.messages, args.batch_size, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Requests/sec of a POST endpoint with no body logging, the previous buffering
+middleware, and RequestBodyLogger.
+
+    python -m benchmarks.bench_request_logger --requests 2000 --body-kb 64
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+
+from apoorvbackend.src.logger import logger
+from apoorvbackend.src.middleware.request_logger import RequestBodyLogger
+
+
+def build_app(mode: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/chat/")
+    async def echo(request: Request):
+        body = await request.body()
+        return {"size": len(body)}
+
+    if mode == "buffering":
+        # The middleware main_api used before RequestBodyLogger
+        @app.middleware("http")
+        async def log_request_body(request, call_next):
+            body = b""
+            async for chunk in request.stream():
+                body += chunk
+            request._body = body
+            logger.info(f"Request body: {body}")
+            return await call_next(request)
+
+    elif mode == "asgi":
+        app.add_middleware(RequestBodyLogger, sample_rate=1.0, max_bytes=2048, include_paths=["/chat/"])
+
+    return app
+
+
+async def run(mode: str, requests: int, concurrency: int, body: bytes) -> float:
+    transport = httpx.ASGITransport(app=build_app(mode))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                response = await client.post("/chat/", content=body)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--body-kb", type=int, default=64)
+    args = parser.parse_args()
+
+    # Same enqueued, discarded sink for every mode so only the middleware differs
+    logger.remove()
+    logger.add(lambda message: None, enqueue=True)
+
+    body = b"x" * (args.body_kb * 1024)
+    for mode in ("none", "buffering", "asgi"):
+        rps = asyncio.run(run(mode, args.requests, args.concurrency, body))
+        print(f"{mode:>10}: {rps:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Cold-start benchmark for main_api, meant to be tracked over releases.
+
+- import time: `python -X importtime -c "import main_api"` in a fresh interpreter;
+  reports the total and the packages that cost the most.
+- time to first 200: starts `uvicorn main_api:app` and polls GET / until it answers.
+
+Results are compared with the last entry of benchmarks/startup_history.jsonl, and
+--record appends this run (with the git revision) to it. Exits with status 1 when a
+budget is exceeded, so it can gate CI.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 5 --import-budget-ms 1500 --ready-budget-s 5 --record
+
+Uses the current environment (.env included); Redis and Postgres do not need to be
+reachable for the server to come up.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY = os.path.join(os.path.dirname(__file__), "startup_history.jsonl")
+
+# main_api builds its services at import time; give them harmless settings when unset
+BENCH_ENV = {
+    "LLAMA_MODEL_NAME": "bench",
+    "LLAMA_API_KEY": "bench",
+    "LLAMA_BASE_URL": "http://127.0.0.1:9/v1",
+    "GOOGLE_API_KEY_1": "bench",
+}
+
+
+def bench_env() -> dict:
+    env = dict(os.environ)
+    for name, value in BENCH_ENV.items():
+        env.setdefault(name, value)
+    return env
+
+
+def measure_import() -> tuple:
+    """Return (total ms, {top-level package: self ms}) for one cold import of main_api."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main_api"],
+        cwd=ROOT, env=bench_env(), capture_output=True, text=True, check=True,
+    )
+    total_us = 0
+    packages = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        packages[name.split(".")[0]] += int(self_us)
+        if name == "main_api":
+            total_us = int(cumulative_us)
+    return total_us / 1000, {name: us / 1000 for name, us in packages.items()}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_ready(timeout: float = 60.0) -> float:
+    """Seconds from spawning uvicorn until GET / returns 200."""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main_api:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=ROOT, env=bench_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=1.0) as client:
+            while time.perf_counter() - started < timeout:
+                if server.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+                try:
+                    if client.get(f"http://127.0.0.1:{port}/").status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.02)
+        raise RuntimeError(f"No 200 from / within {timeout}s")
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def last_entry():
+    if not os.path.exists(HISTORY):
+        return None
+    with open(HISTORY) as f:
+        lines = [line for line in f if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def delta(current: float, previous: dict, field: str, unit: str) -> str:
+    """Change against the recorded run, e.g. " (-120 ms vs 1a2b3c4)"."""
+    if previous.get(field) is None:
+        return ""
+    return f" ({current - previous[field]:+.{0 if unit == 'ms' else 2}f} {unit} vs {previous['revision']})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="measurements of each kind; the median is reported")
+    parser.add_argument("--top", type=int, default=10, help="packages listed by import cost")
+    parser.add_argument("--import-budget-ms", type=float, default=float(os.getenv("STARTUP_IMPORT_BUDGET_MS", 2000)))
+    parser.add_argument("--ready-budget-s", type=float, default=float(os.getenv("STARTUP_READY_BUDGET_S", 6)))
+    parser.add_argument("--skip-server", action="store_true", help="only measure the import")
+    parser.add_argument("--record", action="store_true", help=f"append this run to {os.path.relpath(HISTORY, ROOT)}")
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    import_ms = statistics.median(total for total, _ in imports)
+    packages = min(imports, key=lambda run: run[0])[1]
+    ready_s = None if args.skip_server else statistics.median(measure_ready() for _ in range(args.runs))
+
+    previous = last_entry() or {}
+    print(f"import main_api   {import_ms:>8.0f} ms{delta(import_ms, previous, 'import_ms', 'ms')}"
+          f"   budget {args.import_budget_ms:.0f} ms")
+    if ready_s is not None:
+        print(f"first 200         {ready_s:>8.2f} s {delta(ready_s, previous, 'ready_s', 's')}"
+              f"   budget {args.ready_budget_s:.2f} s")
+    print("\nslowest packages (self time, fastest run):")
+    for name, ms in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {name:<32}{ms:>8.1f} ms")
+
+    if args.record:
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "import_ms": round(import_ms, 1),
+            "ready_s": round(ready_s, 3) if ready_s is not None else None,
+        }
+        with open(HISTORY, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"\nrecorded in {os.path.relpath(HISTORY, ROOT)}")
+
+    over = import_ms > args.import_budget_ms or (ready_s is not None and ready_s > args.ready_budget_s)
+    if over:
+        print("\nstartup budget exceeded")
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
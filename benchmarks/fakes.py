@@ -0,0 +1,149 @@
+"""
+Stand-ins for the LLM providers and LootLocker used by the load tests.
+
+FakeChatModel plugs into Handler(llama_llm=..., gemini_llm=...) and supports the
+`with_structured_output` chains built by ChainRegistry (invoke, ainvoke and astream).
+lootlocker_transport() returns an httpx.MockTransport for LootLockerClient(transport=...).
+"""
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+
+import httpx
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import Runnable
+
+
+class LatencyModel:
+    """Log-normal latency around a median, plus an independent error probability."""
+
+    def __init__(self, median: float = 0.5, sigma: float = 0.4, error_rate: float = 0.0, seed: int = None):
+        self.median = median
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+    def latency(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return self.random.lognormvariate(math.log(self.median), self.sigma)
+
+    def fails(self) -> bool:
+        return self.error_rate > 0 and self.random.random() < self.error_rate
+
+
+class FakeStructuredOutput(Runnable):
+    """What FakeChatModel.with_structured_output returns: a model instance, or dicts when streaming."""
+
+    def __init__(self, model: "FakeChatModel", schema):
+        self.model = model
+        self.schema = schema
+
+    def _reply(self, input) -> dict:
+        messages = input.to_messages() if hasattr(input, "to_messages") else []
+        last = messages[-1].content if messages else str(input)
+        return {
+            "content": f"[{self.model.name}] You said: {last[:80]}",
+            "flag": self.model.latency.random.random() < self.model.flag_rate,
+        }
+
+    def _result(self, reply: dict):
+        return self.schema(**reply) if isinstance(self.schema, type) else reply
+
+    def invoke(self, input, config=None, **kwargs):
+        time.sleep(self.model.latency.latency())
+        self.model.maybe_fail()
+        return self._result(self._reply(input))
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        await asyncio.sleep(self.model.latency.latency())
+        self.model.maybe_fail()
+        return self._result(self._reply(input))
+
+    async def astream(self, input, config=None, **kwargs):
+        reply = self._reply(input)
+        total = self.model.latency.latency()
+        # Time to first token is a third of the call; the rest is spread over the chunks
+        await asyncio.sleep(total / 3)
+        self.model.maybe_fail()
+        words = reply["content"].split(" ")
+        chunks = max(1, len(words))
+        for i in range(1, chunks + 1):
+            await asyncio.sleep(total * 2 / 3 / chunks)
+            yield {"content": " ".join(words[:i])}
+        yield reply
+
+
+class FakeChatModel:
+    """
+    Chat model with configurable latency and failure distributions.
+    Failures raise an exception whose message looks like a Gemini quota error so the
+    handler's key rotation and provider fallback paths are exercised.
+    """
+
+    def __init__(self, name: str, latency: LatencyModel = None, flag_rate: float = 0.1,
+                 error_message: str = "429 Resource has been exhausted (fake)"):
+        self.name = name
+        self.latency = latency or LatencyModel()
+        self.flag_rate = flag_rate
+        self.error_message = error_message
+
+    def maybe_fail(self) -> None:
+        if self.latency.fails():
+            raise RuntimeError(self.error_message)
+
+    def with_structured_output(self, schema=None, **kwargs) -> FakeStructuredOutput:
+        return FakeStructuredOutput(self, schema)
+
+    def invoke(self, input, config=None, **kwargs) -> AIMessage:
+        time.sleep(self.latency.latency())
+        self.maybe_fail()
+        return AIMessage(content=f"[{self.name}] {str(input)[:80]}")
+
+    async def ainvoke(self, input, config=None, **kwargs) -> AIMessage:
+        await asyncio.sleep(self.latency.latency())
+        self.maybe_fail()
+        return AIMessage(content=f"[{self.name}] {str(input)[:80]}")
+
+
+def lootlocker_transport(latency: LatencyModel = None, members: int = 100) -> httpx.MockTransport:
+    """
+    Mock of the LootLocker endpoints used by LootLockerClient; failures answer 503.
+    Session tokens starting with "invalid" are refused with 401.
+    """
+    latency = latency or LatencyModel(median=0.08, sigma=0.3)
+    scores = {f"player_{i}": latency.random.randint(0, 10000) for i in range(members)}
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency.latency())
+        if latency.fails():
+            return httpx.Response(503, json={"error": "fake outage"})
+
+        path = request.url.path
+        if path == "/game/v2/session/guest":
+            return httpx.Response(200, json={"session_token": uuid.uuid4().hex, "player_id": 1})
+        if path == "/game/v1/player/info":
+            if request.headers.get("x-session-token", "").startswith("invalid"):
+                return httpx.Response(401, json={"error": "invalid session"})
+            return httpx.Response(200, json={"id": 1})
+        if path.endswith("/list"):
+            items = sorted(scores.items(), key=lambda item: -item[1])[:50]
+            return httpx.Response(200, json={"items": [
+                {"rank": rank, "member_id": member, "score": score}
+                for rank, (member, score) in enumerate(items, start=1)
+            ]})
+        if "/member/" in path:
+            member = path.rsplit("/", 1)[-1]
+            if member not in scores:
+                return httpx.Response(404, json={"error": "not found"})
+            return httpx.Response(200, json={"member_id": member, "score": scores[member]})
+        if path.endswith("/submit"):
+            payload = json.loads(request.content)
+            scores[payload["member_id"]] = payload["score"]
+            return httpx.Response(200, json={"member_id": payload["member_id"], "score": payload["score"]})
+        return httpx.Response(404, json={"error": f"unknown path {path}"})
+
+    return httpx.MockTransport(handle)
@@ -0,0 +1,295 @@
+"""
+In-process load test of main_api.app with fake LLMs, a mocked LootLocker and
+fakeredis (or a real Redis via --redis-url).
+
+Replays a JSONL traffic file where each line is one request:
+
+    {"at": 0.25, "method": "POST", "path": "/chat/", "json": {...}, "headers": {...}}
+
+`at` is the send time in seconds from the start of the replay (scaled by --speed).
+Reports throughput and p50/p95/p99 latency per endpoint; /chat/stream also gets
+a time-to-first-event row.
+
+The fake models echo the player's input, so the replay also checks correctness:
+every chat reply must echo the input of its own request, and every stored
+conversation must hold only (input, echo) turns sent for that conversation. Any
+cross-over makes the run exit with status 1.
+
+    python -m benchmarks.load_test --traffic benchmarks/traffic_sample.jsonl --loops 20 --speed 4
+    python -m benchmarks.load_test --llama-latency 1.5 --llama-errors 0.2 --gemini-latency 0.8
+
+fakeredis needs the `lupa` extra for the Lua scripts: pip install "fakeredis[lua]".
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+# main_api builds its clients at import time; give them harmless settings first
+os.environ.setdefault("LLAMA_MODEL_NAME", "bench")
+os.environ.setdefault("LLAMA_API_KEY", "bench")
+os.environ.setdefault("LLAMA_BASE_URL", "http://127.0.0.1:9/v1")
+os.environ.setdefault("GOOGLE_API_KEY_1", "bench")
+
+from apoorvbackend.src.logger import logger
+from benchmarks.fakes import FakeChatModel, LatencyModel, lootlocker_transport
+
+DEFAULT_TRAFFIC = os.path.join(os.path.dirname(__file__), "traffic_sample.jsonl")
+
+
+def load_traffic(path: str, loops: int) -> list:
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda record: record.get("at", 0))
+    span = (records[-1].get("at", 0) if records else 0) + 0.1
+
+    traffic = []
+    for loop in range(loops):
+        for record in records:
+            record = dict(record)
+            record["at"] = record.get("at", 0) + loop * span
+            # Distinct users per loop so conversations keep growing like real sessions would
+            body = record.get("json")
+            if isinstance(body, dict) and loop:
+                body = dict(body)
+                for field in ("user_id", "player_identifier"):
+                    if field in body:
+                        body[field] = f"{body[field]}-{loop % 10}"
+                record["json"] = body
+            traffic.append(record)
+    return traffic
+
+
+def build_redis(redis_url: str = None):
+    """Return (sync client, async client) sharing one database."""
+    if redis_url:
+        import redis
+        import redis.asyncio as aioredis
+        return redis.Redis.from_url(redis_url), aioredis.Redis.from_url(redis_url)
+
+    import fakeredis
+    server = fakeredis.FakeServer()
+    return fakeredis.FakeRedis(server=server), fakeredis.FakeAsyncRedis(server=server)
+
+
+def configure_app(args):
+    """Import main_api and swap its module-level services for the fake-backed ones."""
+    import main_api
+    from apoorvbackend.src.llm_handler.handler import Handler
+    from apoorvbackend.src.llm_handler.summarizer import ConversationSummarizer
+    from apoorvbackend.src.lootlocker.client import LootLockerClient
+    from apoorvbackend.src.lootlocker.leaderboard_cache import LeaderboardCache
+    from apoorvbackend.src.lootlocker.score_queue import ScoreSubmissionQueue
+    from apoorvbackend.src.redis.rate_limiter import RateLimiter
+    from apoorvbackend.src.redis.redis_handlers import RedisChatHandler
+    from apoorvbackend.src.redis.response_cache import ResponseCache
+
+    sync_client, async_client = build_redis(args.redis_url)
+    if args.redis_url:
+        sync_client.flushdb()
+
+    main_api.redis_handler = RedisChatHandler(client=sync_client, async_client=async_client)
+    main_api.rate_limiter = RateLimiter(async_client, enabled=args.rate_limit)
+    main_api.handler = Handler(
+        llama_llm=FakeChatModel("llama", LatencyModel(args.llama_latency, args.sigma, args.llama_errors, seed=1)),
+        gemini_llm=FakeChatModel("gemini", LatencyModel(args.gemini_latency, args.sigma, args.gemini_errors, seed=2)),
+        rate_limiter=main_api.rate_limiter,
+    )
+    main_api.response_cache = ResponseCache(async_client, enabled=args.response_cache)
+    main_api.summarizer = ConversationSummarizer(
+        main_api.redis_handler, main_api.handler.llama_llm, enabled=args.summaries, rate_limiter=main_api.rate_limiter
+    )
+    main_api.lootlocker_client = LootLockerClient(
+        game_key="bench",
+        transport=lootlocker_transport(LatencyModel(args.lootlocker_latency, args.sigma, args.lootlocker_errors, seed=3)),
+    )
+    main_api.leaderboard_cache = LeaderboardCache(async_client)
+    main_api.score_queue = ScoreSubmissionQueue(
+        async_client, main_api.lootlocker_client, "bench-submitter", leaderboard_cache=main_api.leaderboard_cache
+    )
+    return main_api
+
+
+CHAT_PATHS = ("/chat/", "/chat/stream")
+
+
+def echoed_input(message: str) -> str:
+    """The input a fake model reply echoes ("[llama] You said: ..."), normalized like the response cache."""
+    from apoorvbackend.src.redis.response_cache import ResponseCache
+    return ResponseCache.normalize(message.split("You said: ", 1)[-1])
+
+
+def reply_matches(user_input: str, message: str) -> bool:
+    from apoorvbackend.src.redis.response_cache import ResponseCache
+    return echoed_input(message) == ResponseCache.normalize(user_input[:80])
+
+
+def stream_message(body: bytes):
+    """The message of the `done` event of an SSE body, or None."""
+    for block in body.decode("utf-8").split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if lines.get("event") == "done":
+            return json.loads(lines["data"])["message"]
+    return None
+
+
+def check_histories(app_module, answered: dict) -> list:
+    """
+    Problems in the stored conversations: each must be (input, echo of that input) turns,
+    all with inputs that were sent (and answered) for that conversation.
+    """
+    problems = []
+    for (user_id, level, actor), inputs in answered.items():
+        key = app_module.redis_handler._get_list_key(user_id, level, actor)
+        history = app_module.redis_handler.read_full_history(key) or []
+        # Summary compaction may have dropped older messages; pair up from the first input left
+        history = history[next((i for i, m in enumerate(history) if m["role"] == "human"), len(history)):]
+        sent = Counter(inputs)
+        for human, ai in zip(history[::2], history[1::2]):
+            if human["role"] != "human" or ai["role"] != "ai" or not reply_matches(human["content"], ai["content"]):
+                problems.append(f"{key}: turn {human['content']!r} -> {ai['content']!r}")
+            elif sent[human["content"]] <= 0:
+                problems.append(f"{key}: holds {human['content']!r}, never sent for this conversation")
+            sent[human["content"]] -= 1
+        if len(history) % 2:
+            problems.append(f"{key}: odd number of messages ({len(history)})")
+    return problems
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def send(client: httpx.AsyncClient, record: dict, results: dict, checks: dict) -> None:
+    path = record["path"]
+    started = time.perf_counter()
+    message = None
+    try:
+        if path == "/chat/stream":
+            first = None
+            body = b""
+            async with client.stream(record.get("method", "POST"), path, json=record.get("json"),
+                                     headers=record.get("headers")) as response:
+                async for chunk in response.aiter_bytes():
+                    if first is None:
+                        first = time.perf_counter() - started
+                    body += chunk
+            status = response.status_code
+            if first is not None and status == 200:
+                results[f"{path} (first event)"].append((first, status))
+                message = stream_message(body)
+        else:
+            response = await client.request(record.get("method", "POST"), path, json=record.get("json"),
+                                            headers=record.get("headers"))
+            status = response.status_code
+            if path == "/chat/" and status == 200:
+                message = response.json()["message"]
+    except Exception as e:
+        logger.debug(f"{path} failed: {e}")
+        status = "error"
+    results[path].append((time.perf_counter() - started, status))
+
+    if message is not None:
+        body = record["json"]
+        checks["replies"] += 1
+        if not reply_matches(body["user_input"], message):
+            checks["problems"].append(f"{body['user_id']}: {body['user_input']!r} answered with {message!r}")
+        checks["answered"][(body["user_id"], body["level"], body["actor"])].append(body["user_input"])
+
+
+async def replay(app_module, traffic: list, speed: float, concurrency: int) -> tuple:
+    """Send the traffic; returns (results per path, wall time, correctness checks)."""
+    results = defaultdict(list)
+    checks = {"replies": 0, "problems": [], "answered": defaultdict(list)}
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app_module.app)
+
+    await app_module.lootlocker_client.start()
+    await app_module.score_queue.start()
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            started = time.perf_counter()
+
+            async def scheduled(record):
+                delay = record.get("at", 0) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                async with semaphore:
+                    await send(client, record, results, checks)
+
+            await asyncio.gather(*(scheduled(record) for record in traffic))
+            elapsed = time.perf_counter() - started
+    finally:
+        await app_module.score_queue.stop()
+        await app_module.lootlocker_client.aclose()
+    checks["problems"].extend(check_histories(app_module, checks["answered"]))
+    return results, elapsed, checks
+
+
+def report(results: dict, elapsed: float) -> None:
+    print(f"{'endpoint':<28}{'count':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for path in sorted(results):
+        samples = results[path]
+        latencies = sorted(latency * 1000 for latency, _ in samples)
+        errors = sum(1 for _, status in samples if status == "error" or status >= 400)
+        print(
+            f"{path:<28}{len(samples):>7}{errors:>8}{len(samples) / elapsed:>9.1f}"
+            f"{percentile(latencies, 50):>10.1f}{percentile(latencies, 95):>10.1f}{percentile(latencies, 99):>10.1f}"
+        )
+    statuses = defaultdict(int)
+    for samples in results.values():
+        for _, status in samples:
+            statuses[status] += 1
+    print(f"\nwall time {elapsed:.2f}s, status codes: {dict(sorted(statuses.items(), key=str))}")
+
+
+def report_checks(checks: dict) -> bool:
+    """Print the correctness result; True if every reply and stored conversation was right."""
+    print(f"correctness: {checks['replies']} replies and {len(checks['answered'])} conversations checked, "
+          f"{len(checks['problems'])} problems")
+    for problem in checks["problems"][:20]:
+        print(f"  {problem}")
+    return not checks["problems"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--traffic", default=DEFAULT_TRAFFIC, help="JSONL file of requests to replay")
+    parser.add_argument("--loops", type=int, default=10, help="times to replay the file back to back")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    parser.add_argument("--concurrency", type=int, default=200, help="max requests in flight")
+    parser.add_argument("--redis-url", default=None, help="use this Redis (database is flushed) instead of fakeredis")
+    parser.add_argument("--llama-latency", type=float, default=0.6, help="median seconds")
+    parser.add_argument("--llama-errors", type=float, default=0.02, help="failure probability")
+    parser.add_argument("--gemini-latency", type=float, default=0.9)
+    parser.add_argument("--gemini-errors", type=float, default=0.05)
+    parser.add_argument("--lootlocker-latency", type=float, default=0.08)
+    parser.add_argument("--lootlocker-errors", type=float, default=0.01)
+    parser.add_argument("--sigma", type=float, default=0.4, help="log-normal spread of every latency")
+    parser.add_argument("--rate-limit", action="store_true", help="enable the Redis rate limiter")
+    parser.add_argument("--response-cache", action="store_true", help="enable the response cache")
+    parser.add_argument("--summaries", action="store_true", help="enable rolling conversation summaries")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(lambda message: None, enqueue=True)
+
+    app_module = configure_app(args)
+    traffic = load_traffic(args.traffic, args.loops)
+    print(f"Replaying {len(traffic)} requests from {args.traffic} at {args.speed}x\n")
+    results, elapsed, checks = asyncio.run(replay(app_module, traffic, args.speed, args.concurrency))
+    report(results, elapsed)
+    if not report_checks(checks):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Locust load test against a running deployment, driven by the same JSONL traffic
+file as benchmarks.load_test. Each simulated user replays the requests of one
+user_id / player_identifier from the file in order, keeping the original gaps.
+
+    LOCUST_TRAFFIC=benchmarks/traffic_sample.jsonl locust -f benchmarks/locustfile.py --host http://localhost:8000
+
+Point it at a staging stack: it calls the real LLM providers and LootLocker.
+"""
+import itertools
+import json
+import os
+from collections import defaultdict
+
+from locust import HttpUser, task
+
+TRAFFIC = os.getenv("LOCUST_TRAFFIC", os.path.join(os.path.dirname(__file__), "traffic_sample.jsonl"))
+
+
+def load_sessions(path: str) -> list:
+    """Group the traffic file into per-identity request sequences."""
+    sessions = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            body = record.get("json") or {}
+            identity = body.get("user_id") or body.get("player_identifier") or "anonymous"
+            sessions[identity].append(record)
+    for records in sessions.values():
+        records.sort(key=lambda record: record.get("at", 0))
+    return list(sessions.values())
+
+
+SESSIONS = load_sessions(TRAFFIC)
+_session_ids = itertools.count()
+
+
+class TrafficUser(HttpUser):
+    def on_start(self):
+        self.session_id = next(_session_ids)
+        self.records = SESSIONS[self.session_id % len(SESSIONS)]
+        self.position = 0
+
+    def wait_time(self):
+        """Gap before the next record of this session; one second before starting the session over."""
+        index = self.position % len(self.records)
+        if index == 0:
+            return 1.0
+        return max(0.0, self.records[index].get("at", 0) - self.records[index - 1].get("at", 0))
+
+    def _identify(self, body):
+        """Suffix identities with the locust user id so parallel users do not share conversations."""
+        if not isinstance(body, dict):
+            return body
+        body = dict(body)
+        for field in ("user_id", "player_identifier"):
+            if field in body:
+                body[field] = f"{body[field]}-locust{self.session_id}"
+        return body
+
+    @task
+    def replay(self):
+        record = self.records[self.position % len(self.records)]
+        self.position += 1
+        path = record["path"]
+        kwargs = {"json": self._identify(record.get("json")), "headers": record.get("headers"), "name": path}
+        if path == "/chat/stream":
+            with self.client.request(record.get("method", "POST"), path, stream=True, catch_response=True, **kwargs) as response:
+                for _ in response.iter_content(chunk_size=None):
+                    pass
+                if response.status_code != 200:
+                    response.failure(f"status {response.status_code}")
+        else:
+            self.client.request(record.get("method", "POST"), path, **kwargs)
@@ -1,43 +1,100 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Query, Header, HTTPException
+from fastapi import FastAPI, Query, Header, HTTPException, Request
 import uvicorn
 from dotenv import load_dotenv  
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from contextlib import AsyncExitStack
+import anyio.to_thread
+import json
 import os
-import httpx
+import threading
 import math
 import time
 from datetime import datetime
 import pytz
 
 from apoorvbackend.src.logger import logger
+from apoorvbackend.src.middleware.request_logger import RequestBodyLogger
+from apoorvbackend.src.middleware.request_id import RequestIdMiddleware
+from apoorvbackend.src.metrics.metrics import QUEUE_DEPTH, render_latest
+from apoorvbackend.src.llm_handler.batch import BatchChatRunner, parse_requests
 from apoorvbackend.src.llm_handler.handler import Handler as LLMHandler
-from apoorvbackend.src.llm_handler.llm import LLM
-from apoorvbackend.src.models.chat_models import ChatRequest
+from apoorvbackend.src.llm_handler.summarizer import ConversationSummarizer
+from apoorvbackend.src.models.chat_models import ChatRecord, ChatRequest
 from apoorvbackend.src.models.lootlocker_models import GuestLoginRequest
+from apoorvbackend.src.lootlocker.client import LootLockerClient, LootLockerError
+from apoorvbackend.src.lootlocker.leaderboard_cache import LeaderboardCache
+from apoorvbackend.src.lootlocker.score_queue import PENDING_KEY as SCORE_PENDING_KEY, ScoreSubmissionQueue
 from apoorvbackend.src.prompt_loader.loader import PromptLoader
-from langchain_core.messages import AIMessage, HumanMessage
-from apoorvbackend.src.redis.redis_handlers import RedisChatHandler
-from apoorvbackend.src.database.postgres_backup import PostgresBackupService
+from apoorvbackend.src.redis.redis_handlers import DIRTY_SET_KEY, RedisChatHandler
+from apoorvbackend.src.redis.response_cache import ResponseCache
+from apoorvbackend.src.redis.rate_limiter import RateLimiter, RateLimitExceeded
+from apoorvbackend.src.database.chat_archive import ChatArchive
+from apoorvbackend.src.database.postgres_backup import BackupLeaseHeld, PostgresBackupService
+from apoorvbackend.src.database.restore import RedisRestoreService
+from apoorvbackend.src.database.connection import PostgresPool
 
 load_dotenv()
 
 postgres_backup_service = None
+lootlocker_client = LootLockerClient()
+
+# "embedded": every worker runs the scheduler, the Redis lease picks one to back up;
+# "standalone": backups run in apoorvbackend.src.database.backup_worker; "off": no scheduler
+BACKUP_MODE = os.getenv("BACKUP_MODE", "embedded")
+BACKUP_INTERVAL_MINUTES = float(os.getenv("BACKUP_INTERVAL_MINUTES", 5))
+# Refill a new or flushed Redis from the Postgres archive in the background at startup
+RESTORE_ON_STARTUP = os.getenv("RESTORE_ON_STARTUP", "0") == "1"
+# Largest number of chat turns accepted by one /chat/batch request
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 100))
+
+def startup_restore(poll_interval: float = 5.0) -> None:
+    """
+    Bulk-restore Redis from Postgres (RESTORE_ON_STARTUP). Until the restore is finished,
+    by this worker or another, conversations it has not reached are restored one by
+    one on load; without tiering that per-load lookup is dropped afterwards.
+    """
+    service = RedisRestoreService(redis_handler, redis_handler.archive)
+    service.run_if_needed()
+    while not service.finished():
+        time.sleep(poll_interval)
+        # Takes over from the checkpoint if the restoring worker failed or died
+        service.run_if_needed()
+    if redis_handler.idle_ttl <= 0:
+        redis_handler.archive_fallback = False
+        logger.info("Startup restore finished, chat loads no longer check the archive")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: initialize services
     global postgres_backup_service
-    postgres_backup_service = PostgresBackupService(interval_minutes=5)
-    postgres_backup_service.start()
-    logger.info("Backup scheduler started")
+    PromptLoader.preload()
+    await lootlocker_client.start()
+    await score_queue.start()
+    if BACKUP_MODE == "embedded":
+        postgres_backup_service = PostgresBackupService(interval_minutes=BACKUP_INTERVAL_MINUTES)
+        postgres_backup_service.start()
+        logger.info("Backup scheduler started")
+    else:
+        logger.info(f"Backup scheduler not started in this process (BACKUP_MODE={BACKUP_MODE})")
+    if RESTORE_ON_STARTUP:
+        # Conversations the bulk restore has not reached yet are restored one by one on first load
+        if redis_handler.archive is None:
+            redis_handler.archive = ChatArchive()
+        threading.Thread(target=startup_restore, daemon=True).start()
     
     yield
     
     # Shutdown: cleanup
-    if postgres_backup_service:
+    if postgres_backup_service and postgres_backup_service.running:
         postgres_backup_service.stop()
         logger.info("Backup scheduler stopped")
+    PostgresPool.shared().close()
+    await score_queue.stop()
+    await summarizer.aclose()
+    await lootlocker_client.aclose()
+    await redis_handler.aclose()
 
 # Create the FastAPI app with the lifespan
 app = FastAPI(lifespan=lifespan)
@@ -50,61 +107,167 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
-handler = LLMHandler()
+# Log sampled, size-capped request bodies without buffering them
+app.add_middleware(RequestBodyLogger)
+
+# Tag every request with an X-Request-ID and count in-flight requests (outermost)
+app.add_middleware(RequestIdMiddleware)
+
 redis_handler = RedisChatHandler()  
+rate_limiter = RateLimiter(redis_handler.async_client)
+handler = LLMHandler(rate_limiter=rate_limiter)
+response_cache = ResponseCache.from_env(redis_handler.async_client)
+summarizer = ConversationSummarizer(redis_handler, rate_limiter=rate_limiter)
+
+# LootLocker identity whose session is used to read and submit leaderboard scores
+SCORE_SUBMITTER_IDENTIFIER = os.getenv("LOOTLOCKER_SUBMITTER_IDENTIFIER", "username_1")
+leaderboard_cache = LeaderboardCache(redis_handler.async_client)
+score_queue = ScoreSubmissionQueue(
+    redis_handler.async_client, lootlocker_client, SCORE_SUBMITTER_IDENTIFIER, leaderboard_cache=leaderboard_cache
+)
 
-# @TODO: Add game key to .env
-GAME_KEY = os.getenv("GAME_KEY", "your_game_key_here")
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded(request, exc: RateLimitExceeded):
+    retry_after = max(1, math.ceil(exc.retry_after))
+    logger.warning(f"Refused {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "scope": exc.scope},
+        headers={"Retry-After": str(retry_after)},
+    )
 
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
 
-# Middleware to log request bodies
-@app.middleware("http")
-async def log_request_body(request, call_next):
-    # Get request body
-    body = b""
-    async for chunk in request.stream():
-        body += chunk
-    
-    # Reassign the stream for downstream use
-    request._body = body
-    
-    # Log the request body
-    logger.info(f"Request body: {body}")
-    
-    # Process the request
-    response = await call_next(request)
-    return response
-
 @app.post("/chat/")
-def chat_with_actor(chat_request: ChatRequest):
+async def chat_with_actor(chat_request: ChatRequest):
     user_id = chat_request.user_id
     level = chat_request.level
     actor = chat_request.actor
     user_input = chat_request.user_input
 
-    chat_history = redis_handler.load_chat_history(user_id, level, actor)
-    chat_history = [] if chat_history is None else chat_history
+    await rate_limiter.check_user(user_id)
+
+    chat_history, summary = await summarizer.aload(user_id, level, actor)
+    summarizer.account(chat_history, summary)
 
-    prompt = PromptLoader.get_prompt_template(level, actor)
+    response = await response_cache.aget(level, actor, chat_history, user_input, summary)
+    if response is None:
+        async with rate_limiter.llm_slot():
+            response = await handler.aget_response(level, actor, user_input, chat_history, summary)
+        await response_cache.aset(level, actor, chat_history, user_input, response, summary)
 
-    chat_history.append(HumanMessage(content=user_input))
-    response = handler.get_response(user_input, prompt, chat_history)
-    chat_history.append(response)
+    turn = [ChatRecord.human(user_input), response]
+    await redis_handler.aappend_chat_messages(user_id, level, actor, turn, chat_history)
+    summarizer.after_turn(user_id, level, actor, chat_history + turn)
 
-    redis_handler.save_chat_history(user_id, level, actor, chat_history)
+    logger.info(f"Response: {response.content} Flag: {response.flag}")
+    return {"message": response.content, "flag": response.flag}
 
-    logger.info(f"Response: {response.content} Flag: {response.additional_kwargs['flag']}")
-    return {"message": response.content, "flag": response.additional_kwargs["flag"]}
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _cached_events(message: ChatRecord):
+    """Replay a cached reply in the same event shape as Handler.astream_response."""
+    yield "token", message.content
+    yield "done", message
+
+@app.post("/chat/stream")
+async def chat_with_actor_stream(chat_request: ChatRequest):
+    """
+    Server-sent events variant of /chat/.
+    Emits `token` events with pieces of the reply as they are generated, then one
+    `done` event with the full message and flag. History is saved only after `done`.
+    """
+    user_id = chat_request.user_id
+    level = chat_request.level
+    actor = chat_request.actor
+    user_input = chat_request.user_input
+
+    await rate_limiter.check_user(user_id)
+
+    chat_history, summary = await summarizer.aload(user_id, level, actor)
+    summarizer.account(chat_history, summary)
+
+    # Admission happens before the response starts so a refusal is still a plain 429;
+    # the LLM slot is then held until the stream ends
+    slot = AsyncExitStack()
+    cached = await response_cache.aget(level, actor, chat_history, user_input, summary)
+    if cached is None:
+        await slot.enter_async_context(rate_limiter.llm_slot())
+
+    async def event_stream():
+        try:
+            if cached is not None:
+                events = _cached_events(cached)
+            else:
+                events = handler.astream_response(level, actor, user_input, chat_history, summary)
+
+            async for event, payload in events:
+                if event == "token":
+                    yield _sse("token", {"content": payload})
+                    continue
+
+                if cached is None:
+                    await response_cache.aset(level, actor, chat_history, user_input, payload, summary)
+                turn = [ChatRecord.human(user_input), payload]
+                await redis_handler.aappend_chat_messages(user_id, level, actor, turn, chat_history)
+                summarizer.after_turn(user_id, level, actor, chat_history + turn)
+                logger.info(f"Response: {payload.content} Flag: {payload.flag}")
+                yield _sse("done", {"message": payload.content, "flag": payload.flag})
+        except Exception as e:
+            logger.error(f"Streaming chat failed: {e}")
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            await slot.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/chat/batch")
+async def chat_batch(request: Request):
+    """
+    Run several chat turns in one request, e.g. replies from several actors at once.
+    The body is JSONL (one ChatRequest per line) or a JSON array of ChatRequests.
+    Results are streamed back as NDJSON in completion order, each with the `index` of
+    its request and either `message`/`flag` or `error`/`status`; a failed item does
+    not fail the batch. Turns for the same conversation run in order.
+    """
+    body = await request.body()
+    if body.lstrip().startswith(b"["):
+        try:
+            lines = [json.dumps(item) for item in json.loads(body)]
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+    else:
+        lines = body.splitlines()
+    requests = parse_requests(lines)
+    if len(requests) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+
+    runner = BatchChatRunner(
+        redis_handler, handler, summarizer=summarizer, rate_limiter=rate_limiter, response_cache=response_cache
+    )
+
+    async def results():
+        async for result in runner.run(requests):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
 
 # Test Function
 @app.post("/ask/")
-def ask(question: ChatRequest):
+async def ask(question: ChatRequest):
     ques = question.user_input
-    llm = LLM.get_llama_llm()
-    response = llm.invoke(ques)
+    await rate_limiter.check_user(question.user_id)
+    await rate_limiter.check_provider("llama")
+    llm = handler.llama_llm
+    async with rate_limiter.llm_slot():
+        response = await llm.ainvoke(ques)
     logger.info(f"Response: {response.content}")
     return response.content
 
@@ -117,101 +280,121 @@ async def guest_login(request: GuestLoginRequest):
     Receives the player's identifier from the client, 
     then sends a secure request to LootLocker.
     """
-    url = f"https://api.lootlocker.io/game/v2/session/guest"
-    payload = {
-        "game_key": GAME_KEY,
-        "player_identifier": request.player_identifier,
-        "game_version": "0.10.0.0"
-    }
-    headers = {"Content-Type": "application/json"}
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-        except httpx.HTTPError as exc:
-            raise HTTPException(
-                status_code=response.status_code if response is not None else 500,
-                detail=str(exc)
-            )
-    return response.json()
+    try:
+        return await lootlocker_client.guest_login(request.player_identifier)
+    except LootLockerError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
 
 @app.post("/leaderboard")
 async def get_leaderboard(x_session_token: str = Header(...)):
     """
     Proxy endpoint to fetch leaderboard data from LootLocker.
-    Requires the client to pass the session token in the header.
+    Requires the client to pass a valid session token in the header (checked on its
+    own and remembered for LEADERBOARD_SESSION_TTL). The list is fetched with the
+    server's submitter session and served from a short-TTL cache; at most one
+    upstream fetch runs per TTL window.
     """
-    url = f"https://api.lootlocker.io/game/leaderboards/twistedtalesleaderboardidtest/list"
-    headers = {"x-session-token": x_session_token}
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-        except httpx.HTTPError as exc:
-            raise HTTPException(
-                status_code=response.status_code if response is not None else 500,
-                detail=str(exc)
-            )
-    return response.json()
+    try:
+        await leaderboard_cache.check_session(x_session_token, lambda: lootlocker_client.verify_session(x_session_token))
+        return await leaderboard_cache.get(
+            lootlocker_client.leaderboard_key,
+            lambda: lootlocker_client.get_leaderboard(SCORE_SUBMITTER_IDENTIFIER),
+        )
+    except LootLockerError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
 
 # Add a manual backup endpoint for triggering backups on demand
-@app.post("/admin/backup")
-async def trigger_backup():
-    """Manually trigger a backup of Redis data to PostgreSQL."""
+def _backup_service() -> PostgresBackupService:
+    """The scheduler's service in embedded mode; otherwise one created on demand for manual backups."""
     global postgres_backup_service
-    if not postgres_backup_service:
-        raise HTTPException(status_code=500, detail="Backup service not initialized")
-    
+    if postgres_backup_service is None:
+        if BACKUP_MODE == "off":
+            raise HTTPException(status_code=500, detail="Backups are disabled (BACKUP_MODE=off)")
+        postgres_backup_service = PostgresBackupService(interval_minutes=BACKUP_INTERVAL_MINUTES)
+    return postgres_backup_service
+
+@app.post("/admin/backup")
+def trigger_backup(full: bool = Query(False)):
+    """
+    Manually trigger a backup of Redis data to PostgreSQL.
+    Only the holder of the backup lease backs up; any other worker answers 409.
+    A plain def: the backup blocks on Redis and Postgres, so it runs in the threadpool
+    instead of stalling the event loop (the same goes for the stats below).
+    """
+    service = _backup_service()
     try:
-        postgres_backup_service.backup_now()
-        return {"message": "Backup process initiated successfully"}
+        service.backup_now(full=full)
+        return {"message": "Backup process initiated successfully", "stats": service.last_backup_stats}
+    except BackupLeaseHeld as e:
+        # Another worker (or the standalone backup worker) is the one that backs up
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/admin/backup/stats")
+def backup_stats():
+    """Report keys scanned vs. rows written, cycle duration and the current leader for the backup service."""
+    service = _backup_service()
+    try:
+        return {"mode": BACKUP_MODE, **service.stats()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+@app.get("/admin/cache-stats")
+async def cache_stats():
+    """Report hit/miss counters for the prompt, chain, leaderboard and response caches."""
+    return {
+        "prompts": PromptLoader.stats(),
+        "chains": handler.chains.stats(),
+        "leaderboard": leaderboard_cache.stats(),
+        "responses": response_cache.stats(),
+        "score_queue": await score_queue.stats(),
+    }
+
+@app.get("/admin/providers")
+async def provider_stats():
+    """Report rolling latency, error rate and breaker state per LLM provider."""
+    return handler.router.stats()
+
+@app.get("/admin/token-stats")
+async def token_stats():
+    """Report estimated prompt history tokens and the work done by the conversation summarizer."""
+    return summarizer.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: stage latencies, cache/LLM/upstream counters and queue depths."""
+    QUEUE_DEPTH.labels("threadpool").set(anyio.to_thread.current_default_thread_limiter().borrowed_tokens)
+    try:
+        QUEUE_DEPTH.labels("score_pending").set(await redis_handler.async_client.scard(SCORE_PENDING_KEY))
+        QUEUE_DEPTH.labels("backup_dirty").set(await redis_handler.async_client.scard(DIRTY_SET_KEY))
+        QUEUE_DEPTH.labels("llm_slots").set(await rate_limiter.slots_in_use())
+    except Exception as e:
+        logger.warning(f"Could not read queue depths from Redis: {e}")
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
 @app.post("/submit-score")
 async def submit_score(request: dict):
     """
     Submit a score to the leaderboard with time-based calculation.
     
-    1. Authenticates the user with LootLocker guest login
+    1. Validates the player identifier
     2. Calculates a delta score based on time difference
-    3. Gets the current score from leaderboard
-    4. Submits the updated score (current + delta)
+    3. Adds the delta to the player's running total in Redis (HINCRBY) and queues it
+
+    Returns with the new total without waiting for LootLocker: ScoreSubmissionQueue
+    pushes queued totals in rate-limited batches and invalidates the leaderboard cache.
+    The flusher reads a player's existing LootLocker score into their total before
+    their first push; until then the totals are `provisional: true`. Unlike the
+    synchronous version, the response has `queued: true` instead of LootLocker's
+    `leaderboard_data`.
     """
     player_identifier = request.get("player_identifier", "")
     if not player_identifier:
         raise HTTPException(status_code=400, detail="Player identifier is required")
     
-    # Step 1: Guest login to get session token
-    login_url = "https://api.lootlocker.io/game/v2/session/guest"
-    login_payload = {
-        "game_key": GAME_KEY,
-        "game_version": "0.10.0.0",
-        "player_identifier": "username_1"
-    }
-    login_headers = {"Content-Type": "application/json"}
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            login_response = await client.post(login_url, json=login_payload, headers=login_headers)
-            login_response.raise_for_status()
-            login_data = login_response.json()
-            session_token = login_data.get("session_token", "")
-            
-            if not session_token:
-                raise HTTPException(status_code=500, detail="Failed to obtain session token")
-                
-            # player_id = login_data.get("player_id", "")
-            
-        except httpx.HTTPError as exc:
-            raise HTTPException(
-                status_code=login_response.status_code if login_response is not None else 500,
-                detail=f"Login error: {str(exc)}"
-            )
-    
-    # Step 2: Calculate time-based delta score    
+    # Step 2: Calculate time-based delta score
     
     # Set reference time (11:30 AM 9th March 2025 IST)
     ist = pytz.timezone('Asia/Kolkata')
@@ -231,47 +414,17 @@ async def submit_score(request: dict):
     # Scale the score to make it more meaningful
     delta_score = round(delta_score * 1000)
     
-    # Step 3: Get current score from leaderboard
-    get_member_url = f"https://api.lootlocker.io/game/leaderboards/twistedtalesleaderboardidtest/member/{player_identifier}"
-    headers = {"x-session-token": session_token}
-    
-    current_score = 0
-    async with httpx.AsyncClient() as client:
-        try:
-            member_response = await client.get(get_member_url, headers=headers)
-            # If the player exists on the leaderboard, get their current score
-            if member_response.status_code == 200:
-                member_data = member_response.json()
-                current_score = member_data.get("score", 0)
-        except httpx.HTTPError:
-            # If there's an error or player doesn't exist yet, assume score is 0
-            logger.info(f"Player {player_identifier} not found on leaderboard, using score 0")
-    
-    # Step 4: Submit updated score
-    new_score = current_score + delta_score
-    submit_url = "https://api.lootlocker.io/game/leaderboards/twistedtalesleaderboardidtest/submit"
-    submit_payload = {
-        "member_id": player_identifier,
-        "score": new_score,
-        "metadata": "test_run"
+    # Step 3: Add the delta to the player's total atomically; the flusher pushes it upstream
+    new_score, provisional = await score_queue.submit(player_identifier, delta_score)
+
+    return {
+        "success": True, 
+        "previous_score": new_score - delta_score,
+        "delta_score": delta_score,
+        "new_score": new_score,
+        "provisional": provisional,
+        "queued": True
     }
-    async with httpx.AsyncClient() as client:
-        try:
-            submit_response = await client.post(submit_url, json=submit_payload, headers=headers)
-            submit_response.raise_for_status()
-            submit_data = submit_response.json()
-            return {
-                "success": True, 
-                "previous_score": current_score,
-                "delta_score": delta_score,
-                "new_score": new_score,
-                "leaderboard_data": submit_data
-            }
-        except httpx.HTTPError as exc:
-            raise HTTPException(
-                status_code=submit_response.status_code if submit_response is not None else 500,
-                detail=f"Score submission error: {str(exc)}"
-            )
         
 ## add a options to handle preflight requests
 @app.options("/chat/")
@@ -279,5 +432,13 @@ async def options_chat():
     # allow all origins
     return {"message": "Options request success"}
 
+@app.options("/chat/stream")
+async def options_chat_stream():
+    return {"message": "Options request success"}
+
+@app.options("/chat/batch")
+async def options_chat_batch():
+    return {"message": "Options request success"}
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
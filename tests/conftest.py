@@ -0,0 +1,84 @@
+import argparse
+import os
+
+import pytest
+
+# main_api and the provider clients read these when they are built; keep them harmless
+os.environ.setdefault("LLAMA_MODEL_NAME", "test")
+os.environ.setdefault("LLAMA_API_KEY", "test")
+os.environ.setdefault("LLAMA_BASE_URL", "http://127.0.0.1:9/v1")
+os.environ.setdefault("GOOGLE_API_KEY_1", "test")
+
+
+@pytest.fixture
+def redis_clients():
+    """(sync client, async client) of one empty fakeredis server (with Lua, for the scripts)."""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    server = fakeredis.FakeServer()
+    return fakeredis.FakeRedis(server=server), fakeredis.FakeAsyncRedis(server=server)
+
+
+@pytest.fixture
+def redis_handler(redis_clients):
+    from apoorvbackend.src.redis.redis_handlers import RedisChatHandler
+
+    sync_client, async_client = redis_clients
+    return RedisChatHandler(client=sync_client, async_client=async_client)
+
+
+@pytest.fixture
+def fake_app():
+    """
+    Factory for main_api wired to fakeredis, fake LLMs with jittered latencies and a mocked
+    LootLocker, as in the load test. Keyword arguments override the load test's options.
+    """
+    pytest.importorskip("httpx")
+    pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from benchmarks.load_test import configure_app
+
+    def build(**overrides):
+        options = dict(
+            redis_url=None, rate_limit=False, response_cache=False, summaries=False, sigma=0.8,
+            llama_latency=0.01, llama_errors=0.0, gemini_latency=0.01, gemini_errors=0.0,
+            lootlocker_latency=0.0, lootlocker_errors=0.0,
+        )
+        options.update(overrides)
+        return configure_app(argparse.Namespace(**options))
+
+    return build
+
+
+@pytest.fixture(scope="session")
+def postgres_dsn(tmp_path_factory):
+    """
+    A disposable Postgres: TEST_DATABASE_URL if set (its chat tables are dropped), else a
+    throwaway server started with pgserver. Tests needing it are skipped without either.
+    """
+    dsn = os.getenv("TEST_DATABASE_URL")
+    if dsn:
+        yield dsn
+        return
+    pgserver = pytest.importorskip("pgserver", reason="set TEST_DATABASE_URL or install pgserver")
+    server = pgserver.get_server(str(tmp_path_factory.mktemp("pgdata")), cleanup_mode="stop")
+    try:
+        yield server.get_uri()
+    finally:
+        server.cleanup()
+
+
+@pytest.fixture
+def postgres_pool(postgres_dsn):
+    """A PostgresPool on the test database; chat tables (both archive formats) are dropped afterwards."""
+    from apoorvbackend.src.database.connection import PostgresPool
+
+    pool = PostgresPool(dsn=postgres_dsn, minconn=1, maxconn=4)
+    try:
+        yield pool
+    finally:
+        with pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DROP VIEW IF EXISTS chat_history_compat")
+                cursor.execute("DROP TABLE IF EXISTS chat_history, chat_messages, chat_conversations CASCADE")
+        pool.close()
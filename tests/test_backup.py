@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+
+from apoorvbackend.src.database.postgres_backup import BACKUP_LEADER_KEY, PostgresBackupService
+from apoorvbackend.src.models.chat_models import ChatRecord
+from apoorvbackend.src.redis.leader import LeaderLease
+
+httpx = pytest.importorskip("httpx")
+
+
+def turn(n: int) -> list:
+    return [ChatRecord.human(f"hello {n}"), ChatRecord.ai(f"reply {n}", False)]
+
+
+def test_incremental_cycle_ends_while_writes_keep_arriving(redis_handler):
+    for i in range(25):
+        redis_handler.append_chat_messages(f"user-{i}", "L1", "pebbles", turn(i))
+    service = PostgresBackupService(batch_size=10, redis_handler=redis_handler, leader_election=False)
+    service._db_ready = True
+
+    def write_again(keys):
+        # Every backed-up key is written again before the batch finishes
+        redis_handler.mark_dirty(keys)
+        return len(keys)
+
+    service._backup_keys = write_again
+    service.backup_now()
+
+    assert service.last_backup_stats["keys_scanned"] == 25
+    assert redis_handler.dirty_count() == 25
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_one_lease_holder_and_takeover_after_the_ttl(redis_clients):
+    leases = [LeaderLease(redis_clients[0], BACKUP_LEADER_KEY, ttl=0.6) for _ in range(2)]
+    for lease in leases:
+        lease.start()
+    try:
+        assert wait_for(lambda: any(lease.is_leader for lease in leases))
+        time.sleep(0.3)
+        assert [lease.is_leader for lease in leases].count(True) == 1
+        winner, other = sorted(leases, key=lambda lease: not lease.is_leader)
+
+        # The winner dies without releasing: the other takes over once the lease expires
+        died = time.monotonic()
+        winner._stop.set()
+        winner._thread.join()
+        assert not other.is_leader
+        assert wait_for(lambda: other.is_leader)
+        assert time.monotonic() - died >= 0.6 * 2 / 3 - 0.05
+        assert other.holder() == other.token
+    finally:
+        for lease in leases:
+            lease.stop()
+
+
+def test_manual_backup_is_refused_while_another_process_leads(fake_app):
+    app_module = fake_app()
+    redis_handler = app_module.redis_handler
+    redis_handler.append_chat_messages("alice", "L1", "pebbles", turn(0))
+    redis_handler.client.set(BACKUP_LEADER_KEY, "other-worker", px=60_000)
+    service = PostgresBackupService(redis_handler=redis_handler)
+    service._backup_keys = lambda keys: pytest.fail("backed up without the lease")
+    app_module.postgres_backup_service = service
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/admin/backup")
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 409
+    assert "other-worker" in response.json()["detail"]
+    assert redis_handler.dirty_count() == 1
+    assert redis_handler.client.get(BACKUP_LEADER_KEY) == b"other-worker"
+
+
+def test_cycle_stops_and_keeps_keys_dirty_once_the_lease_is_lost(redis_handler):
+    for i in range(25):
+        redis_handler.append_chat_messages(f"user-{i}", "L1", "pebbles", turn(i))
+    service = PostgresBackupService(batch_size=10, redis_handler=redis_handler)
+    service._db_ready = True
+    written = []
+
+    def upsert_then_lose_the_lease(keys):
+        written.extend(keys)
+        # Another worker's lease replaces ours after the first batch
+        redis_handler.client.set(BACKUP_LEADER_KEY, "other-worker")
+        service.leader._tick()
+        return {key: key for key in keys}
+
+    service._upsert_blobs = upsert_then_lose_the_lease
+    service.backup_now()
+
+    assert len(written) == 10
+    assert redis_handler.dirty_count() == 15
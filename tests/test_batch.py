@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from apoorvbackend.src.llm_handler import batch_cli
+from apoorvbackend.src.llm_handler.handler import Handler
+from benchmarks.fakes import FakeChatModel, LatencyModel
+
+
+def jsonl(*items) -> str:
+    return "".join((item if isinstance(item, str) else json.dumps(item)) + "\n" for item in items)
+
+
+def chat(user_id: str, user_input: str, level: str = "L1", actor: str = "pebbles") -> dict:
+    return {"user_id": user_id, "level": level, "actor": actor, "user_input": user_input}
+
+
+BODY = jsonl(
+    chat("alice", "first"),
+    chat("bob", "hello"),
+    "{not json",
+    chat("alice", "second"),
+    chat("alice", "to turing", level="L3", actor="turing"),
+)
+
+
+@pytest.mark.parametrize("summaries", [False, True])
+def test_ndjson_batch_reports_every_item_and_keeps_turn_order(fake_app, summaries):
+    app_module = fake_app(summaries=summaries)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/chat/batch", content=BODY,
+                                         headers={"content-type": "application/x-ndjson"})
+        return response
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = {result["index"]: result for result in map(json.loads, response.text.splitlines())}
+
+    assert sorted(results) == [0, 1, 2, 3, 4]
+    assert results[2]["status"] == 400 and "Invalid request" in results[2]["error"]
+    for index, text in ((0, "first"), (1, "hello"), (3, "second"), (4, "to turing")):
+        assert results[index]["message"].endswith(f"You said: {text}")
+
+    # alice's second turn ran after her first and saw it
+    history = app_module.redis_handler.read_full_history("chatlog:alice:L1:pebbles")
+    assert [message["content"] for message in history if message["role"] == "human"] == ["first", "second"]
+
+
+def test_batch_cli_reads_stdin_without_closing_it(redis_handler, monkeypatch, tmp_path):
+    stdin = io.StringIO(jsonl(chat("alice", "first"), chat("alice", "second")))
+    monkeypatch.setattr("sys.stdin", stdin)
+    monkeypatch.setattr(batch_cli, "RedisChatHandler", lambda: redis_handler)
+    monkeypatch.setattr(batch_cli, "Handler", lambda rate_limiter: Handler(
+        llama_llm=FakeChatModel("llama", LatencyModel(0.001, seed=1)),
+        gemini_llm=FakeChatModel("gemini", LatencyModel(0.001, seed=2)),
+        rate_limiter=rate_limiter,
+    ))
+    output = tmp_path / "results.jsonl"
+    args = argparse.Namespace(input="-", output=str(output), concurrency=None, write_batch_size=None, no_save=False)
+
+    failed = asyncio.run(batch_cli.run(args))
+
+    assert failed == 0
+    assert not stdin.closed
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(result["index"] for result in results) == [0, 1]
+
+
+CLI_WITH_FAKES = """
+import sys
+import fakeredis
+from apoorvbackend.src.llm_handler import batch_cli
+from apoorvbackend.src.llm_handler.handler import Handler
+from apoorvbackend.src.redis.redis_handlers import RedisChatHandler
+from benchmarks.fakes import FakeChatModel, LatencyModel
+
+server = fakeredis.FakeServer()
+batch_cli.RedisChatHandler = lambda: RedisChatHandler(
+    client=fakeredis.FakeRedis(server=server), async_client=fakeredis.FakeAsyncRedis(server=server))
+batch_cli.Handler = lambda rate_limiter: Handler(
+    llama_llm=FakeChatModel("llama", LatencyModel(0.001, seed=1)),
+    gemini_llm=FakeChatModel("gemini", LatencyModel(0.001, seed=2)),
+    rate_limiter=rate_limiter,
+)
+sys.argv = ["batch_cli", "-"]
+batch_cli.main()
+"""
+
+
+def test_batch_cli_default_output_is_pure_ndjson(tmp_path):
+    pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    body = jsonl(chat("alice", "first"), "{not json", chat("bob", "hello"))
+
+    # cwd=tmp_path so the file sink's logs/ directory lands there
+    result = subprocess.run([sys.executable, "-c", CLI_WITH_FAKES], input=body, env=env, cwd=tmp_path,
+                            capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 1, result.stderr
+    results = [json.loads(line) for line in result.stdout.splitlines()]
+    assert sorted(item["index"] for item in results) == [0, 1, 2]
+    assert "Preloaded" in result.stderr
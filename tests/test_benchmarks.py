@@ -0,0 +1,39 @@
+import asyncio
+
+from benchmarks import bench_micro
+from benchmarks.load_test import DEFAULT_TRAFFIC, load_traffic, replay
+
+
+def test_load_test_replies_never_cross_over(fake_app):
+    app_module = fake_app(response_cache=True, llama_errors=0.05, gemini_errors=0.05)
+    results, _, checks = asyncio.run(replay(app_module, load_traffic(DEFAULT_TRAFFIC, 3), speed=50, concurrency=200))
+
+    assert checks["replies"] > 50
+    assert checks["problems"] == []
+
+
+def test_load_test_check_catches_a_crossed_reply(fake_app):
+    app_module = fake_app()
+    chats = [record for record in load_traffic(DEFAULT_TRAFFIC, 1) if record["path"] == "/chat/"]
+    other_input = next(record["json"]["user_input"] for record in chats
+                       if record["json"]["user_input"] != chats[0]["json"]["user_input"])
+    original = app_module.handler.aget_response
+
+    async def crossed(level, actor, user_input, chat_history, summary=None):
+        # Answer every request with the reply meant for someone else's input
+        return await original(level, actor, other_input, chat_history, summary)
+
+    app_module.handler.aget_response = crossed
+    _, _, checks = asyncio.run(replay(app_module, chats[:1], speed=50, concurrency=10))
+
+    assert checks["replies"] == 1
+    assert len(checks["problems"]) == 2  # the reply and the stored turn
+
+
+def test_bench_backup_and_restore_check_their_rows(postgres_pool, capsys):
+    bench_micro.bench_backup(postgres_pool.dsn, conversations=30, messages=10, batch_size=8, archive_format="blob")
+    bench_micro.bench_restore(postgres_pool.dsn, conversations=30, messages=10, batch_size=8, workers=2)
+
+    output = capsys.readouterr().out
+    assert "backup blob (update" in output and "bulk restore" in output
+    assert bench_micro.count_bench_rows(postgres_pool, "chat_history") == 0
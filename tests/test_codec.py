@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from apoorvbackend.src.models.chat_models import ChatRecord
+from apoorvbackend.src.redis import codec
+
+HISTORY = [
+    ChatRecord.human("where is the key?"),
+    ChatRecord.ai("Under the mat, détective. \"Quotes\" too.", True),
+    ChatRecord.human(""),
+    ChatRecord.ai("No flag yet.", None),
+]
+
+
+def test_v2_layout():
+    assert json.loads(codec.encode_record(ChatRecord.human("hi"))) == [2, "h", "hi"]
+    assert json.loads(codec.encode_record(ChatRecord.ai("hello", False))) == [2, "a", "hello", False]
+
+
+@pytest.mark.parametrize("record", HISTORY)
+def test_records_round_trip(record):
+    assert codec.decode_record(codec.encode_record(record)) == record
+
+
+def test_lists_and_blobs_round_trip():
+    assert codec.decode_records(codec.encode_records(HISTORY)) == HISTORY
+    assert codec.decode_blob(codec.encode_blob(HISTORY)) == HISTORY
+
+
+def test_v1_dicts_still_decode():
+    human = json.dumps({"role": "human", "content": "hi", "flag": None})
+    ai = json.dumps({"role": "ai", "content": "hello", "flag": True})
+    assert codec.decode_records([human, ai]) == [ChatRecord.human("hi"), ChatRecord.ai("hello", True)]
+    # A blob written before v2 may mix both versions once new turns were appended to it
+    mixed = json.dumps([json.loads(human), [2, "a", "hello", True]])
+    assert codec.decode_blob(mixed) == [ChatRecord.human("hi"), ChatRecord.ai("hello", True)]
+
+
+def test_v2_ai_record_without_a_flag_decodes():
+    assert codec.decode_record(b'[2,"a","hello"]') == ChatRecord.ai("hello", None)
+
+
+@pytest.mark.parametrize("item", [b'[3,"h","from the future"]', b'[1,"h","hi"]'])
+def test_unknown_version_is_rejected(item):
+    with pytest.raises(ValueError, match="Unsupported chat record version"):
+        codec.decode_record(item)
+
+
+def test_unknown_role_is_rejected():
+    with pytest.raises(ValueError, match="Invalid message role"):
+        codec.decode_record(b'[2,"x","hi"]')
+
+
+def test_langchain_messages_encode_like_records():
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    assert codec.encode_record(HumanMessage(content="hi")) == codec.encode_record(ChatRecord.human("hi"))
+    message = AIMessage(content="hello", additional_kwargs={"flag": True})
+    assert codec.decode_record(codec.encode_record(message)) == ChatRecord.ai("hello", True)
+
+
+def test_orjson_and_stdlib_read_each_others_records(monkeypatch):
+    pytest.importorskip("orjson")
+    fast = codec.encode_records(HISTORY)
+    monkeypatch.setattr(codec, "ORJSON_AVAILABLE", False)
+    slow = codec.encode_records(HISTORY)
+    assert codec.decode_records(fast) == HISTORY
+    monkeypatch.setattr(codec, "ORJSON_AVAILABLE", True)
+    assert codec.decode_records(slow) == HISTORY
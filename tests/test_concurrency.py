@@ -0,0 +1,46 @@
+import asyncio
+import re
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+USERS = 200
+TURNS = 3
+TAG = re.compile(r"<(user-\d+)>")
+
+
+async def run_users(app_module) -> dict:
+    """USERS players chat at once, TURNS turns each (in order per player); returns replies per user."""
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+
+        async def player(user_id: str) -> list:
+            replies = []
+            for turn in range(TURNS):
+                response = await client.post("/chat/", json={
+                    "user_id": user_id, "level": "L1", "actor": "pebbles", "user_input": f"<{user_id}> turn {turn}",
+                })
+                assert response.status_code == 200, response.text
+                replies.append(response.json()["message"])
+            return replies
+
+        users = [f"user-{i}" for i in range(USERS)]
+        return dict(zip(users, await asyncio.gather(*(player(user) for user in users))))
+
+
+@pytest.mark.parametrize("response_cache", [False, True])
+def test_parallel_chats_never_cross_users(fake_app, response_cache):
+    app_module = fake_app(response_cache=response_cache)
+    replies = asyncio.run(run_users(app_module))
+
+    for user_id, messages in replies.items():
+        for turn, message in enumerate(messages):
+            # The fake model echoes the input it was given, so any other user's tag is a leak
+            assert TAG.findall(message) == [user_id], message
+            assert f"turn {turn}" in message
+
+        history = app_module.redis_handler.read_full_history(f"chatlog:{user_id}:L1:pebbles")
+        assert len(history) == 2 * TURNS
+        assert all(TAG.findall(message["content"]) == [user_id] for message in history)
+        assert [message["role"] for message in history] == ["human", "ai"] * TURNS
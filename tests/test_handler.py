@@ -0,0 +1,139 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from apoorvbackend.src.llm_handler.handler import Handler
+from apoorvbackend.src.llm_handler.router import CircuitBreaker, ProviderRouter
+from apoorvbackend.src.redis.rate_limiter import RateLimiter
+from benchmarks.fakes import FakeChatModel, LatencyModel
+
+
+class ScriptedLatency(LatencyModel):
+    """Latency model that returns the given latencies in order (the last one repeats)."""
+
+    def __init__(self, *latencies: float, error_rate: float = 0.0):
+        super().__init__(error_rate=error_rate, seed=0)
+        self.latencies = list(latencies)
+
+    def latency(self) -> float:
+        return self.latencies.pop(0) if len(self.latencies) > 1 else self.latencies[0]
+
+
+class CountingModel(FakeChatModel):
+    """FakeChatModel that counts the calls started and the ones cancelled mid-call."""
+
+    def __init__(self, name: str, *latencies: float):
+        super().__init__(name, ScriptedLatency(*latencies), flag_rate=0.0)
+        self.started = 0
+        self.cancelled = 0
+
+    def with_structured_output(self, schema=None, **kwargs):
+        structured = super().with_structured_output(schema, **kwargs)
+        ainvoke = structured.ainvoke
+
+        async def counted(input, config=None, **kw):
+            self.started += 1
+            try:
+                return await ainvoke(input, config, **kw)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+
+        structured.ainvoke = counted
+        return structured
+
+
+def make_handler(llama, gemini, hedging=True, rate_limiter=None):
+    router = ProviderRouter(("llama", "gemini"), hedging=hedging, default_hedge_delay=0.05, min_hedge_delay=0.05)
+    return Handler(llama_llm=llama, gemini_llm=gemini, router=router, rate_limiter=rate_limiter)
+
+
+def ask(handler):
+    return handler.aget_response("L1", "pebbles", "hello", [])
+
+
+def test_hedging_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("LLM_HEDGING", raising=False)
+    assert ProviderRouter(("llama", "gemini")).hedging is False
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    llama, gemini = CountingModel("llama", 1.0), CountingModel("gemini", 0.01)
+    handler = make_handler(llama, gemini)
+
+    async def scenario():
+        started = time.monotonic()
+        reply = await ask(handler)
+        await asyncio.sleep(0)
+        return reply, time.monotonic() - started
+
+    reply, elapsed = asyncio.run(scenario())
+    assert reply.content.startswith("[gemini]")
+    assert elapsed < 0.5
+    assert (llama.started, llama.cancelled, gemini.started) == (1, 1, 1)
+
+
+def test_fast_primary_is_not_hedged():
+    llama, gemini = CountingModel("llama", 0.01), CountingModel("gemini", 0.01)
+    reply = asyncio.run(ask(make_handler(llama, gemini)))
+    assert reply.content.startswith("[llama]")
+    assert gemini.started == 0
+
+
+def test_cancelled_caller_cancels_the_call_it_was_waiting_on():
+    llama, gemini = CountingModel("llama", 1.0), CountingModel("gemini", 1.0)
+    # The hedge delay is longer than the caller waits, so it is cancelled inside the hedge wait
+    router = ProviderRouter(("llama", "gemini"), hedging=True, default_hedge_delay=0.5, min_hedge_delay=0.5)
+    handler = Handler(llama_llm=llama, gemini_llm=gemini, router=router)
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(ask(handler), timeout=0.05)
+        await asyncio.sleep(0.01)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(scenario()) == []
+    assert (llama.started, llama.cancelled, gemini.started) == (1, 1, 0)
+
+
+def test_hedge_needs_a_free_llm_slot(redis_clients):
+    llama, gemini = CountingModel("llama", 0.2), CountingModel("gemini", 0.01)
+    rate_limiter = RateLimiter(redis_clients[1], enabled=True, max_concurrency=1)
+    handler = make_handler(llama, gemini, rate_limiter=rate_limiter)
+
+    async def scenario():
+        # Like /chat/, the request holds the only slot for its first call
+        async with rate_limiter.llm_slot():
+            return await ask(handler)
+
+    reply = asyncio.run(scenario())
+    assert reply.content.startswith("[llama]")
+    assert gemini.started == 0
+
+
+def test_half_open_breaker_admits_a_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.available()
+
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.available()
+    assert not breaker.available()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.available() and breaker.available()
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.available()
+    assert breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.available()
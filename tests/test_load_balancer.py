@@ -0,0 +1,31 @@
+import pytest
+
+from apoorvbackend.src.llm_handler.load_balancer import is_quota_error
+
+
+class StatusError(Exception):
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@pytest.mark.parametrize("error", [
+    Exception("429 Resource has been exhausted (e.g. check quota)."),
+    Exception("Error code: 429 - rate limited"),
+    Exception("status: RESOURCE_EXHAUSTED"),
+    StatusError("Too Many Requests", 429),
+])
+def test_quota_errors_are_recognised(error):
+    assert is_quota_error(error)
+
+
+@pytest.mark.parametrize("error", [
+    Exception("Request 14290 timed out"),
+    Exception("Prompt had 4290 tokens"),
+    Exception("context id abc429def not found"),
+    # A status code wins over a message that happens to contain 429
+    StatusError("upstream said 429 earlier", 500),
+    Exception("Connection reset by peer"),
+])
+def test_other_errors_are_not_quota_errors(error):
+    assert not is_quota_error(error)
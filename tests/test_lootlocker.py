@@ -0,0 +1,137 @@
+import asyncio
+import time
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from apoorvbackend.src.lootlocker.client import LootLockerClient, LootLockerError
+from apoorvbackend.src.lootlocker.score_queue import PENDING_KEY, SEEDED_KEY, TOTALS_KEY, ScoreSubmissionQueue
+
+
+def counting_transport(calls: list) -> httpx.MockTransport:
+    async def handle(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        return httpx.Response(200, json={"session_token": f"token-{len(calls)}", "player_id": 1})
+
+    return httpx.MockTransport(handle)
+
+
+def test_player_logins_are_not_cached_but_the_submitter_session_is():
+    calls = []
+    client = LootLockerClient(game_key="test", transport=counting_transport(calls))
+
+    async def scenario():
+        for i in range(50):
+            await client.guest_login(f"player-{i}")
+        first = await client.get_session_token("submitter")
+        second = await client.get_session_token("submitter")
+        await client.aclose()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert list(client._sessions) == ["submitter"]
+    assert list(client._session_locks) == ["submitter"]
+    assert first == second
+    assert len(calls) == 51
+
+
+def test_leaderboard_checks_every_callers_session_on_its_own(fake_app):
+    app_module = fake_app()
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            tokens = ["invalid-1"] + [f"player-{i}" for i in range(9)]
+            concurrent = await asyncio.gather(
+                *(client.post("/leaderboard", headers={"x-session-token": token}) for token in tokens)
+            )
+            # The board is cached now, and still refused to a bad token
+            later = await client.post("/leaderboard", headers={"x-session-token": "invalid-2"})
+        await app_module.lootlocker_client.aclose()
+        return concurrent, later
+
+    concurrent, later = asyncio.run(scenario())
+    assert concurrent[0].status_code == 401
+    assert all(response.status_code == 200 and response.json()["items"] for response in concurrent[1:])
+    assert later.status_code == 401
+    assert app_module.leaderboard_cache.stats()["upstream_calls"] == 1
+
+
+def scripted_transport(member_status: int, calls: list, member_score: int = 0) -> httpx.MockTransport:
+    """Logins succeed; member lookups answer member_status; score submissions succeed."""
+    async def handle(request: httpx.Request) -> httpx.Response:
+        calls.append((time.monotonic(), request.url.path))
+        if request.url.path.startswith("/game/v2/session"):
+            return httpx.Response(200, json={"session_token": "token", "player_id": 1})
+        if "/member/" in request.url.path:
+            return httpx.Response(member_status, json={"score": member_score})
+        return httpx.Response(200, json={"rank": 1})
+
+    return httpx.MockTransport(handle)
+
+
+@pytest.mark.parametrize("status, expected", [(404, 0), (200, 70)])
+def test_member_score_is_zero_only_when_not_on_the_board(status, expected):
+    client = LootLockerClient(game_key="test", transport=scripted_transport(status, [], member_score=70))
+    assert asyncio.run(client.get_member_score("player", "submitter")) == expected
+
+
+def test_member_score_lookup_failure_raises():
+    client = LootLockerClient(game_key="test", transport=scripted_transport(503, []))
+    with pytest.raises(LootLockerError) as excinfo:
+        asyncio.run(client.get_member_score("player", "submitter"))
+    assert excinfo.value.status_code == 503
+
+
+def score_queue(redis_clients, member_status: int, calls: list, member_score: int = 0, **kwargs):
+    client = LootLockerClient(game_key="test", transport=scripted_transport(member_status, calls, member_score))
+    return ScoreSubmissionQueue(redis_clients[1], client, "submitter", **kwargs)
+
+
+def test_submissions_stay_off_lootlocker_and_are_provisional_until_seeded(redis_clients):
+    calls = []
+    queue = score_queue(redis_clients, 200, calls, member_score=500, max_per_second=1000)
+
+    async def scenario():
+        # Concurrent first submissions for one new player, then a flush, then one more
+        before = await asyncio.gather(*(queue.submit("player", 10) for _ in range(5)))
+        upstream_before_flush = len(calls)
+        await queue.flush_once()
+        after = await queue.submit("player", 5)
+        return before, upstream_before_flush, after
+
+    before, upstream_before_flush, after = asyncio.run(scenario())
+    assert upstream_before_flush == 0
+    assert sorted(before) == [(total, True) for total in (10, 20, 30, 40, 50)]
+    assert after == (555, False)
+    assert sum("/member/" in path for _, path in calls) == 1
+
+
+def test_failed_seed_keeps_the_total_pending(redis_clients):
+    queue = score_queue(redis_clients, 503, [], max_per_second=1000)
+
+    async def scenario():
+        await queue.submit("player", 10)
+        flushed = await queue.flush_once()
+        return (flushed, await queue.redis.hget(TOTALS_KEY, "player"), await queue.redis.sismember(SEEDED_KEY, "player"),
+                await queue.redis.sismember(PENDING_KEY, "player"), await queue.submit("player", 1))
+
+    assert asyncio.run(scenario()) == (0, b"10", 0, 1, (11, True))
+
+
+def test_flusher_paces_score_lookups_too(redis_clients):
+    calls = []
+    queue = score_queue(redis_clients, 404, calls, max_per_second=20)
+
+    async def scenario():
+        # New players: each push needs a lookup and a submission
+        for i in range(5):
+            await queue.submit(f"player-{i}", 10)
+        return await queue.flush_once()
+
+    assert asyncio.run(scenario()) == 5
+    upstream = [at for at, path in calls if not path.startswith("/game/v2/session")]
+    assert len(upstream) == 10
+    # 10 calls at 20/s take at least 9 intervals of 50ms
+    assert upstream[-1] - upstream[0] >= 9 / 20 - 0.01
@@ -0,0 +1,58 @@
+import pytest
+
+from apoorvbackend.src.database.chat_archive import ChatArchive
+from apoorvbackend.src.database.postgres_backup import PostgresBackupService
+from apoorvbackend.src.database.restore import RedisRestoreService
+from apoorvbackend.src.models.chat_models import ChatRecord
+from apoorvbackend.src.redis.redis_handlers import RedisChatHandler
+
+TURNS = [
+    ChatRecord.human('Who are you? "quoted", with a comma'),
+    ChatRecord.ai("A pebble.\nOn two lines.", False),
+    ChatRecord.human(""),
+    ChatRecord.ai("You found it!", True),
+]
+
+
+def rows(pool, query: str, params=None) -> list:
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+
+@pytest.mark.parametrize("archive_format", ["messages", "both"])
+def test_messages_round_trip_through_copy(redis_handler, postgres_pool, archive_format):
+    redis_handler.append_chat_messages("alice", "L1", "pebbles", TURNS[:2])
+    redis_handler.append_chat_messages("bob", "L1", "pebbles", TURNS)
+    service = PostgresBackupService(batch_size=10, pool=postgres_pool, redis_handler=redis_handler,
+                                    leader_election=False, archive_format=archive_format)
+    service.backup_now()
+
+    # Human messages have no flag: NULL, not an empty string
+    assert rows(postgres_pool, "SELECT seq, role, content, flag FROM chat_messages WHERE user_id = 'bob' ORDER BY seq") == [
+        (1, "human", TURNS[0].content, None),
+        (2, "ai", TURNS[1].content, False),
+        (3, "human", "", None),
+        (4, "ai", TURNS[3].content, True),
+    ]
+
+    # A second cycle with one new message copies only that message
+    redis_handler.append_chat_messages("alice", "L1", "pebbles", TURNS[2:3])
+    service.backup_now()
+    assert rows(postgres_pool, "SELECT user_id, count(*) FROM chat_messages GROUP BY user_id ORDER BY user_id") == [
+        ("alice", 3), ("bob", 4),
+    ]
+
+    # The compatibility view and a restore into an empty Redis give the same conversations back
+    archive = ChatArchive(postgres_pool, archive_format="messages")
+    chat_data, last_seq = archive.load("bob", "L1", "pebbles")
+    assert [ChatRecord.from_dict(message) for message in chat_data] == TURNS
+    assert last_seq == 4
+
+    target = RedisChatHandler(client=redis_handler.client, async_client=redis_handler.async_client)
+    target.client.flushdb()
+    stats = RedisRestoreService(target, archive, batch_size=1, workers=1).run()
+    assert stats["restored"] == 2
+    assert target.load_chat_history("alice", "L1", "pebbles") == TURNS[:3]
+    assert target.load_chat_history("bob", "L1", "pebbles") == TURNS
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def value_class_with(multiproc_dir: str) -> str:
+    """Name of the value class prometheus_client picks when metrics is imported with PROMETHEUS_MULTIPROC_DIR set."""
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=multiproc_dir, PYTHONPATH=ROOT)
+    code = "import apoorvbackend.src.metrics.metrics, prometheus_client.values as v; print(v.ValueClass.__name__)"
+    result = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+def test_empty_multiproc_dir_means_single_process():
+    assert value_class_with("") == "MutexValue"
+
+
+def test_multiproc_dir_enables_multiprocess_mode(tmp_path):
+    assert value_class_with(str(tmp_path)) != "MutexValue"
@@ -0,0 +1,48 @@
+import asyncio
+import json
+
+from apoorvbackend.src.models.chat_models import ChatRecord
+from apoorvbackend.src.redis import codec
+from apoorvbackend.src.redis.redis_handlers import DIRTY_SET_KEY
+
+V1_BLOB = json.dumps([
+    {"role": "human", "content": "who are you?", "flag": None},
+    {"role": "ai", "content": "Pebbles.", "flag": False},
+])
+HISTORY = [ChatRecord.human("who are you?"), ChatRecord.ai("Pebbles.", False)]
+
+
+def dirty(redis_handler) -> set:
+    return {key.decode("utf-8") for key in redis_handler.client.smembers(DIRTY_SET_KEY)}
+
+
+def test_v1_and_v2_blobs_move_to_lists_and_are_marked_for_backup(redis_handler):
+    client = redis_handler.client
+    client.set("chat:alice:L1:pebbles", V1_BLOB)
+    client.set("chat:bob:L2:turing", codec.encode_blob(HISTORY))
+    client.sadd(DIRTY_SET_KEY, "chat:alice:L1:pebbles")
+
+    assert redis_handler.migrate_legacy_keys() == 2
+
+    for user_id, level, actor in (("alice", "L1", "pebbles"), ("bob", "L2", "turing")):
+        assert not client.exists(f"chat:{user_id}:{level}:{actor}")
+        assert redis_handler.load_chat_history(user_id, level, actor) == HISTORY
+        assert int(client.get(f"chatseq:{user_id}:{level}:{actor}")) == 2
+    assert dirty(redis_handler) == {"chatlog:alice:L1:pebbles", "chatlog:bob:L2:turing"}
+    # Nothing left to migrate
+    assert redis_handler.migrate_legacy_keys() == 0
+
+
+def test_first_load_migrates_ahead_of_newer_list_messages(redis_handler):
+    client = redis_handler.client
+    client.set("chat:alice:L1:pebbles", V1_BLOB)
+    newer = [ChatRecord.human("again?")]
+    redis_handler.append_chat_messages("alice", "L1", "pebbles", newer)
+    client.delete(DIRTY_SET_KEY)
+
+    loaded = asyncio.run(redis_handler.aload_chat_history("alice", "L1", "pebbles"))
+
+    assert loaded == HISTORY + newer
+    assert not client.exists("chat:alice:L1:pebbles")
+    assert int(client.get("chatseq:alice:L1:pebbles")) == 3
+    assert dirty(redis_handler) == {"chatlog:alice:L1:pebbles"}
@@ -0,0 +1,55 @@
+import time
+
+from apoorvbackend.src.database.postgres_backup import PostgresBackupService
+from apoorvbackend.src.database.schema import CONVERSATION_UNIQUE_INDEX, ensure_schema
+from apoorvbackend.src.models.chat_models import ChatRecord
+
+CONVERSATIONS = 3000
+# Generous for CI; a local run takes well under two seconds
+BACKUP_BUDGET_SECONDS = 30
+
+
+def rows(pool, query: str, params=None) -> list:
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+
+def test_backup_upserts_thousands_of_conversations_in_bounded_time(redis_handler, postgres_pool):
+    history = [ChatRecord.human("Who are you?"), ChatRecord.ai("A pebble.", False)]
+    for i in range(CONVERSATIONS):
+        redis_handler.append_chat_messages(f"user-{i}", "L1", "pebbles", history)
+    service = PostgresBackupService(batch_size=500, pool=postgres_pool, redis_handler=redis_handler,
+                                    leader_election=False)
+
+    started = time.monotonic()
+    service.backup_now()
+    assert time.monotonic() - started < BACKUP_BUDGET_SECONDS
+    assert service.last_backup_stats["rows_written"] == CONVERSATIONS
+    assert rows(postgres_pool, "SELECT count(*) FROM chat_history") == [(CONVERSATIONS,)]
+
+    # An incremental cycle rewrites only the changed conversation, in place
+    redis_handler.append_chat_messages("user-7", "L1", "pebbles", [ChatRecord.human("Again?")])
+    service.backup_now()
+    assert service.last_backup_stats["rows_written"] == 1
+    assert rows(postgres_pool, "SELECT count(*) FROM chat_history") == [(CONVERSATIONS,)]
+    (chat_data,), = rows(postgres_pool, "SELECT chat_data FROM chat_history WHERE user_id = %s", ("user-7",))
+    assert [message["content"] for message in chat_data] == ["Who are you?", "A pebble.", "Again?"]
+
+
+def test_ensure_schema_deduplicates_before_adding_the_unique_index(postgres_pool):
+    with postgres_pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("CREATE TABLE chat_history (id SERIAL PRIMARY KEY, user_id VARCHAR(255) NOT NULL, "
+                           "level VARCHAR(50) NOT NULL, actor VARCHAR(50) NOT NULL, chat_data JSONB NOT NULL, "
+                           "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, "
+                           "updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+            cursor.execute("INSERT INTO chat_history (user_id, level, actor, chat_data, updated_at) VALUES "
+                           "('u', 'L1', 'pebbles', '[1]', now() - interval '1 hour'), "
+                           "('u', 'L1', 'pebbles', '[2]', now())")
+
+    ensure_schema(postgres_pool)
+
+    assert rows(postgres_pool, "SELECT chat_data FROM chat_history") == [([2],)]
+    assert rows(postgres_pool, "SELECT 1 FROM pg_indexes WHERE indexname = %s", (CONVERSATION_UNIQUE_INDEX,)) == [(1,)]
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from apoorvbackend.src.redis.rate_limiter import LLM_SLOTS_KEY, RateLimiter, RateLimitExceeded
+
+
+def test_disabled_by_default(redis_clients, monkeypatch):
+    monkeypatch.delenv("RATE_LIMIT_ENABLED", raising=False)
+    limiter = RateLimiter(redis_clients[1])
+
+    async def scenario():
+        for _ in range(50):
+            await limiter.check_user("player")
+        async with limiter.llm_slot():
+            pass
+
+    assert limiter.enabled is False
+    asyncio.run(scenario())
+
+
+def test_user_bucket_allows_the_burst_then_refuses_until_refilled(redis_clients):
+    limiter = RateLimiter(redis_clients[1], enabled=True, user_rate=20, user_burst=3)
+
+    async def scenario():
+        for _ in range(3):
+            await limiter.check_user("player")
+        with pytest.raises(RateLimitExceeded) as refused:
+            await limiter.check_user("player")
+        # Other users have their own bucket
+        await limiter.check_user("someone-else")
+        await asyncio.sleep(0.06)
+        await limiter.check_user("player")
+        return refused.value
+
+    refused = asyncio.run(scenario())
+    assert refused.scope == "user"
+    assert 0 < refused.retry_after <= 0.05
+
+
+def test_provider_override(redis_clients, monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_GEMINI_BURST", "1")
+    limiter = RateLimiter(redis_clients[1], enabled=True, provider_rate=0.1, provider_burst=5)
+
+    async def scenario():
+        await limiter.check_provider("gemini")
+        with pytest.raises(RateLimitExceeded):
+            await limiter.check_provider("gemini")
+        for _ in range(5):
+            await limiter.check_provider("llama")
+
+    asyncio.run(scenario())
+
+
+def test_llm_slots_are_bounded_and_released(redis_clients):
+    limiter = RateLimiter(redis_clients[1], enabled=True, max_concurrency=2)
+
+    async def scenario():
+        async with limiter.llm_slot():
+            async with limiter.llm_slot():
+                assert await limiter.slots_in_use() == 2
+                with pytest.raises(RateLimitExceeded) as refused:
+                    async with limiter.llm_slot():
+                        pass
+                assert refused.value.scope == "concurrency"
+        return await limiter.slots_in_use()
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_expired_slot_leases_free_themselves(redis_clients):
+    limiter = RateLimiter(redis_clients[1], enabled=True, max_concurrency=1, slot_ttl=0.05)
+
+    async def scenario():
+        # A worker that took a slot and died without releasing it
+        await limiter._acquire_slot(keys=[LLM_SLOTS_KEY], args=["crashed", 1, 50])
+        await asyncio.sleep(0.06)
+        async with limiter.llm_slot():
+            return await limiter.slots_in_use()
+
+    assert asyncio.run(scenario()) == 1
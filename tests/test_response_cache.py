@@ -0,0 +1,46 @@
+import asyncio
+
+from apoorvbackend.src.models.chat_models import ChatRecord
+from apoorvbackend.src.redis.response_cache import ResponseCache
+
+HISTORY = [ChatRecord.human("where is the key"), ChatRecord.ai("Under the mat.", False)]
+
+
+def test_summary_is_part_of_the_key(redis_clients):
+    cache = ResponseCache(redis_clients[1], enabled=True)
+
+    async def scenario():
+        await cache.aset("L1", "pebbles", HISTORY, "and the door?", ChatRecord.ai("It is open.", False),
+                         summary="The player lied to pebbles.")
+        return (
+            await cache.aget("L1", "pebbles", HISTORY, "and the door?", summary="The player lied to pebbles."),
+            # Same history, different older conversation
+            await cache.aget("L1", "pebbles", HISTORY, "and the door?", summary="The player helped pebbles."),
+            await cache.aget("L1", "pebbles", HISTORY, "and the door?"),
+        )
+
+    same, other, unsummarized = asyncio.run(scenario())
+    assert same is not None and same.content == "It is open."
+    assert other is None
+    assert unsummarized is None
+
+
+def test_conversations_without_a_summary_keep_their_keys(redis_clients):
+    cache = ResponseCache(redis_clients[1], enabled=True)
+    assert cache._context_hash(HISTORY) == cache._context_hash(HISTORY, None) == cache._context_hash(HISTORY, "")
+
+
+def test_histories_differing_only_in_an_early_message_do_not_share_entries(redis_clients):
+    cache = ResponseCache(redis_clients[1], enabled=True)
+    turns = [ChatRecord.human("hi"), ChatRecord.ai("Hello.", False)] * 4
+    lied = [ChatRecord.human("I am the detective"), ChatRecord.ai("Welcome, detective.", True)] + turns
+    honest = [ChatRecord.human("I am a tourist"), ChatRecord.ai("Welcome, tourist.", False)] + turns
+
+    async def scenario():
+        await cache.aset("L1", "pebbles", lied, "open the vault", ChatRecord.ai("Right away.", True))
+        return (await cache.aget("L1", "pebbles", lied, "open the vault"),
+                await cache.aget("L1", "pebbles", honest, "open the vault"))
+
+    same, other = asyncio.run(scenario())
+    assert same is not None and same.flag is True
+    assert other is None
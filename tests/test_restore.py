@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from apoorvbackend.src.database.chat_archive import ChatArchive
+from apoorvbackend.src.database.postgres_backup import PostgresBackupService
+from apoorvbackend.src.database.restore import (
+    RESTORE_CHECKPOINT_KEY, RESTORE_DONE_KEY, RESTORE_LEADER_KEY, RedisRestoreService,
+)
+from apoorvbackend.src.models.chat_models import ChatRecord
+from apoorvbackend.src.redis.redis_handlers import RedisChatHandler
+
+CONVERSATIONS = 40
+
+
+def history(i: int) -> list:
+    return [ChatRecord.human(f"hello from {i}"), ChatRecord.ai(f"welcome {i}", i % 5 == 0)]
+
+
+@pytest.fixture
+def archived(redis_clients, postgres_pool):
+    """CONVERSATIONS conversations backed up to Postgres from a Redis that is then flushed."""
+    source = RedisChatHandler(client=redis_clients[0], async_client=redis_clients[1])
+    for i in range(CONVERSATIONS):
+        source.append_chat_messages(f"user-{i}", "L1", "pebbles", history(i))
+    PostgresBackupService(batch_size=16, pool=postgres_pool, redis_handler=source, leader_election=False).backup_now()
+    redis_clients[0].flushdb()
+    return postgres_pool
+
+
+def test_bulk_restore_refills_a_flushed_redis(redis_handler, archived):
+    service = RedisRestoreService(redis_handler, ChatArchive(archived), batch_size=7, workers=3)
+    assert not service.finished()
+
+    stats = service.run_if_needed()
+
+    assert (stats["total"], stats["restored"], stats["skipped"]) == (CONVERSATIONS, CONVERSATIONS, 0)
+    assert service.finished()
+    for i in (0, 17, CONVERSATIONS - 1):
+        assert redis_handler.load_chat_history(f"user-{i}", "L1", "pebbles") == history(i)
+    # Numbering continues after the restored messages
+    assert int(redis_handler.client.get("chatseq:user-3:L1:pebbles")) == 2
+    # Only once per Redis
+    assert service.run_if_needed() is None
+
+
+def test_live_conversations_are_not_overwritten(redis_handler, archived):
+    redis_handler.append_chat_messages("user-1", "L1", "pebbles", [ChatRecord.human("newer")])
+    stats = RedisRestoreService(redis_handler, ChatArchive(archived), batch_size=7, workers=2).run()
+
+    assert stats["skipped"] == 1
+    assert redis_handler.load_chat_history("user-1", "L1", "pebbles") == [ChatRecord.human("newer")]
+
+
+@pytest.mark.parametrize("idle_ttl, keeps_archive", [(0, False), (3600, True)])
+def test_startup_restore_drops_the_load_fallback_unless_tiering(fake_app, archived, idle_ttl, keeps_archive):
+    app_module = fake_app()
+    app_module.redis_handler.idle_ttl = idle_ttl
+    app_module.redis_handler.archive = ChatArchive(archived)
+
+    app_module.startup_restore(poll_interval=0.01)
+
+    assert app_module.redis_handler.client.exists(RESTORE_DONE_KEY)
+    assert app_module.redis_handler.uses_archive == keeps_archive
+    assert app_module.redis_handler.load_chat_history("user-9", "L1", "pebbles") == history(9)
+
+
+def test_a_waiting_worker_takes_over_a_dead_workers_restore(fake_app, archived):
+    app_module = fake_app()
+    app_module.redis_handler.archive = ChatArchive(archived)
+    redis = app_module.redis_handler.client
+    # A worker started the restore, checkpointed it and died holding the lease, which
+    # outlives the first attempt's wait for leadership
+    redis.hset(RESTORE_CHECKPOINT_KEY, mapping={"last_id": 0, "since_hours": "", "user_prefix": ""})
+    redis.set(RESTORE_LEADER_KEY, "dead-worker", px=2500)
+
+    waiting = threading.Thread(target=app_module.startup_restore, kwargs={"poll_interval": 0.05}, daemon=True)
+    waiting.start()
+    waiting.join(timeout=20)
+
+    assert not waiting.is_alive()
+    assert redis.exists(RESTORE_DONE_KEY) and not redis.exists(RESTORE_CHECKPOINT_KEY)
+    assert not app_module.redis_handler.uses_archive
+    assert app_module.redis_handler.load_chat_history("user-9", "L1", "pebbles") == history(9)
@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from apoorvbackend.src.llm_handler.handler import Handler
+from apoorvbackend.src.llm_handler.llm import LLM
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("langchain_google_genai", "langchain_openai", "openai", "psycopg2")
+
+
+def test_importing_main_api_builds_no_provider_client():
+    code = (
+        "import json, sys, main_api\n"
+        "from apoorvbackend.src.llm_handler.llm import LLM\n"
+        f"print(json.dumps({{'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules],\n"
+        "                   'clients': LLM._llama_client is not None or bool(LLM._gemini_clients)}))"
+    )
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == {"loaded": [], "clients": False}
+
+
+def test_handler_builds_the_llama_client_on_first_use(monkeypatch):
+    pytest.importorskip("langchain_openai")
+    monkeypatch.setattr(LLM, "_llama_client", None)
+    handler = Handler()
+    assert handler._llama_llm is None and LLM._llama_client is None
+
+    llm = handler.llama_llm
+    assert llm is LLM._llama_client
+    # Later handlers share the process-wide client
+    assert Handler().llama_llm is llm
+
+
+def test_gemini_clients_are_built_once_per_key(monkeypatch):
+    pytest.importorskip("langchain_google_genai")
+    monkeypatch.setenv("MODEL_NAME", "gemini-test")
+    monkeypatch.setattr(LLM, "_gemini_clients", {})
+    first = LLM.get_gemini_client("key-a")
+    assert LLM.get_gemini_client("key-a") is first
+    assert LLM.get_gemini_client("key-b") is not first
+    assert set(LLM._gemini_clients) == {"key-a", "key-b"}
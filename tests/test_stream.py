@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from apoorvbackend.src.llm_handler.handler import Handler
+from benchmarks.fakes import FakeChatModel, FakeStructuredOutput, LatencyModel
+
+CHAT = {"user_id": "alice", "level": "L1", "actor": "pebbles", "user_input": "where is the key"}
+
+
+class MidStreamFailure(FakeChatModel):
+    """FakeChatModel whose stream breaks after its first piece of content."""
+
+    def with_structured_output(self, schema=None, **kwargs):
+        class Broken(FakeStructuredOutput):
+            async def astream(self, input, config=None, **kw):
+                yield {"content": f"[{self.model.name}] You"}
+                raise RuntimeError("connection reset")
+
+        return Broken(self, schema)
+
+
+def stream(app_module, body: dict = CHAT) -> list:
+    """POST /chat/stream; returns its events as (event, data) in order."""
+    async def scenario():
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/chat/stream", json=body)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        return response.text
+
+    events = []
+    for block in asyncio.run(scenario()).split("\n\n"):
+        if block.strip():
+            lines = dict(line.split(": ", 1) for line in block.splitlines())
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def saved(app_module) -> list:
+    return app_module.redis_handler.read_full_history("chatlog:alice:L1:pebbles") or []
+
+
+def reply_of(events: list) -> dict:
+    """Check the events are tokens then one `done` whose message the tokens spell out; returns its data."""
+    names = [event for event, _ in events]
+    assert names[-1] == "done" and set(names[:-1]) == {"token"}
+    done = events[-1][1]
+    assert "".join(data["content"] for _, data in events[:-1]) == done["message"]
+    return done
+
+
+def use_models(app_module, llama, gemini) -> None:
+    app_module.handler = Handler(llama_llm=llama, gemini_llm=gemini, rate_limiter=app_module.rate_limiter)
+
+
+def test_tokens_then_done_then_history(fake_app):
+    app_module = fake_app()
+
+    done = reply_of(stream(app_module))
+
+    assert done["message"] == "[llama] You said: where is the key"
+    assert [message["content"] for message in saved(app_module)] == ["where is the key", done["message"]]
+
+
+def test_provider_failing_before_its_first_token_falls_back(fake_app):
+    app_module = fake_app(llama_errors=1.0)
+
+    done = reply_of(stream(app_module))
+
+    assert done["message"] == "[gemini] You said: where is the key"
+    assert len(saved(app_module)) == 2
+
+
+def test_failure_mid_stream_ends_with_error_and_saves_nothing(fake_app):
+    app_module = fake_app()
+    use_models(app_module, MidStreamFailure("llama", LatencyModel(0.0)), FakeChatModel("gemini", LatencyModel(0.0)))
+
+    events = stream(app_module)
+
+    # No fallback once content has been sent: the player would see two replies spliced together
+    assert events == [("token", {"content": "[llama] You"}), ("error", {"detail": "connection reset"})]
+    assert saved(app_module) == []
+
+
+def test_every_provider_failing_is_a_single_error_event(fake_app):
+    app_module = fake_app(llama_errors=1.0, gemini_errors=1.0)
+
+    events = stream(app_module)
+
+    assert [event for event, _ in events] == ["error"]
+    assert saved(app_module) == []
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from apoorvbackend.src.llm_handler.summarizer import ConversationSummarizer, summary_max_tokens
+from apoorvbackend.src.models.chat_models import ChatRecord
+
+
+class RecordingLLM:
+    """Summarizer model stand-in: remembers its prompts and answers with a fixed summary."""
+
+    def __init__(self, summary: str):
+        self.summary = summary
+        self.prompts = []
+
+    async def ainvoke(self, messages):
+        self.prompts.append(messages)
+        return AIMessage(content=self.summary)
+
+
+def turn(n: int) -> list:
+    return [ChatRecord.human(f"question {n} " + "about the castle " * 10), ChatRecord.ai(f"answer {n} " + "lore " * 30, n == 3)]
+
+
+def test_long_conversation_is_folded_into_the_summary(redis_handler):
+    llm = RecordingLLM("The player asked about the castle six times.")
+    summarizer = ConversationSummarizer(redis_handler, llm=llm, enabled=True, token_budget=200, keep_recent=4)
+
+    async def scenario():
+        history = []
+        for n in range(6):
+            new = turn(n)
+            await redis_handler.aappend_chat_messages("player", "L1", "pebbles", new, history)
+            history += new
+        summarizer.after_turn("player", "L1", "pebbles", history)
+        await summarizer.aclose()
+        return history, await summarizer.aload("player", "L1", "pebbles")
+
+    history, (recent, summary) = asyncio.run(scenario())
+    assert summary == "The player asked about the castle six times."
+    # Only the messages the summary does not cover are loaded into the next prompt
+    assert recent == history[-4:]
+    assert summarizer.stats()["summaries_written"] == 1
+
+    system, transcript = llm.prompts[0]
+    assert "at most 200 words" in system.content
+    assert "question 0" in transcript.content and "question 3" in transcript.content
+    assert "question 4" not in transcript.content
+
+
+def test_short_conversation_is_left_alone(redis_handler):
+    llm = RecordingLLM("unused")
+    summarizer = ConversationSummarizer(redis_handler, llm=llm, enabled=True, token_budget=10_000, keep_recent=4)
+    summarizer.after_turn("player", "L1", "pebbles", turn(0) * 3)
+    assert summarizer._inflight == {} and llm.prompts == []
+
+
+@pytest.mark.parametrize("max_words", [50, 200, 400])
+def test_summary_client_has_room_for_max_words(redis_handler, max_words):
+    pytest.importorskip("langchain_openai")
+    summarizer = ConversationSummarizer(redis_handler, enabled=True, max_summary_words=max_words)
+
+    assert summary_max_tokens(max_words) >= max_words * 4 / 3
+    assert summarizer.llm.max_tokens == summary_max_tokens(max_words)
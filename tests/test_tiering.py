@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+
+from apoorvbackend.src.database.chat_archive import ChatArchive
+from apoorvbackend.src.database.postgres_backup import PostgresBackupService
+from apoorvbackend.src.models.chat_models import ChatRecord
+from apoorvbackend.src.redis.redis_handlers import RedisChatHandler
+
+IDLE_TTL = 0.3
+
+
+class CountingArchive(ChatArchive):
+    def __init__(self, pool):
+        super().__init__(pool)
+        self.loads = 0
+
+    def load(self, user_id, level, actor):
+        self.loads += 1
+        return super().load(user_id, level, actor)
+
+
+@pytest.fixture
+def tiered(redis_clients, postgres_pool):
+    """(handler evicting conversations IDLE_TTL seconds after their backup, backup service, archive)."""
+    archive = CountingArchive(postgres_pool)
+    handler = RedisChatHandler(client=redis_clients[0], async_client=redis_clients[1], idle_ttl=IDLE_TTL,
+                               archive=archive)
+    service = PostgresBackupService(pool=postgres_pool, redis_handler=handler, leader_election=False)
+    service._init_db()
+    return handler, service, archive
+
+
+def turn(text: str) -> list:
+    return [ChatRecord.human(text), ChatRecord.ai(f"reply to {text}", False)]
+
+
+def test_idle_conversation_is_evicted_and_rehydrated_on_the_next_load(tiered):
+    handler, service, archive = tiered
+    handler.append_chat_messages("idle", "L1", "pebbles", turn("one") + turn("two"))
+    handler.append_chat_messages("busy", "L1", "pebbles", turn("one"))
+    service.backup_now()
+    assert service.total_keys_expiring == 2
+
+    # Written again after the backup, so it must stay until the next one
+    handler.append_chat_messages("busy", "L1", "pebbles", turn("two"))
+    time.sleep(IDLE_TTL + 0.1)
+    assert not handler.client.exists("chatlog:idle:L1:pebbles")
+    assert handler.client.exists("chatlog:busy:L1:pebbles")
+
+    async def load_concurrently():
+        return await asyncio.gather(*(handler.aload_chat_history("idle", "L1", "pebbles") for _ in range(10)))
+
+    histories = asyncio.run(load_concurrently())
+    assert all(history == turn("one") + turn("two") for history in histories)
+    # Concurrent misses share one restore
+    assert archive.loads == 1
+
+    # The conversation keeps its numbering, so the next backup extends the archived row
+    handler.append_chat_messages("idle", "L1", "pebbles", turn("three"))
+    service.backup_now()
+    archived, last_seq = archive.load("idle", "L1", "pebbles")
+    assert [message["content"] for message in archived if message["role"] == "human"] == ["one", "two", "three"]
+    assert last_seq == 6
+
+
+def test_unknown_conversation_is_not_invented(tiered):
+    handler, _, archive = tiered
+    assert asyncio.run(handler.aload_chat_history("nobody", "L1", "pebbles")) in (None, [])
+    assert archive.loads == 1